@@ -0,0 +1,116 @@
+"""
+Fan-out of a new booking to the available mechanics
+
+Every available mechanic gets a pending WorkQueue entry and a
+"new booking" notification. With many mechanics that is a lot of rows, so
+they are written with two bulk_create calls, and with BOOKING_FANOUT_ASYNC on
+the customer's request only queues the booking id (Redis list, after the
+transaction commits) for manage.py run_booking_fanout. That is off by
+default: without the worker running no mechanic would see the booking.
+
+The fan-out is idempotent: WorkQueue is unique per (booking, mechanic) and
+each notification carries a dedupe_key, so a job that runs twice (retry,
+sweep) adds nothing. bulk_create sends no post_save, so the live events of
+users/events.py are published here.
+
+With BOOKING_FANOUT_ASYNC off, or Redis unreachable, the fan-out runs right
+after the commit in the request instead.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils import timezone
+
+from chatbot.redis_client import RedisError, get_redis
+from mechanics.models import WorkQueue
+from users.events import on_commit_publish
+from users.models import Notification
+
+from .models import Booking
+
+logger = logging.getLogger(__name__)
+
+FANOUT_QUEUE = 'booking:fanout'
+# The worker re-checks pending bookings this recent for a missed fan-out
+SWEEP_WINDOW = timedelta(hours=24)
+BULK_BATCH_SIZE = 500
+
+
+def schedule_fanout(booking):
+    """Fan booking out to the mechanics once the current transaction commits"""
+    booking_id = booking.id
+    transaction.on_commit(lambda: enqueue_fanout(booking_id))
+
+
+def enqueue_fanout(booking_id):
+    if settings.BOOKING_FANOUT_ASYNC:
+        try:
+            get_redis().lpush(FANOUT_QUEUE, booking_id)
+            return
+        except RedisError as e:
+            logger.warning(f"Booking fan-out queue unavailable, running booking {booking_id} inline: {e}")
+    fan_out_booking(booking_id)
+
+
+def available_mechanic_ids():
+    User = get_user_model()
+    return list(User.objects.filter(
+        user_type='mechanic',
+        mechanic_profile__is_available=True
+    ).values_list('id', flat=True))
+
+
+def fan_out_booking(booking_id):
+    """Create the queue entries and notifications of a pending booking; returns the number of mechanics"""
+    booking = Booking.objects.select_related('customer', 'motorcycle').filter(pk=booking_id).first()
+    if booking is None or booking.status != 'pending':
+        return 0
+
+    mechanic_ids = available_mechanic_ids()
+    if not mechanic_ids:
+        return 0
+
+    customer = booking.customer
+    motorcycle_text = "รถจักรยานยนต์"
+    if booking.motorcycle:
+        motorcycle_text = f"{booking.motorcycle.brand} {booking.motorcycle.model}"
+    message = f'ลูกค้า {customer.first_name or customer.username} จองคิวซ่อม {motorcycle_text} - การจอง #{booking.id}'
+
+    with transaction.atomic():
+        WorkQueue.objects.bulk_create(
+            [WorkQueue(mechanic_id=mechanic_id, booking=booking, status='pending') for mechanic_id in mechanic_ids],
+            batch_size=BULK_BATCH_SIZE,
+            ignore_conflicts=True,
+        )
+        Notification.objects.bulk_create(
+            [
+                Notification(
+                    user_id=mechanic_id,
+                    booking=booking,
+                    notification_type='new_booking_available',
+                    title='🆕 มีงานใหม่รอรับ!',
+                    message=message,
+                    dedupe_key=f'new_booking:{booking.id}:{mechanic_id}',
+                )
+                for mechanic_id in mechanic_ids
+            ],
+            batch_size=BULK_BATCH_SIZE,
+            ignore_conflicts=True,
+        )
+        on_commit_publish(mechanic_ids, 'work_queue', id=None, booking_id=booking.id, status='pending')
+        on_commit_publish(mechanic_ids, 'notification', id=None)
+
+    logger.info(f"Booking {booking.id} sent to {len(mechanic_ids)} mechanics")
+    return len(mechanic_ids)
+
+
+def unfanned_booking_ids():
+    """Recent pending bookings that no mechanic has in their queue (job lost or no mechanic was available)"""
+    return list(Booking.objects.filter(
+        status='pending',
+        created_at__gte=timezone.now() - SWEEP_WINDOW,
+        work_queues__isnull=True,
+    ).values_list('id', flat=True))
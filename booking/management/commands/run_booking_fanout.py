@@ -0,0 +1,81 @@
+"""
+Management command running the new booking fan-out worker (booking/fanout.py)
+
+Takes booking ids off the Redis queue and creates the mechanics' queue
+entries and notifications. Every SWEEP_INTERVAL seconds without work (and
+at start) it also fans out recent pending bookings that no mechanic has in
+their queue, so a job lost with a crashed worker is picked up again.
+
+    python manage.py run_booking_fanout          # run forever
+    python manage.py run_booking_fanout --once   # drain the queue, sweep, exit (cron)
+"""
+import time
+
+import redis
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from booking.fanout import FANOUT_QUEUE, fan_out_booking, unfanned_booking_ids
+
+SWEEP_INTERVAL = 60
+# Seconds BRPOP blocks before the loop checks whether a sweep is due
+POLL_TIMEOUT = 5
+
+
+class Command(BaseCommand):
+    help = 'Run the worker that sends new bookings to the available mechanics'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Drain the queue and sweep once, then exit'
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS(f'🚀 Booking fan-out worker on {FANOUT_QUEUE}'))
+        self.sweep()
+        # Own connection: the shared client's short socket timeout would cut BRPOP off
+        client = redis.Redis.from_url(
+            settings.REDIS_URL,
+            socket_connect_timeout=settings.REDIS_CONNECT_TIMEOUT,
+            decode_responses=True,
+        )
+        while True:
+            try:
+                if options['once']:
+                    booking_id = client.rpop(FANOUT_QUEUE)
+                    if booking_id is None:
+                        break
+                else:
+                    item = client.brpop(FANOUT_QUEUE, timeout=POLL_TIMEOUT)
+                    if item is None:
+                        self.sweep_if_due()
+                        continue
+                    booking_id = item[1]
+            except redis.RedisError as e:
+                self.stdout.write(self.style.WARNING(f'⚠️  Redis unavailable ({e}), retrying in 5s'))
+                time.sleep(5)
+                continue
+            self.run(int(booking_id))
+        self.sweep()
+
+    def run(self, booking_id):
+        close_old_connections()
+        try:
+            count = fan_out_booking(booking_id)
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f'❌ Booking #{booking_id}: {e}'))
+            return
+        self.stdout.write(f'  Booking #{booking_id} -> {count} mechanics')
+
+    def sweep_if_due(self):
+        if time.monotonic() - self.last_sweep >= SWEEP_INTERVAL:
+            self.sweep()
+
+    def sweep(self):
+        close_old_connections()
+        self.last_sweep = time.monotonic()
+        for booking_id in unfanned_booking_ids():
+            self.run(booking_id)
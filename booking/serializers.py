@@ -135,27 +135,12 @@ class BookingSerializer(serializers.ModelSerializer):
             validated_data['appointment_date'] = timezone.make_aware(naive_datetime)
         
         # Don't auto-assign mechanic - let them accept the job
-        from mechanics.models import WorkQueue
-        from django.contrib.auth import get_user_model
-        User = get_user_model()
-        
-        # Find all available mechanics
-        available_mechanics = User.objects.filter(
-            user_type='mechanic',
-            mechanic_profile__is_available=True
-        )
-        
         # Create booking without mechanic assigned (status = pending)
         validated_data['mechanic'] = None  # No auto-assign
         booking = super().create(validated_data)
         
-        # Create work queue entries for ALL available mechanics
-        # so they can all see and compete for the job
-        for mechanic in available_mechanics:
-            WorkQueue.objects.create(
-                mechanic=mechanic,
-                booking=booking,
-                status='pending'
-            )
+        # Work queue entries and notifications for ALL available mechanics, so they
+        # can all see and compete for the job, are created in the background by
+        # booking.signals -> booking/fanout.py
         
         return booking
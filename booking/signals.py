@@ -3,7 +3,18 @@ from django.dispatch import receiver
 from booking.models import Booking
 from chat.models import ChatRoom
 from users.models import Notification
-from django.contrib.auth import get_user_model
+from users.events import on_commit_publish
+from booking.fanout import schedule_fanout
+
+
+@receiver(post_save, sender=Booking)
+def publish_booking_event(sender, instance, created, **kwargs):
+    """Live update for the customer, the assigned mechanic and every mechanic with the job in their queue"""
+    booking = instance
+    user_ids = [booking.customer_id, booking.mechanic_id]
+    if not created:  # a new booking reaches the mechanics through the fan-out
+        user_ids += booking.work_queues.values_list('mechanic_id', flat=True)
+    on_commit_publish(user_ids, 'booking', booking_id=booking.id, status=booking.status)
 
 
 @receiver(post_save, sender=Booking)
@@ -26,22 +37,8 @@ def create_booking_notification(sender, instance, created, **kwargs):
     except Exception:
         pass
     
-    if created:  # NEW BOOKING - notify all mechanics
-        User = get_user_model()
-        # Find all available mechanics
-        all_mechanics = User.objects.filter(
-            user_type='mechanic',
-            mechanic_profile__is_available=True
-        )
-        
-        for mech in all_mechanics:
-            Notification.objects.create(
-                user=mech,
-                booking=booking,
-                notification_type='new_booking_available',
-                title='🆕 มีงานใหม่รอรับ!',
-                message=f'ลูกค้า {customer.first_name or customer.username} จองคิวซ่อม {motorcycle_text} - การจอง #{booking.id}'
-            )
+    if created:  # NEW BOOKING - queue it for all available mechanics (booking/fanout.py)
+        schedule_fanout(booking)
         return  # Exit after handling new booking
     
     # EXISTING BOOKING - status update
@@ -1,22 +1,29 @@
 from django.contrib import admin
-from .models import ChatRoom, Message
+from .models import ChatRoom, Message, ReadWatermark
 
 
 @admin.register(ChatRoom)
 class ChatRoomAdmin(admin.ModelAdmin):
-    list_display = ('id', 'booking', 'customer', 'mechanic', 'created_at', 'updated_at')
+    list_display = ('id', 'booking', 'customer', 'mechanic', 'customer_unread', 'mechanic_unread', 'created_at', 'updated_at')
     list_filter = ('created_at', 'updated_at')
     search_fields = ('customer__username', 'mechanic__username', 'booking__id')
-    raw_id_fields = ('booking', 'customer', 'mechanic')
+    raw_id_fields = ('booking', 'customer', 'mechanic', 'last_message')
 
 
 @admin.register(Message)
 class MessageAdmin(admin.ModelAdmin):
-    list_display = ('id', 'chat_room', 'sender', 'message_preview', 'is_read', 'created_at')
-    list_filter = ('is_read', 'created_at')
+    list_display = ('id', 'chat_room', 'sender', 'message_preview', 'created_at')
+    list_filter = ('created_at',)
     search_fields = ('sender__username', 'message')
     raw_id_fields = ('chat_room', 'sender')
     
     def message_preview(self, obj):
         return obj.message[:50] + '...' if len(obj.message) > 50 else obj.message
     message_preview.short_description = 'ข้อความ'
+
+
+@admin.register(ReadWatermark)
+class ReadWatermarkAdmin(admin.ModelAdmin):
+    list_display = ('chat_room', 'user', 'last_read_id', 'updated_at')
+    search_fields = ('user__username', 'chat_room__id')
+    raw_id_fields = ('chat_room', 'user')
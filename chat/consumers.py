@@ -0,0 +1,88 @@
+"""
+WebSocket consumers for the chat app (routed in chat/routing.py)
+
+Client -> server (JSON):
+    {"type": "message", "message": "...", "client_id": "..."}   send a message
+    {"type": "read", "up_to": <message id>}                      read receipt
+Server -> client:
+    {"type": "message", "message": {...MessageSerializer}}
+    {"type": "ack", "client_id": "...", "id": <message id>}
+    {"type": "read", "reader_id": ..., "up_to": <message id>}
+    {"type": "room", "room_id": ..., "message_id": ...}          (chat list socket)
+"""
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+
+from .realtime import room_group, user_group
+from .services import get_user_room, mark_read, post_message
+
+# Close codes (4000-4999 are application defined)
+CLOSE_UNAUTHENTICATED = 4401
+CLOSE_FORBIDDEN = 4403
+
+
+class ChatRoomConsumer(AsyncJsonWebsocketConsumer):
+    """Live messages and read receipts of one chat room"""
+
+    group = None
+
+    async def connect(self):
+        self.user = self.scope['user']
+        if not self.user.is_authenticated:
+            await self.close(code=CLOSE_UNAUTHENTICATED)
+            return
+        room_id = self.scope['url_route']['kwargs']['room_id']
+        self.room = await database_sync_to_async(get_user_room)(self.user, room_id)
+        if self.room is None:
+            await self.close(code=CLOSE_FORBIDDEN)
+            return
+        self.group = room_group(self.room.id)
+        await self.channel_layer.group_add(self.group, self.channel_name)
+        await self.accept()
+
+    async def disconnect(self, code):
+        if self.group:
+            await self.channel_layer.group_discard(self.group, self.channel_name)
+
+    async def receive_json(self, content, **kwargs):
+        kind = content.get('type')
+        if kind == 'message':
+            text = str(content.get('message') or '').strip()
+            if not text:
+                return
+            message = await database_sync_to_async(post_message)(self.room, self.user, text)
+            await self.send_json({'type': 'ack', 'client_id': content.get('client_id'), 'id': message.id})
+        elif kind == 'read':
+            try:
+                up_to = int(content['up_to']) if content.get('up_to') is not None else None
+            except (TypeError, ValueError):
+                return
+            await database_sync_to_async(mark_read)(self.room, self.user, up_to)
+
+    async def chat_message(self, event):
+        await self.send_json({'type': 'message', 'message': event['message']})
+
+    async def chat_read(self, event):
+        await self.send_json({'type': 'read', 'reader_id': event['reader_id'], 'up_to': event['up_to']})
+
+
+class ChatListConsumer(AsyncJsonWebsocketConsumer):
+    """Tells the chat list of a user when one of their rooms changed"""
+
+    group = None
+
+    async def connect(self):
+        user = self.scope['user']
+        if not user.is_authenticated:
+            await self.close(code=CLOSE_UNAUTHENTICATED)
+            return
+        self.group = user_group(user.id)
+        await self.channel_layer.group_add(self.group, self.channel_name)
+        await self.accept()
+
+    async def disconnect(self, code):
+        if self.group:
+            await self.channel_layer.group_discard(self.group, self.channel_name)
+
+    async def chat_room(self, event):
+        await self.send_json({'type': 'room', 'room_id': event['room_id'], 'message_id': event['message_id']})
@@ -0,0 +1,55 @@
+"""
+Management command to repair the denormalized chat room counters
+
+ChatRoom.last_message, customer_unread and mechanic_unread are maintained by
+chat/services.py. Writes that bypass it (admin, shell, raw SQL) make them
+drift; this recomputes them from the messages and read watermarks and fixes
+the rooms that differ.
+"""
+from django.core.management.base import BaseCommand
+
+from chat.models import ChatRoom
+from chat.services import expected_counters
+
+
+class Command(BaseCommand):
+    help = 'Recompute ChatRoom.last_message and unread counters from the messages'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report the rooms that drifted, change nothing'
+        )
+
+    def handle(self, *args, **options):
+        counters = expected_counters()
+        rooms = ChatRoom.objects.annotate(**counters).only(
+            'id', 'last_message', 'customer_unread', 'mechanic_unread'
+        ).order_by('id')
+        checked = 0
+        fixed = 0
+        for room in rooms.iterator(chunk_size=500):
+            checked += 1
+            expected = {
+                'last_message_id': room.expected_last_message,
+                'customer_unread': room.expected_customer_unread,
+                'mechanic_unread': room.expected_mechanic_unread,
+            }
+            drift = {field: value for field, value in expected.items() if getattr(room, field) != value}
+            if not drift:
+                continue
+            fixed += 1
+            self.stdout.write(self.style.WARNING(
+                f'  Room {room.id}: ' + ', '.join(f'{field} {getattr(room, field)} -> {value}' for field, value in drift.items())
+            ))
+            if not options['dry_run']:
+                # Recomputed inside the UPDATE, so a message posted meanwhile is not lost
+                ChatRoom.objects.filter(pk=room.pk).update(
+                    last_message=counters['expected_last_message'],
+                    customer_unread=counters['expected_customer_unread'],
+                    mechanic_unread=counters['expected_mechanic_unread'],
+                )
+
+        action = 'would fix' if options['dry_run'] else 'fixed'
+        self.stdout.write(self.style.SUCCESS(f'✅ Checked {checked} rooms, {action} {fixed}'))
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.8 on 2026-10-17 15:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_counters(apps, schema_editor):
+    """Fill last_message and the unread counters of existing rooms"""
+    ChatRoom = apps.get_model('chat', 'ChatRoom')
+    Message = apps.get_model('chat', 'Message')
+
+    def unread_of(participant):
+        return Coalesce(Subquery(
+            Message.objects.filter(chat_room=OuterRef('pk'), is_read=False)
+            .exclude(sender=OuterRef(participant))
+            .order_by().values('chat_room').annotate(count=Count('id')).values('count')
+        ), 0)
+
+    ChatRoom.objects.update(
+        last_message=Subquery(Message.objects.filter(chat_room=OuterRef('pk')).order_by('-id').values('id')[:1]),
+        customer_unread=unread_of('customer'),
+        mechanic_unread=unread_of('mechanic'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0002_message_room_id_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatroom',
+            name='customer_unread',
+            field=models.PositiveIntegerField(default=0, verbose_name='ข้อความที่ลูกค้ายังไม่อ่าน'),
+        ),
+        migrations.AddField(
+            model_name='chatroom',
+            name='last_message',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='chat.message', verbose_name='ข้อความล่าสุด'),
+        ),
+        migrations.AddField(
+            model_name='chatroom',
+            name='mechanic_unread',
+            field=models.PositiveIntegerField(default=0, verbose_name='ข้อความที่ช่างยังไม่อ่าน'),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
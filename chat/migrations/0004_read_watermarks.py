@@ -0,0 +1,66 @@
+# Generated by Django 5.2.8 on 2026-10-17 15:43
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Max, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_watermarks(apps, schema_editor):
+    """Watermark = newest message of the other participant flagged is_read; then recount unread"""
+    ChatRoom = apps.get_model('chat', 'ChatRoom')
+    Message = apps.get_model('chat', 'Message')
+    ReadWatermark = apps.get_model('chat', 'ReadWatermark')
+
+    rooms = ChatRoom.objects.annotate(
+        customer_read=Max('messages__id', filter=Q(messages__is_read=True) & ~Q(messages__sender=models.F('customer'))),
+        mechanic_read=Max('messages__id', filter=Q(messages__is_read=True) & ~Q(messages__sender=models.F('mechanic'))),
+    ).values_list('id', 'customer_id', 'customer_read', 'mechanic_id', 'mechanic_read')
+    ReadWatermark.objects.bulk_create([
+        ReadWatermark(chat_room_id=room_id, user_id=user_id, last_read_id=last_read_id)
+        for room_id, customer_id, customer_read, mechanic_id, mechanic_read in rooms.iterator()
+        for user_id, last_read_id in ((customer_id, customer_read), (mechanic_id, mechanic_read))
+        if user_id and last_read_id
+    ], batch_size=1000, ignore_conflicts=True)
+
+    def unread_of(participant):
+        last_read_id = Coalesce(Subquery(
+            ReadWatermark.objects.filter(
+                chat_room=OuterRef(OuterRef('pk')), user=OuterRef(OuterRef(participant))
+            ).values('last_read_id')[:1]
+        ), 0)
+        return Coalesce(Subquery(
+            Message.objects.filter(chat_room=OuterRef('pk'), id__gt=last_read_id)
+            .exclude(sender=OuterRef(participant))
+            .order_by().values('chat_room').annotate(count=Count('id')).values('count')
+        ), 0)
+
+    ChatRoom.objects.update(customer_unread=unread_of('customer'), mechanic_unread=unread_of('mechanic'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0003_chatroom_counters'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReadWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_read_id', models.BigIntegerField(default=0, verbose_name='อ่านถึงข้อความ')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='วันที่อัปเดต')),
+                ('chat_room', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='read_watermarks', to='chat.chatroom', verbose_name='ห้องแชท')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chat_read_watermarks', to=settings.AUTH_USER_MODEL, verbose_name='ผู้ใช้')),
+            ],
+            options={
+                'verbose_name': 'สถานะการอ่าน',
+                'verbose_name_plural': 'สถานะการอ่านทั้งหมด',
+                'constraints': [models.UniqueConstraint(fields=('chat_room', 'user'), name='chat_read_watermark_unique')],
+            },
+        ),
+        migrations.RunPython(backfill_watermarks, migrations.RunPython.noop),
+    ]
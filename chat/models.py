@@ -27,6 +27,17 @@ class ChatRoom(models.Model):
         blank=True,
         verbose_name='ช่าง'
     )
+    # Denormalized by chat.services on message create/read; manage.py reconcile_chat_counters repairs drift
+    last_message = models.ForeignKey(
+        'Message',
+        on_delete=models.SET_NULL,
+        related_name='+',
+        null=True,
+        blank=True,
+        verbose_name='ข้อความล่าสุด'
+    )
+    customer_unread = models.PositiveIntegerField(default=0, verbose_name='ข้อความที่ลูกค้ายังไม่อ่าน')
+    mechanic_unread = models.PositiveIntegerField(default=0, verbose_name='ข้อความที่ช่างยังไม่อ่าน')
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='วันที่สร้าง')
     updated_at = models.DateTimeField(auto_now=True, verbose_name='วันที่อัปเดต')
     
@@ -45,9 +56,21 @@ class ChatRoom(models.Model):
             return self.mechanic
         return self.customer
     
+    def unread_field(self, user):
+        """Name of the unread counter of user in this room"""
+        return 'customer_unread' if user.id == self.customer_id else 'mechanic_unread'
+    
     def get_unread_count(self, user):
         """Get unread message count for specific user"""
-        return self.messages.filter(is_read=False).exclude(sender=user).count()
+        return getattr(self, self.unread_field(user))
+    
+    def get_last_read_id(self, user):
+        """Id of the newest message user has read in this room (0 if none)"""
+        return self.read_watermarks.filter(user=user).values_list('last_read_id', flat=True).first() or 0
+    
+    def count_unread(self, user):
+        """Unread count of user recomputed from the read watermark (index range count)"""
+        return self.messages.filter(id__gt=self.get_last_read_id(user)).exclude(sender=user).count()
 
 
 class Message(models.Model):
@@ -67,6 +90,7 @@ class Message(models.Model):
         verbose_name='ผู้ส่ง'
     )
     message = models.TextField(verbose_name='ข้อความ')
+    # Legacy per-message flag, no longer written - read state is ReadWatermark
     is_read = models.BooleanField(default=False, verbose_name='อ่านแล้ว')
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='วันที่ส่ง')
     
@@ -74,6 +98,42 @@ class Message(models.Model):
         verbose_name = 'ข้อความ'
         verbose_name_plural = 'ข้อความทั้งหมด'
         ordering = ['created_at']
+        indexes = [
+            # Incremental sync: messages of a room after a given id
+            models.Index(fields=['chat_room', 'id'], name='chat_msg_room_id_idx'),
+        ]
     
     def __str__(self):
         return f"{self.sender.username}: {self.message[:50]}"
+
+
+class ReadWatermark(models.Model):
+    """
+    Read state of one participant in a chat room: every message up to
+    last_read_id counts as read. Replaces the per-message is_read flag, so
+    reading any number of messages is one row update.
+    """
+    chat_room = models.ForeignKey(
+        ChatRoom,
+        on_delete=models.CASCADE,
+        related_name='read_watermarks',
+        verbose_name='ห้องแชท'
+    )
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='chat_read_watermarks',
+        verbose_name='ผู้ใช้'
+    )
+    last_read_id = models.BigIntegerField(default=0, verbose_name='อ่านถึงข้อความ')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='วันที่อัปเดต')
+    
+    class Meta:
+        verbose_name = 'สถานะการอ่าน'
+        verbose_name_plural = 'สถานะการอ่านทั้งหมด'
+        constraints = [
+            models.UniqueConstraint(fields=['chat_room', 'user'], name='chat_read_watermark_unique'),
+        ]
+    
+    def __str__(self):
+        return f"{self.user_id} read room {self.chat_room_id} up to {self.last_read_id}"
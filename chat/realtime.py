@@ -0,0 +1,78 @@
+"""
+Real-time fan-out for the chat app (Django Channels over Redis pub/sub)
+
+Groups:
+    chat_room_<id>   sockets of an open chat room (ChatRoomConsumer)
+    chat_user_<id>   chat list sockets of one user (ChatListConsumer)
+
+Participants whose unread count may have changed also get a "chat" event
+on their per-user event stream (users/events.py) for the navbar badge.
+
+Events are sent after the transaction commits, so a subscriber that reacts
+by querying the database always sees the row. Publishing is best effort:
+if Redis is down, the clients fall back to polling.
+"""
+from django.db import transaction
+
+from users.events import publish, send_to_groups
+
+
+def room_group(room_id):
+    return f'chat_room_{room_id}'
+
+
+def user_group(user_id):
+    return f'chat_user_{user_id}'
+
+
+def message_payload(message):
+    """Same shape as MessageSerializer"""
+    from .serializers import MessageSerializer
+    data = MessageSerializer(message).data
+    return {**data, 'sender': dict(data['sender'])}
+
+
+def room_user_ids(room):
+    return [user_id for user_id in (room.customer_id, room.mechanic_id) if user_id]
+
+
+def publish_message(message):
+    """Push a new message to the room and a room update to both participants' chat lists"""
+    room = message.chat_room
+    payload = message_payload(message)
+    send_to_groups([room_group(room.id)], {'type': 'chat.message', 'message': payload})
+    send_to_groups(
+        [user_group(user_id) for user_id in room_user_ids(room)],
+        {'type': 'chat.room', 'room_id': room.id, 'message_id': message.id},
+    )
+    publish([user_id for user_id in room_user_ids(room) if user_id != message.sender_id], 'chat', room_id=room.id)
+
+
+def publish_room(room):
+    """A room was created - refresh both participants' chat lists"""
+    send_to_groups(
+        [user_group(user_id) for user_id in room_user_ids(room)],
+        {'type': 'chat.room', 'room_id': room.id, 'message_id': None},
+    )
+
+
+def publish_read(room, reader_id, up_to_id):
+    """Read receipt: reader has read every message of room up to message up_to_id"""
+    send_to_groups(
+        [room_group(room.id)],
+        {'type': 'chat.read', 'room_id': room.id, 'reader_id': reader_id, 'up_to': up_to_id},
+    )
+    send_to_groups([user_group(reader_id)], {'type': 'chat.room', 'room_id': room.id, 'message_id': up_to_id})
+    publish([reader_id], 'chat', room_id=room.id)
+
+
+def on_commit_publish_message(message):
+    transaction.on_commit(lambda: publish_message(message))
+
+
+def on_commit_publish_room(room):
+    transaction.on_commit(lambda: publish_room(room))
+
+
+def on_commit_publish_read(room, reader_id, up_to_id):
+    transaction.on_commit(lambda: publish_read(room, reader_id, up_to_id))
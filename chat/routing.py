@@ -0,0 +1,7 @@
+from django.urls import path
+from . import consumers
+
+websocket_urlpatterns = [
+    path('ws/chat/', consumers.ChatListConsumer.as_asgi(), name='ws_list'),
+    path('ws/chat/rooms/<int:room_id>/', consumers.ChatRoomConsumer.as_asgi(), name='ws_room'),
+]
@@ -28,12 +28,12 @@ class ChatRoomSerializer(serializers.ModelSerializer):
         return obj.get_unread_count(user)
     
     def get_last_message(self, obj):
-        last_msg = obj.messages.order_by('-created_at').first()
+        last_msg = obj.last_message
         if last_msg:
             return {
                 'id': last_msg.id,
                 'message': last_msg.message,
-                'sender_id': last_msg.sender.id,
+                'sender_id': last_msg.sender_id,
                 'sender': last_msg.sender.username,
                 'created_at': last_msg.created_at
             }
@@ -64,8 +64,16 @@ class ChatRoomSerializer(serializers.ModelSerializer):
 
 class MessageSerializer(serializers.ModelSerializer):
     sender = UserSerializer(read_only=True)
+    # Derived from the room's read watermarks (context['read_receipts'], see chat.services.read_receipts)
+    is_read = serializers.SerializerMethodField()
     
     class Meta:
         model = Message
         fields = ('id', 'chat_room', 'sender', 'message', 'is_read', 'created_at')
-        read_only_fields = ('sender', 'is_read', 'created_at')
+        read_only_fields = ('sender', 'created_at')
+    
+    def get_is_read(self, obj):
+        receipts = self.context.get('read_receipts')
+        if receipts is None:
+            return obj.is_read
+        return obj.id <= (receipts.get(obj.sender_id) or 0)
@@ -0,0 +1,111 @@
+"""
+Chat write paths shared by the REST API, the web views and the WebSocket consumer
+
+They keep ChatRoom.last_message and the per-participant unread counters in
+step with the messages and read watermarks, in the same transaction as the write.
+"""
+from django.db import models, transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from .models import ChatRoom, Message, ReadWatermark
+from .realtime import on_commit_publish_read
+
+# Most messages returned by one incremental sync (?after_id=); has_more tells the client to ask again
+MESSAGE_SYNC_LIMIT = 200
+
+
+def user_rooms(user):
+    """Chat rooms user takes part in"""
+    return ChatRoom.objects.filter(Q(customer=user) | Q(mechanic=user))
+
+
+def get_user_room(user, room_id):
+    """The room if user takes part in it, else None"""
+    return user_rooms(user).filter(id=room_id).first()
+
+
+def post_message(chat_room, sender, text):
+    """Save a message and bump the room (subscribers are notified by chat.signals after commit)"""
+    with transaction.atomic():
+        # Row lock before the INSERT: ids of a room are allocated and committed in
+        # order, so an ?after_id= sync never steps over a message still in flight
+        ChatRoom.objects.select_for_update().only('id').get(pk=chat_room.pk)
+        message = Message.objects.create(chat_room=chat_room, sender=sender, message=text)
+        updates = {
+            # Greatest: the pointer never moves back
+            'last_message': Greatest(F('last_message'), Value(message.id), output_field=models.BigIntegerField()),
+            'updated_at': timezone.now(),
+        }
+        for user_id, field in ((chat_room.customer_id, 'customer_unread'), (chat_room.mechanic_id, 'mechanic_unread')):
+            if user_id and user_id != sender.id:
+                updates[field] = F(field) + 1
+        ChatRoom.objects.filter(pk=chat_room.pk).update(**updates)
+    return message
+
+
+def expected_counters():
+    """
+    Annotations recomputing last_message and the unread counters of a ChatRoom
+    queryset from its messages and read watermarks (a room without a mechanic
+    counts 0 for that side)
+    """
+    def unread_of(participant):
+        last_read_id = Coalesce(Subquery(
+            ReadWatermark.objects.filter(
+                chat_room=OuterRef(OuterRef('pk')), user=OuterRef(OuterRef(participant))
+            ).values('last_read_id')[:1]
+        ), 0)
+        return Coalesce(Subquery(
+            Message.objects.filter(chat_room=OuterRef('pk'), id__gt=last_read_id)
+            .exclude(sender=OuterRef(participant))
+            .order_by().values('chat_room').annotate(count=Count('id')).values('count')
+        ), 0)
+
+    return {
+        'expected_last_message': Subquery(
+            Message.objects.filter(chat_room=OuterRef('pk')).order_by('-id').values('id')[:1]
+        ),
+        'expected_customer_unread': unread_of('customer'),
+        'expected_mechanic_unread': unread_of('mechanic'),
+    }
+
+
+def messages_after(chat_room, after_id):
+    """Messages of chat_room newer than after_id, oldest first (range scan on chat_msg_room_id_idx)"""
+    return Message.objects.filter(
+        chat_room=chat_room, id__gt=after_id
+    ).select_related('sender').order_by('id')
+
+
+def read_receipts(chat_room):
+    """{participant id: id of the newest message the other participant has read, or None}"""
+    watermarks = dict(chat_room.read_watermarks.values_list('user_id', 'last_read_id'))
+    pairs = ((chat_room.customer_id, chat_room.mechanic_id), (chat_room.mechanic_id, chat_room.customer_id))
+    return {sender_id: watermarks.get(reader_id) for sender_id, reader_id in pairs if sender_id}
+
+
+def mark_read(chat_room, reader, up_to_id=None):
+    """
+    Move reader's read watermark in chat_room up to message up_to_id (default:
+    the newest message), refresh their unread counter and send a read receipt.
+    Returns the new watermark, or None if it did not move.
+    """
+    with transaction.atomic():
+        # Row lock: a message posted meanwhile is either counted here or added after
+        room = ChatRoom.objects.select_for_update().only('last_message', 'customer', 'mechanic').get(pk=chat_room.pk)
+        last_id = room.last_message_id
+        if last_id is None:
+            return None
+        if up_to_id is not None:
+            last_id = min(up_to_id, last_id)
+        watermark, _ = ReadWatermark.objects.get_or_create(chat_room=room, user=reader)
+        moved = ReadWatermark.objects.filter(pk=watermark.pk, last_read_id__lt=last_id).update(
+            last_read_id=last_id, updated_at=timezone.now()
+        )
+        if not moved:
+            return None
+        ChatRoom.objects.filter(pk=room.pk).update(**{room.unread_field(reader): room.count_unread(reader)})
+    on_commit_publish_read(chat_room, reader.id, last_id)
+    return last_id
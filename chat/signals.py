@@ -1,7 +1,8 @@
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 from booking.models import Booking
-from .models import ChatRoom
+from .models import ChatRoom, Message
+from .realtime import on_commit_publish_message, on_commit_publish_room
 
 
 @receiver(post_save, sender=Booking)
@@ -20,3 +21,17 @@ def create_chat_room(sender, instance, created, **kwargs):
                 customer=booking.customer,
                 mechanic=booking.mechanic
             )
+
+
+@receiver(post_save, sender=ChatRoom)
+def publish_new_chat_room(sender, instance, created, **kwargs):
+    """Show a new room in the participants' open chat lists"""
+    if created:
+        on_commit_publish_room(instance)
+
+
+@receiver(post_save, sender=Message)
+def publish_new_message(sender, instance, created, **kwargs):
+    """Push new messages to the room's WebSocket subscribers once committed"""
+    if created:
+        on_commit_publish_message(instance)
@@ -0,0 +1,126 @@
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from booking.models import Booking, Motorcycle
+
+from .models import ChatRoom
+from .services import mark_read, post_message
+
+User = get_user_model()
+
+
+class ChatRoomTestCase(TestCase):
+    """A room between a customer and a mechanic, with no messages yet"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create_user('customer', password='x', user_type='customer')
+        cls.mechanic = User.objects.create_user('mechanic', password='x', user_type='mechanic')
+        motorcycle = Motorcycle.objects.create(
+            owner=cls.customer, brand='Honda', model='Wave 110i', year=2020, cc=110, license_plate='1กข 1234'
+        )
+        booking = Booking.objects.create(
+            customer=cls.customer, motorcycle=motorcycle, problem_description='สตาร์ทไม่ติด',
+            appointment_date=timezone.now() + timedelta(days=1),
+        )
+        cls.room = ChatRoom.objects.create(booking=booking, customer=cls.customer, mechanic=cls.mechanic)
+
+    def post(self, sender, count=1):
+        return [post_message(self.room, sender, f'ข้อความ {i}') for i in range(count)]
+
+    def assertCounters(self, last_message, customer_unread, mechanic_unread):
+        self.room.refresh_from_db(fields=['last_message', 'customer_unread', 'mechanic_unread'])
+        self.assertEqual(self.room.last_message_id, last_message.id if last_message else None)
+        self.assertEqual(self.room.customer_unread, customer_unread)
+        self.assertEqual(self.room.mechanic_unread, mechanic_unread)
+
+
+class ChatCounterTests(ChatRoomTestCase):
+    """last_message and the unread counters kept by chat.services"""
+
+    def test_post_message_bumps_the_other_participant(self):
+        first, second = self.post(self.customer, 2)
+        self.assertCounters(second, customer_unread=0, mechanic_unread=2)
+
+        reply, = self.post(self.mechanic)
+        self.assertCounters(reply, customer_unread=1, mechanic_unread=2)
+
+    def test_mark_read_up_to_a_message(self):
+        first, second, third = self.post(self.customer, 3)
+
+        self.assertEqual(mark_read(self.room, self.mechanic, second.id), second.id)
+        self.assertEqual(self.room.get_last_read_id(self.mechanic), second.id)
+        self.assertCounters(third, customer_unread=0, mechanic_unread=1)
+
+        # The watermark never moves back
+        self.assertIsNone(mark_read(self.room, self.mechanic, first.id))
+        self.assertEqual(self.room.get_last_read_id(self.mechanic), second.id)
+
+        self.assertEqual(mark_read(self.room, self.mechanic), third.id)
+        self.assertCounters(third, customer_unread=0, mechanic_unread=0)
+
+    def test_mark_read_is_capped_at_the_last_message(self):
+        message, = self.post(self.customer)
+        self.assertEqual(mark_read(self.room, self.mechanic, message.id + 100), message.id)
+        self.assertCounters(message, customer_unread=0, mechanic_unread=0)
+
+    def test_reconcile_repairs_drifted_counters(self):
+        first, second = self.post(self.customer, 2)
+        reply, = self.post(self.mechanic)
+        mark_read(self.room, self.mechanic, first.id)
+        ChatRoom.objects.filter(pk=self.room.pk).update(last_message=first, customer_unread=5, mechanic_unread=0)
+
+        call_command('reconcile_chat_counters', '--dry-run', stdout=StringIO())
+        self.assertCounters(first, customer_unread=5, mechanic_unread=0)
+
+        call_command('reconcile_chat_counters', stdout=StringIO())
+        self.assertCounters(reply, customer_unread=1, mechanic_unread=1)
+
+
+class MessageSyncApiTests(ChatRoomTestCase):
+    """?after_id= incremental sync and the mark-room-read endpoint"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.mechanic)
+        self.messages_url = reverse('chat:api_messages', args=[self.room.pk])
+
+    def test_sync_after_a_watermark(self):
+        first, second, third = self.post(self.customer, 3)
+
+        data = self.client.get(self.messages_url, {'after_id': first.id}).json()
+        self.assertEqual([m['id'] for m in data['messages']], [second.id, third.id])
+        self.assertEqual(data['watermark'], third.id)
+        self.assertFalse(data['has_more'])
+
+        data = self.client.get(self.messages_url, {'after_id': third.id}).json()
+        self.assertEqual(data['messages'], [])
+        self.assertEqual(data['watermark'], third.id)
+
+    def test_sync_pages_with_has_more(self):
+        first, second, third = self.post(self.customer, 3)
+
+        with mock.patch('chat.views.MESSAGE_SYNC_LIMIT', 2):
+            data = self.client.get(self.messages_url, {'after_id': 0}).json()
+        self.assertEqual([m['id'] for m in data['messages']], [first.id, second.id])
+        self.assertEqual(data['watermark'], second.id)
+        self.assertTrue(data['has_more'])
+
+    def test_mark_room_read_up_to(self):
+        first, second, third = self.post(self.customer, 3)
+        url = reverse('chat:api_mark_room_read', args=[self.room.pk])
+
+        response = self.client.post(url, {'up_to': second.id}, format='json')
+        self.assertEqual(response.json(), {'last_read_id': second.id, 'unread_count': 1})
+
+        response = self.client.post(url, {}, format='json')
+        self.assertEqual(response.json(), {'last_read_id': third.id, 'unread_count': 0})
+        self.assertCounters(third, customer_unread=0, mechanic_unread=0)
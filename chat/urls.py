@@ -11,6 +11,7 @@ urlpatterns = [
     # API endpoints
     path('api/rooms/', views.ChatRoomListView.as_view(), name='api_rooms'),
     path('api/rooms/<int:pk>/messages/', views.MessageListCreateView.as_view(), name='api_messages'),
+    path('api/rooms/<int:pk>/read/', views.MarkRoomReadView.as_view(), name='api_mark_room_read'),
     path('api/messages/<int:pk>/read/', views.MarkMessageReadView.as_view(), name='api_mark_read'),
     path('api/unread-count/', views.UnreadMessageCountView.as_view(), name='api_unread_count'),
 ]
@@ -2,11 +2,27 @@
 API Views for Chat
 """
 from rest_framework import generics, permissions, status
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from django.db.models import Q
-from .models import ChatRoom, Message
+from django.db.models import Q, Sum
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
+from .models import Message
 from .serializers import ChatRoomSerializer, MessageSerializer
+from .services import (
+    MESSAGE_SYNC_LIMIT, get_user_room, mark_read, messages_after, post_message, read_receipts, user_rooms,
+)
+
+
+def parse_message_id(value, field):
+    """Optional message id from request input; ValidationError when it is not a number"""
+    if value is None:
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValidationError({field: 'ต้องเป็นตัวเลข'})
 
 
 class ChatRoomListView(generics.ListAPIView):
@@ -16,75 +32,136 @@ class ChatRoomListView(generics.ListAPIView):
     
     def get_queryset(self):
         user = self.request.user
-        return ChatRoom.objects.filter(
-            Q(customer=user) | Q(mechanic=user)
-        ).select_related('customer', 'mechanic', 'booking').order_by('-updated_at')
+        # Counters and last message are columns of the room - one query for the whole list
+        return user_rooms(user).select_related(
+            'customer', 'mechanic', 'booking__motorcycle', 'last_message__sender'
+        ).order_by('-updated_at')
 
 
 class MessageListCreateView(generics.ListCreateAPIView):
-    """List messages in a chat room or create new message"""
+    """
+    List messages in a chat room or create new message
+    
+    GET ?after_id=<watermark> (or ?since=) returns only what changed after the
+    client's watermark:
+        {"messages": [...newer messages, oldest first],
+         "read_up_to": {"<user id>": newest message of that user read by the other},
+         "watermark": <pass as after_id next time>, "has_more": bool}
+    with an ETag, so an unchanged room answers 304 Not Modified.
+    Without a cursor the whole history is returned as before.
+    """
     serializer_class = MessageSerializer
     permission_classes = [permissions.IsAuthenticated]
     
-    def get_queryset(self):
-        chat_id = self.kwargs['pk']
-        user = self.request.user
-        
+    def get_chat_room(self):
         # Verify user has access to this chat room
-        ChatRoom.objects.get(
-            Q(customer=user) | Q(mechanic=user),
-            id=chat_id
-        )
-        
+        if not hasattr(self, '_chat_room'):
+            self._chat_room = get_user_room(self.request.user, self.kwargs['pk'])
+            if self._chat_room is None:
+                raise NotFound('ไม่พบห้องแชท')
+        return self._chat_room
+    
+    def get_read_receipts(self):
+        if not hasattr(self, '_read_receipts'):
+            self._read_receipts = read_receipts(self.get_chat_room())
+        return self._read_receipts
+    
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        # is_read of each message comes from the room's read watermarks
+        context['read_receipts'] = self.get_read_receipts()
+        return context
+    
+    def get_queryset(self):
         return Message.objects.filter(
-            chat_room_id=chat_id
+            chat_room=self.get_chat_room()
         ).select_related('sender').order_by('created_at')
     
-    def create(self, request, *args, **kwargs):
-        chat_id = self.kwargs['pk']
-        user = request.user
+    def list(self, request, *args, **kwargs):
+        after_id = parse_message_id(request.query_params.get('after_id', request.query_params.get('since')), 'after_id')
+        if after_id is None:
+            return super().list(request, *args, **kwargs)
         
-        # Verify user has access
-        chat_room = ChatRoom.objects.get(
-            Q(customer=user) | Q(mechanic=user),
-            id=chat_id
-        )
+        chat_room = self.get_chat_room()
+        read_up_to = {str(user_id): message_id for user_id, message_id in self.get_read_receipts().items()}
+        # last_message_id and the watermarks change whenever the delta would
+        etag = quote_etag('-'.join(
+            str(part) for part in [chat_room.id, after_id, chat_room.last_message_id, *read_up_to.values()]
+        ))
         
-        # Create message
-        message = Message.objects.create(
-            chat_room=chat_room,
-            sender=user,
-            message=request.data.get('message', '')
-        )
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            messages = list(messages_after(chat_room, after_id)[:MESSAGE_SYNC_LIMIT + 1])
+            has_more = len(messages) > MESSAGE_SYNC_LIMIT
+            messages = messages[:MESSAGE_SYNC_LIMIT]
+            response = Response({
+                'messages': self.get_serializer(messages, many=True).data,
+                'read_up_to': read_up_to,
+                'watermark': messages[-1].id if messages else after_id,
+                'has_more': has_more,
+            })
         
-        # Update chat room timestamp
-        chat_room.save()
+        response['ETag'] = etag
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+    
+    def create(self, request, *args, **kwargs):
+        user = request.user
+        chat_room = self.get_chat_room()
+        
+        # Create message (pushed to the room's WebSocket subscribers after commit)
+        message = post_message(chat_room, user, request.data.get('message', ''))
         
         serializer = self.get_serializer(message)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
 
 class MarkMessageReadView(APIView):
-    """Mark message as read"""
+    """Mark message as read (and every earlier message of the room - read state is a watermark)"""
     permission_classes = [permissions.IsAuthenticated]
     
     def post(self, request, pk):
         user = request.user
         
         # Get message
-        message = Message.objects.get(pk=pk)
+        message = Message.objects.filter(pk=pk).only('id', 'chat_room', 'sender').first()
+        chat_room = get_user_room(user, message.chat_room_id) if message else None
+        if chat_room is None:
+            raise NotFound('ไม่พบข้อความ')
         
         # Verify user is recipient
-        if message.sender == user:
+        if message.sender_id == user.id:
             return Response({'error': 'Cannot mark own message as read'}, status=status.HTTP_400_BAD_REQUEST)
         
-        # Mark as read
-        message.is_read = True
-        message.save()
+        # Mark as read (sends the read receipt)
+        mark_read(chat_room, user, message.id)
         
         return Response({'status': 'marked as read'}, status=status.HTTP_200_OK)
 
 
+class MarkRoomReadView(APIView):
+    """
+    Mark a chat room as read up to a message in one call
+    
+    POST {"up_to": <message id>} - omit up_to to mark the whole room read
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def post(self, request, pk):
+        user = request.user
+        chat_room = get_user_room(user, pk)
+        if chat_room is None:
+            raise NotFound('ไม่พบห้องแชท')
+        
+        mark_read(chat_room, user, parse_message_id(request.data.get('up_to'), 'up_to'))
+        
+        chat_room.refresh_from_db(fields=['customer_unread', 'mechanic_unread'])
+        return Response({
+            'last_read_id': chat_room.get_last_read_id(user),
+            'unread_count': chat_room.get_unread_count(user),
+        }, status=status.HTTP_200_OK)
+
+
 class UnreadMessageCountView(APIView):
     """Get total unread message count for current user"""
     permission_classes = [permissions.IsAuthenticated]
@@ -92,15 +169,12 @@ class UnreadMessageCountView(APIView):
     def get(self, request):
         user = request.user
         
-        # Get all chat rooms for this user
-        chat_rooms = ChatRoom.objects.filter(
-            Q(customer=user) | Q(mechanic=user)
+        # Sum the user's side of the denormalized counters over all their rooms
+        totals = user_rooms(user).aggregate(
+            as_customer=Sum('customer_unread', filter=Q(customer=user)),
+            as_mechanic=Sum('mechanic_unread', filter=Q(mechanic=user)),
         )
-        
-        # Count unread messages
-        total_unread = 0
-        for room in chat_rooms:
-            total_unread += room.get_unread_count(user)
+        total_unread = (totals['as_customer'] or 0) + (totals['as_mechanic'] or 0)
         
         return Response({
             'unread_count': total_unread
@@ -5,7 +5,8 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.db.models import Q
-from .models import ChatRoom, Message
+from .models import ChatRoom
+from .services import mark_read, read_receipts, user_rooms
 
 
 @login_required
@@ -14,16 +15,14 @@ def chat_list_view(request):
     user = request.user
     
     # Get all chat rooms where user is either customer or mechanic
-    chat_rooms = ChatRoom.objects.filter(
-        Q(customer=user) | Q(mechanic=user)
-    ).select_related('customer', 'mechanic', 'booking__motorcycle').order_by('-updated_at')
+    chat_rooms = user_rooms(user).select_related(
+        'customer', 'mechanic', 'booking__motorcycle', 'last_message__sender'
+    ).order_by('-updated_at')
     
-    # Add unread count and other info for each room
+    # Add unread count and other info for each room (no extra queries)
     for room in chat_rooms:
         room.unread_count = room.get_unread_count(user)
         room.other_user = room.get_other_user(user)
-        # Get last message
-        room.last_message = room.messages.order_by('-created_at').first()
     
     context = {
         'chat_rooms': chat_rooms,
@@ -44,14 +43,14 @@ def chat_detail_view(request, chat_id):
         id=chat_id
     )
     
-    # Mark all messages as read
-    Message.objects.filter(
-        chat_room=chat_room,
-        is_read=False
-    ).exclude(sender=user).update(is_read=True)
+    # Mark all messages as read (and tell the sender)
+    mark_read(chat_room, user)
     
-    # Get messages
-    messages_list = chat_room.messages.select_related('sender').all()
+    # Get messages (read ticks from the read watermarks)
+    messages_list = list(chat_room.messages.select_related('sender').all())
+    receipts = read_receipts(chat_room)
+    for msg in messages_list:
+        msg.is_read = msg.id <= (receipts.get(msg.sender_id) or 0)
     
     # Get other user
     other_user = chat_room.get_other_user(user)
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import ChatSession, ChatMessage, KnowlageDatabase
+from .models import ChatSession, ChatMessage, KnowlageDatabase, SemanticAnswerCache, SemanticCacheStats
 
 
 @admin.register(ChatSession)
@@ -56,3 +56,24 @@ class KnowledgeDatabaseAdmin(admin.ModelAdmin):
         }),
     )
 
+
+@admin.register(SemanticAnswerCache)
+class SemanticAnswerCacheAdmin(admin.ModelAdmin):
+    list_display = ('query_preview', 'backend', 'hit_count', 'created_at', 'last_hit_at')
+    list_filter = ('backend', 'created_at')
+    search_fields = ('query', 'answer')
+    readonly_fields = ('created_at', 'last_hit_at', 'hit_count')
+    exclude = ('embedding',)
+    
+    def query_preview(self, obj):
+        return obj.query[:80] + '...' if len(obj.query) > 80 else obj.query
+    query_preview.short_description = 'คำถาม'
+
+
+@admin.register(SemanticCacheStats)
+class SemanticCacheStatsAdmin(admin.ModelAdmin):
+    list_display = ('date', 'hits', 'misses', 'near_misses', 'invalidations', 'hit_rate_display')
+    
+    def hit_rate_display(self, obj):
+        return f"{obj.hit_rate:.1%}"
+    hit_rate_display.short_description = 'Hit rate'
@@ -0,0 +1,217 @@
+"""
+Admission control and request coalescing for the chatbot endpoints (Redis)
+
+- admit(user): at most CHATBOT_USER_MAX_IN_FLIGHT answers in flight per user
+  and a token bucket of CHATBOT_USER_BURST messages refilled at
+  CHATBOT_USER_RATE per second. Rejections raise AdmissionRejected with a
+  Retry-After, so the views answer 429 instead of tying up another worker.
+  Slots are leases that expire after CHATBOT_ADMISSION_LEASE_SECONDS, so a
+  killed worker cannot lock a user out.
+- single_flight(key, compute): identical questions in flight at the same
+  time (across all workers) share one upstream call; the first caller runs
+  it, the others wait up to CHATBOT_COALESCE_WAIT seconds for its result.
+
+Both fail open: when Redis is unreachable requests are let through uncoalesced.
+"""
+import hashlib
+import json
+import logging
+import math
+import time
+import uuid
+
+from django.conf import settings
+
+from .redis_client import RedisError, get_redis
+
+logger = logging.getLogger(__name__)
+
+# Retry-After for a user who already has CHATBOT_USER_MAX_IN_FLIGHT answers running
+BUSY_RETRY_AFTER = 2
+# How long a finished flight's result stays readable for its waiters
+FLIGHT_RESULT_TTL = 10
+
+# KEYS: leases (zset token -> expiry), bucket (hash)
+# ARGV: max_in_flight, lease_seconds, token, rate, burst
+# Returns {0, ''} when admitted, {1, ''} when busy, {2, retry_after} when rate limited
+ADMIT_SCRIPT = """
+local now = redis.call('TIME')
+now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+local max_in_flight = tonumber(ARGV[1])
+local lease = tonumber(ARGV[2])
+local rate = tonumber(ARGV[4])
+local burst = tonumber(ARGV[5])
+
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+if redis.call('ZCARD', KEYS[1]) >= max_in_flight then
+    return {1, ''}
+end
+
+local bucket = redis.call('HMGET', KEYS[2], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or burst
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+if tokens < 1 then
+    return {2, tostring((1 - tokens) / rate)}
+end
+redis.call('HSET', KEYS[2], 'tokens', tostring(tokens - 1), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[2], math.ceil(burst / rate) + 1)
+
+redis.call('ZADD', KEYS[1], now + lease, ARGV[3])
+redis.call('EXPIRE', KEYS[1], math.ceil(lease) + 1)
+return {0, ''}
+"""
+
+# Delete KEYS[1] only if it still holds ARGV[1]
+RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class AdmissionRejected(Exception):
+    """Request refused by admission control; retry_after is in whole seconds"""
+
+    MESSAGES = {
+        'busy': 'กำลังตอบคำถามก่อนหน้าของคุณอยู่ กรุณารอสักครู่',
+        'rate': 'ส่งข้อความถี่เกินไป กรุณารอสักครู่แล้วลองใหม่',
+    }
+
+    def __init__(self, reason, retry_after):
+        self.reason = reason  # 'busy' or 'rate'
+        self.retry_after = max(1, math.ceil(retry_after))
+        super().__init__(f'{reason}: retry after {self.retry_after}s')
+
+    @property
+    def message(self):
+        return self.MESSAGES[self.reason]
+
+    def as_dict(self):
+        return {'error': self.message, 'reason': self.reason, 'retry_after': self.retry_after}
+
+
+class Admission:
+    """An admitted request; release() (or leave the with block) when the answer is done"""
+
+    def __init__(self, leases_key=None, token=None):
+        self.leases_key = leases_key
+        self.token = token
+
+    def release(self):
+        if self.leases_key is None:
+            return
+        try:
+            get_redis().zrem(self.leases_key, self.token)
+        except RedisError as e:
+            logger.warning(f"Admission release failed (lease expires on its own): {e}")
+        self.leases_key = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+def admit(user):
+    """Admit one chatbot request of user or raise AdmissionRejected"""
+    if not settings.CHATBOT_ADMISSION_ENABLED:
+        return Admission()
+
+    leases_key = f'chatbot:admission:{user.pk}:leases'
+    token = uuid.uuid4().hex
+    try:
+        status, retry_after = get_redis().eval(
+            ADMIT_SCRIPT,
+            2,
+            leases_key,
+            f'chatbot:admission:{user.pk}:bucket',
+            settings.CHATBOT_USER_MAX_IN_FLIGHT,
+            settings.CHATBOT_ADMISSION_LEASE_SECONDS,
+            token,
+            settings.CHATBOT_USER_RATE,
+            settings.CHATBOT_USER_BURST,
+        )
+    except RedisError as e:
+        logger.warning(f"Admission control skipped, Redis unavailable: {e}")
+        return Admission()
+
+    status = int(status)
+    if status == 1:
+        raise AdmissionRejected('busy', BUSY_RETRY_AFTER)
+    if status == 2:
+        raise AdmissionRejected('rate', float(retry_after))
+    return Admission(leases_key, token)
+
+
+def flight_key(*parts):
+    """Coalescing key of a request (parts must identify the answer completely)"""
+    return hashlib.sha256('\x00'.join(parts).encode('utf-8')).hexdigest()
+
+
+def wait_for_flight(client, lock_key, result_key):
+    """Poll for the leader's result; None when it failed or took too long"""
+    deadline = time.monotonic() + settings.CHATBOT_COALESCE_WAIT
+    interval = 0.05
+    while time.monotonic() < deadline:
+        time.sleep(interval)
+        interval = min(interval * 2, 0.5)
+        data = client.get(result_key)
+        if data is not None:
+            return json.loads(data)
+        if not client.exists(lock_key):
+            # Leader gone - either it just finished or it failed
+            data = client.get(result_key)
+            return json.loads(data) if data is not None else None
+    return None
+
+
+def single_flight(key, compute):
+    """
+    Run compute() once for all concurrent calls with the same key.
+
+    Returns (result, shared): shared is True when the result came from another
+    request's call. compute() must return something JSON serializable. If the
+    leading call fails or times out the waiters run compute() themselves.
+    """
+    if not settings.CHATBOT_COALESCE_ENABLED:
+        return compute(), False
+
+    lock_key = f'chatbot:flight:{key}'
+    result_key = f'chatbot:flight:{key}:result'
+    token = uuid.uuid4().hex
+    try:
+        client = get_redis()
+        leader = client.set(lock_key, token, nx=True, ex=settings.CHATBOT_COALESCE_WAIT)
+    except RedisError as e:
+        logger.warning(f"Request coalescing skipped, Redis unavailable: {e}")
+        return compute(), False
+
+    if not leader:
+        try:
+            result = wait_for_flight(client, lock_key, result_key)
+        except RedisError as e:
+            logger.warning(f"Request coalescing wait failed: {e}")
+            result = None
+        if result is not None:
+            return result, True
+        return compute(), False
+
+    try:
+        result = compute()
+    except Exception:
+        try:
+            client.eval(RELEASE_LOCK_SCRIPT, 1, lock_key, token)
+        except RedisError:
+            pass
+        raise
+
+    try:
+        # Result first, then unlock: a waiter that sees the lock gone finds the result
+        client.set(result_key, json.dumps(result, ensure_ascii=False), ex=FLIGHT_RESULT_TTL)
+        client.eval(RELEASE_LOCK_SCRIPT, 1, lock_key, token)
+    except RedisError as e:
+        logger.warning(f"Request coalescing result not shared: {e}")
+    return result, False
@@ -0,0 +1,200 @@
+"""
+Split long KnowBase documents into overlapping, token-bounded chunks
+
+Token counts are estimated (no tokenizer dependency): Latin words count as
+one token each and Thai, which has no spaces, as one token per
+THAI_CHARS_PER_TOKEN characters. Chunks end on a paragraph, line, sentence
+or word boundary where one is close to the limit.
+
+build_chunks() embeds the chunks of one document in one batched call;
+chunk_documents() sends the chunks of many documents through an
+EmbeddingPipeline (importers, manage.py chunk_knowbase).
+"""
+import logging
+import re
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+
+from .embedding_pipeline import EmbeddingPipeline
+from .embeddings import embed_texts
+from .models import KnowBase, KnowBaseChunk
+
+logger = logging.getLogger(__name__)
+
+THAI_CHARS_PER_TOKEN = 3
+# split_text() only looks this many characters per token ahead of a chunk start,
+# so splitting stays linear in the document length
+MAX_CHARS_PER_TOKEN = 16
+# Boundaries tried in order, best first
+_BOUNDARIES = ['\n\n', '\n', '. ', '? ', '! ', ' ']
+_THAI_RUN_RE = re.compile(r'[\u0E00-\u0E7F]+')
+_WORD_RE = re.compile(r'[^\s\u0E00-\u0E7F]+')
+
+
+def estimate_tokens(text):
+    thai_tokens = sum(-(-len(run) // THAI_CHARS_PER_TOKEN) for run in _THAI_RUN_RE.findall(text))
+    return thai_tokens + len(_WORD_RE.findall(text))
+
+
+def _cut_length(text, max_tokens):
+    """Longest prefix length of text that fits in max_tokens"""
+    low, high = 1, len(text)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if estimate_tokens(text[:mid]) <= max_tokens:
+            low = mid
+        else:
+            high = mid - 1
+    return low
+
+
+def split_text(text, max_tokens=None, overlap_tokens=None):
+    """
+    Return [(char_start, chunk_text), ...] covering the whole text.
+    Consecutive chunks share about overlap_tokens tokens.
+    """
+    max_tokens = max_tokens or settings.CHATBOT_CHUNK_TOKENS
+    overlap_tokens = min(
+        overlap_tokens if overlap_tokens is not None else settings.CHATBOT_CHUNK_OVERLAP_TOKENS,
+        max_tokens // 2,
+    )
+    text = text.strip()
+    if not text:
+        return []
+
+    window_chars = max_tokens * MAX_CHARS_PER_TOKEN
+    chunks = []
+    start = 0
+    while start < len(text):
+        remaining = text[start:start + window_chars]
+        if estimate_tokens(remaining) <= max_tokens:
+            if start + len(remaining) >= len(text):
+                chunks.append((start, remaining))
+                break
+            cut = len(remaining)  # Long words / whitespace - the window itself fits
+        else:
+            cut = _cut_length(remaining, max_tokens)
+        # Prefer a natural boundary in the last third of the window
+        for boundary in _BOUNDARIES:
+            position = remaining.rfind(boundary, cut * 2 // 3, cut)
+            if position != -1:
+                cut = position + len(boundary)
+                break
+        chunks.append((start, remaining[:cut].strip()))
+
+        # Next chunk starts overlap_tokens before the cut, on a word boundary if there is one
+        window = remaining[:cut]
+        next_start = start + max(cut - _cut_length(window[::-1], overlap_tokens), 1)
+        space = text.find(' ', next_start, start + cut)
+        if space != -1:
+            next_start = space + 1
+        start = next_start
+    return chunks
+
+
+def split_chunks(knowbase):
+    """Unsaved, unembedded KnowBaseChunk rows of one KnowBase row"""
+    return [
+        KnowBaseChunk(
+            knowbase=knowbase,
+            chunk_index=index,
+            content=content,
+            char_start=char_start,
+            token_count=estimate_tokens(content),
+        )
+        for index, (char_start, content) in enumerate(split_text(knowbase.content))
+    ]
+
+
+def chunk_embedding_text(knowbase, chunk):
+    """Each chunk is embedded with the document title in front so a passage keeps its context"""
+    return f"{knowbase.title}\n{chunk.content}"
+
+
+def reuses_document_embedding(knowbase, chunks):
+    """A document that fits in one chunk reuses the document embedding"""
+    return len(chunks) == 1 and knowbase.embedding is not None
+
+
+def save_chunks(knowbase, chunks):
+    with transaction.atomic():
+        KnowBaseChunk.objects.filter(knowbase=knowbase).delete()
+        KnowBaseChunk.objects.bulk_create(chunks)
+    logger.info(f"KnowBase {knowbase.id}: {len(chunks)} chunks")
+
+
+def build_chunks(knowbase, embed=True):
+    """Replace the chunks of one KnowBase row (all chunks embedded in one batched call)"""
+    chunks = split_chunks(knowbase)
+    if embed:
+        if reuses_document_embedding(knowbase, chunks):
+            chunks[0].embedding = knowbase.embedding
+        elif chunks:
+            vectors = embed_texts([chunk_embedding_text(knowbase, chunk) for chunk in chunks], task_type=None)
+            for chunk, vector in zip(chunks, vectors):
+                chunk.embedding = vector
+    save_chunks(knowbase, chunks)
+    return chunks
+
+
+def chunk_documents(knowbases, pipeline=None, progress=None):
+    """
+    Replace the chunks of many KnowBase rows, embedding every chunk through one
+    EmbeddingPipeline (default: the primary backend, no task_type like the documents).
+
+    A document keeps its old chunks when any of its new chunks failed.
+    progress(done, total) is called after each saved document.
+    Returns (chunk_count, [(knowbase, error), ...]).
+    """
+    pipeline = pipeline or EmbeddingPipeline.for_backend()
+    documents = []
+    items = []
+    for doc_index, knowbase in enumerate(knowbases):
+        chunks = split_chunks(knowbase)
+        documents.append((knowbase, chunks))
+        if reuses_document_embedding(knowbase, chunks):
+            chunks[0].embedding = knowbase.embedding
+            continue
+        items.extend(
+            ((doc_index, chunk_index), chunk_embedding_text(knowbase, chunk))
+            for chunk_index, chunk in enumerate(chunks)
+        )
+
+    errors = {}
+    for (doc_index, chunk_index), vector, error in pipeline.run(items):
+        if error is not None:
+            errors.setdefault(doc_index, error)
+            continue
+        documents[doc_index][1][chunk_index].embedding = vector
+
+    saved = 0
+    failed = []
+    for doc_index, (knowbase, chunks) in enumerate(documents):
+        if doc_index in errors:
+            failed.append((knowbase, errors[doc_index]))
+            continue
+        save_chunks(knowbase, chunks)
+        saved += len(chunks)
+        if progress:
+            progress(doc_index + 1, len(documents))
+    return saved, failed
+
+
+def chunk_imported(knowbase_ids, changed_ids=(), pipeline=None):
+    """
+    Chunk the active rows of knowbase_ids that have no chunks yet or whose
+    text changed (changed_ids), so imports are searchable with CHATBOT_USE_CHUNKS.
+    Returns (document_count, chunk_count, [(knowbase, error), ...]).
+    """
+    documents = list(
+        KnowBase.objects
+        .filter(id__in=list(knowbase_ids), is_active=True)
+        .filter(~Exists(KnowBaseChunk.objects.filter(knowbase=OuterRef('pk'))) | Q(id__in=list(changed_ids)))
+        .defer('embedding_half', 'embedding_bits', 'raw_data')
+    )
+    if not documents:
+        return 0, 0, []
+    saved, failed = chunk_documents(documents, pipeline=pipeline)
+    return len(documents), saved, failed
@@ -0,0 +1,185 @@
+"""
+Near-duplicate detection for KnowBase documents (MinHash + LSH)
+
+Scraped Pantip threads and repeated spec pages produce many near-identical
+documents that crowd the top-k results. Every document gets a MinHash
+signature of its character shingles (KnowBase.minhash). The importers keep
+a NearDuplicateIndex, an LSH index of BANDS x ROWS bands over the canonical
+rows, so checking a new document costs a few dict lookups however big the
+table is.
+
+A candidate counts as a duplicate when its estimated Jaccard similarity is
+at least CHATBOT_DEDUP_THRESHOLD and it has the same brand, because
+retrieval filters by brand. The duplicate is deactivated, points at its
+canonical row (KnowBase.duplicate_of) and loses its vectors and chunks, so
+it leaves the HNSW indexes.
+
+manage.py dedupe_knowbase re-clusters the whole table.
+"""
+import logging
+import random
+import zlib
+from collections import defaultdict
+
+from django.conf import settings
+
+from .embeddings import normalize_query
+from .models import KnowBase, KnowBaseLocalEmbedding, KnowBaseOpenAIEmbedding
+
+logger = logging.getLogger(__name__)
+
+NUM_PERM = 128
+# 16 bands of 8 rows: pairs at Jaccard 0.85 become candidates with probability ~0.99
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 5
+
+_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+# Fixed seed - stored signatures must stay comparable across processes
+_rng = random.Random(20251)
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+
+# Tables holding vectors of a KnowBase row besides KnowBase itself
+SIDE_TABLES = [KnowBaseOpenAIEmbedding, KnowBaseLocalEmbedding]
+
+
+def shingles(text):
+    """Hashed character shingles (Thai has no word spaces, so characters, not words)"""
+    text = normalize_query(text).replace(' ', '')
+    if len(text) <= SHINGLE_SIZE:
+        return {zlib.crc32(text.encode('utf-8'))} if text else set()
+    return {
+        zlib.crc32(text[i:i + SHINGLE_SIZE].encode('utf-8'))
+        for i in range(len(text) - SHINGLE_SIZE + 1)
+    }
+
+
+def signature(text):
+    """MinHash signature of text (NUM_PERM ints), None for empty text"""
+    hashes = shingles(text)
+    if not hashes:
+        return None
+    return [
+        min(((a * h + b) % _PRIME) & _MAX_HASH for h in hashes)
+        for a, b in _PERMUTATIONS
+    ]
+
+
+def similarity(sig_a, sig_b):
+    """Estimated Jaccard similarity of the texts behind two signatures"""
+    return sum(1 for x, y in zip(sig_a, sig_b) if x == y) / NUM_PERM
+
+
+def dedup_group(obj):
+    """Only documents of the same brand can be duplicates of each other"""
+    return (obj.brand or '').lower()
+
+
+class NearDuplicateIndex:
+    """LSH index over the signatures of canonical KnowBase rows"""
+
+    def __init__(self, threshold=None):
+        self.threshold = threshold if threshold is not None else settings.CHATBOT_DEDUP_THRESHOLD
+        self.buckets = defaultdict(set)
+        self.signatures = {}
+
+    @classmethod
+    def load(cls, queryset=None, threshold=None):
+        """Index the active, canonical rows that already have a signature"""
+        index = cls(threshold)
+        if queryset is None:
+            queryset = KnowBase.objects.all()
+        rows = queryset.filter(
+            is_active=True, duplicate_of__isnull=True, minhash__isnull=False
+        ).values_list('id', 'brand', 'minhash')
+        for obj_id, brand, sig in rows.iterator(chunk_size=2000):
+            index.add(obj_id, (brand or '').lower(), sig)
+        return index
+
+    def __len__(self):
+        return len(self.signatures)
+
+    @staticmethod
+    def band_keys(group, sig):
+        return [(group, band, tuple(sig[band * ROWS:(band + 1) * ROWS])) for band in range(BANDS)]
+
+    def add(self, obj_id, group, sig):
+        self.remove(obj_id)
+        self.signatures[obj_id] = (group, sig)
+        for key in self.band_keys(group, sig):
+            self.buckets[key].add(obj_id)
+
+    def remove(self, obj_id):
+        entry = self.signatures.pop(obj_id, None)
+        if entry is None:
+            return
+        for key in self.band_keys(*entry):
+            bucket = self.buckets.get(key)
+            if bucket is not None:
+                bucket.discard(obj_id)
+                if not bucket:
+                    del self.buckets[key]
+
+    def match(self, group, sig, exclude=None):
+        """(canonical id, similarity) of the most similar indexed row above the threshold, or None"""
+        candidates = set()
+        for key in self.band_keys(group, sig):
+            candidates |= self.buckets.get(key, set())
+        candidates.discard(exclude)
+
+        best = None
+        for obj_id in candidates:
+            score = similarity(sig, self.signatures[obj_id][1])
+            if score >= self.threshold and (best is None or score > best[1]):
+                best = (obj_id, score)
+        return best
+
+
+def retire_duplicate(obj, canonical_id):
+    """Deactivate obj as a duplicate of canonical_id and drop its vectors"""
+    # Rows that pointed at obj now point at its canonical row
+    KnowBase.objects.filter(duplicate_of=obj).update(duplicate_of_id=canonical_id)
+    obj.duplicate_of_id = canonical_id
+    obj.is_active = False
+    obj.embedding = None
+    obj.set_quantized_embeddings()
+    obj.embedding_hash = ''
+    obj.embedding_model = ''
+    obj.embedding_version = 0
+    obj.save(update_fields=[
+        'minhash', 'duplicate_of', 'is_active', 'embedding', 'embedding_half', 'embedding_bits',
+        'embedding_hash', 'embedding_model', 'embedding_version', 'updated_at',
+    ])
+    obj.chunks.all().delete()
+    for table in SIDE_TABLES:
+        table.objects.filter(knowbase=obj).delete()
+
+
+def dedupe(obj, index, sig=None):
+    """
+    Check a saved KnowBase row against index and record the result.
+
+    A near-duplicate is retired in favour of its canonical row; anything else
+    becomes canonical (reactivated if it used to be a duplicate) and is added
+    to the index. Returns (canonical id, similarity) for a duplicate, else None.
+    """
+    if sig is None:
+        sig = signature(obj.get_dedup_text())
+    obj.minhash = sig
+    group = dedup_group(obj)
+    match = index.match(group, sig, exclude=obj.id) if sig is not None else None
+
+    if match is not None:
+        index.remove(obj.id)
+        retire_duplicate(obj, match[0])
+        logger.info(f"KnowBase {obj.id} is a near-duplicate of {match[0]} ({match[1]:.2f})")
+        return match
+
+    if obj.duplicate_of_id is not None:
+        obj.duplicate_of = None
+        obj.is_active = True
+    obj.save(update_fields=['minhash', 'duplicate_of', 'is_active', 'updated_at'])
+    if sig is not None and obj.is_active:
+        index.add(obj.id, group, sig)
+    return None
@@ -0,0 +1,276 @@
+"""
+Pluggable embedding backends
+
+- GeminiEmbeddingBackend: Google text-embedding-004 API (batched requests)
+- OpenAIEmbeddingBackend: OpenAI embeddings API (text-embedding-3-large, 1536
+  dimensions) - only used for the 'openai-1536' embedding space
+- LocalEmbeddingBackend: multilingual sentence-transformers model on CPU,
+  batched, optional ONNX / int8 ONNX, optional worker process pool.
+  Works offline once the model is downloaded.
+
+Select with settings.CHATBOT_EMBEDDING_BACKEND ('gemini' or 'local') for
+KnowBase.embedding; other spaces are listed in chatbot/embedding_spaces.py.
+Vectors from different models are not comparable: after switching backend,
+re-embed the knowledge base with manage.py reembed_knowbase.
+"""
+import atexit
+import logging
+import threading
+import warnings
+from pathlib import Path
+
+from django.conf import settings
+
+warnings.filterwarnings("ignore", category=FutureWarning)
+import google.generativeai as genai  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+_configured = False
+
+
+class EmbeddingError(Exception):
+    """Raised when the embedding API cannot return a vector"""
+
+
+def configure_genai(api_key=None):
+    """Configure the Gemini client once per process (api_key overrides settings.GEMINI_API_KEY)"""
+    global _configured
+    if _configured and not api_key:
+        return
+    api_key = api_key or getattr(settings, 'GEMINI_API_KEY', '')
+    if not api_key:
+        raise EmbeddingError('GEMINI_API_KEY is not configured')
+    genai.configure(api_key=api_key)
+    _configured = True
+
+
+class EmbeddingBackend:
+    """Interface every embedding backend implements"""
+    name = ''
+    # Largest number of texts passed to one embed() call
+    max_batch_size = 1
+
+    @property
+    def model(self):
+        """Model identifier (part of the embedding cache key)"""
+        raise NotImplementedError
+
+    def embed(self, texts, task_type=None):
+        """Return one vector (list of floats) per text, in order"""
+        raise NotImplementedError
+
+    def embed_batched(self, texts, task_type=None):
+        """embed() in slices of max_batch_size"""
+        vectors = []
+        for i in range(0, len(texts), self.max_batch_size):
+            vectors.extend(self.embed(texts[i:i + self.max_batch_size], task_type=task_type))
+        return vectors
+
+    def close(self):
+        """Release resources (worker processes etc.)"""
+
+
+class GeminiEmbeddingBackend(EmbeddingBackend):
+    """
+    Google Gemini embedding API.
+
+    Queries use task_type='retrieval_query' (same as debug_pgvector.py);
+    importers embed documents without a task_type to match the n8n Embeddings node.
+    """
+    name = 'gemini'
+    max_batch_size = 100  # batchEmbedContents limit
+
+    @property
+    def model(self):
+        return settings.CHATBOT_EMBEDDING_MODEL
+
+    def embed(self, texts, task_type=None):
+        configure_genai()
+        try:
+            kwargs = {'model': self.model, 'content': list(texts)}
+            if task_type:
+                kwargs['task_type'] = task_type
+            result = genai.embed_content(**kwargs)
+        except Exception as e:
+            logger.error(f"Embedding error ({self.model}): {e}")
+            raise EmbeddingError(str(e)) from e
+        return result['embedding']
+
+
+class OpenAIEmbeddingBackend(EmbeddingBackend):
+    """
+    OpenAI embeddings API. Vectors are CHATBOT_OPENAI_EMBEDDING_DIMENSIONS long,
+    so they live in their own embedding space, never in KnowBase.embedding.
+    """
+    name = 'openai'
+    max_batch_size = 2048  # inputs per request
+
+    def __init__(self):
+        self.api_key = None
+        self._client = None
+
+    @property
+    def model(self):
+        return (
+            f"openai:{settings.CHATBOT_OPENAI_EMBEDDING_MODEL}:"
+            f"{settings.CHATBOT_OPENAI_EMBEDDING_DIMENSIONS}"
+        )
+
+    def configure(self, api_key=None):
+        """Create the client (api_key overrides settings.OPENAI_API_KEY)"""
+        api_key = api_key or self.api_key or getattr(settings, 'OPENAI_API_KEY', '')
+        if not api_key:
+            raise EmbeddingError('OPENAI_API_KEY is not configured')
+        try:
+            from openai import OpenAI
+        except ImportError as e:
+            raise EmbeddingError('openai is not installed') from e
+        self.api_key = api_key
+        self._client = OpenAI(api_key=api_key)
+
+    def embed(self, texts, task_type=None):
+        if self._client is None:
+            self.configure()
+        try:
+            response = self._client.embeddings.create(
+                model=settings.CHATBOT_OPENAI_EMBEDDING_MODEL,
+                input=list(texts),
+                dimensions=settings.CHATBOT_OPENAI_EMBEDDING_DIMENSIONS,
+            )
+        except Exception as e:
+            logger.error(f"Embedding error ({self.model}): {e}")
+            raise EmbeddingError(str(e)) from e
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+
+class LocalEmbeddingBackend(EmbeddingBackend):
+    """
+    sentence-transformers model running in-process on CPU.
+
+    CHATBOT_LOCAL_EMBEDDING_ONNX uses the ONNX Runtime backend;
+    CHATBOT_LOCAL_EMBEDDING_INT8 additionally exports (once) and loads a
+    dynamically int8-quantized ONNX model. CHATBOT_LOCAL_EMBEDDING_WORKERS > 1
+    spreads large batches over a pool of worker processes.
+    """
+    name = 'local'
+
+    def __init__(self):
+        self.batch_size = settings.CHATBOT_LOCAL_EMBEDDING_BATCH_SIZE
+        self.workers = settings.CHATBOT_LOCAL_EMBEDDING_WORKERS
+        self.max_batch_size = self.batch_size * max(self.workers, 1) * 4
+        self._model = None
+        self._pool = None
+        self._lock = threading.Lock()
+
+    @property
+    def model(self):
+        suffix = ''
+        if settings.CHATBOT_LOCAL_EMBEDDING_INT8:
+            suffix = ':onnx-int8'
+        elif settings.CHATBOT_LOCAL_EMBEDDING_ONNX:
+            suffix = ':onnx'
+        return f"local:{settings.CHATBOT_LOCAL_EMBEDDING_MODEL}{suffix}"
+
+    def load(self):
+        """Load the model once per process"""
+        if self._model is not None:
+            return self._model
+        with self._lock:
+            if self._model is None:
+                try:
+                    from sentence_transformers import SentenceTransformer
+                except ImportError as e:
+                    raise EmbeddingError('sentence-transformers is not installed') from e
+
+                model_name = settings.CHATBOT_LOCAL_EMBEDDING_MODEL
+                try:
+                    if settings.CHATBOT_LOCAL_EMBEDDING_INT8:
+                        self._model = self._load_int8(SentenceTransformer, model_name)
+                    elif settings.CHATBOT_LOCAL_EMBEDDING_ONNX:
+                        self._model = SentenceTransformer(model_name, device='cpu', backend='onnx')
+                    else:
+                        self._model = SentenceTransformer(model_name, device='cpu')
+                except Exception as e:
+                    logger.error(f"Loading local embedding model {model_name} failed: {e}")
+                    raise EmbeddingError(str(e)) from e
+                logger.info(f"Local embedding model loaded: {self.model}")
+        return self._model
+
+    def _load_int8(self, SentenceTransformer, model_name):
+        """Export an int8 ONNX model next to the other cached models (first run only)"""
+        from sentence_transformers import export_dynamic_quantized_onnx_model
+
+        config = settings.CHATBOT_LOCAL_EMBEDDING_INT8_CONFIG
+        export_dir = Path(settings.CHATBOT_LOCAL_EMBEDDING_DIR) / model_name.replace('/', '__')
+        file_name = f'onnx/model_qint8_{config}.onnx'
+        if not (export_dir / file_name).exists():
+            logger.info(f"Exporting int8 ONNX model to {export_dir}")
+            model = SentenceTransformer(model_name, device='cpu', backend='onnx')
+            model.save(str(export_dir))
+            export_dynamic_quantized_onnx_model(model, config, str(export_dir))
+        return SentenceTransformer(
+            str(export_dir),
+            device='cpu',
+            backend='onnx',
+            model_kwargs={'file_name': file_name},
+        )
+
+    def _get_pool(self, model):
+        if self._pool is None:
+            self._pool = model.start_multi_process_pool(target_devices=['cpu'] * self.workers)
+            atexit.register(self.close)
+        return self._pool
+
+    def embed(self, texts, task_type=None):
+        model = self.load()
+        texts = list(texts)
+        try:
+            if self.workers > 1 and len(texts) > self.batch_size:
+                vectors = model.encode_multi_process(
+                    texts,
+                    self._get_pool(model),
+                    batch_size=self.batch_size,
+                    normalize_embeddings=True,
+                )
+            else:
+                vectors = model.encode(
+                    texts,
+                    batch_size=self.batch_size,
+                    normalize_embeddings=True,
+                    show_progress_bar=False,
+                )
+        except Exception as e:
+            logger.error(f"Local embedding error ({self.model}): {e}")
+            raise EmbeddingError(str(e)) from e
+        return [vector.tolist() for vector in vectors]
+
+    def close(self):
+        if self._pool is not None:
+            from sentence_transformers import SentenceTransformer
+
+            SentenceTransformer.stop_multi_process_pool(self._pool)
+            self._pool = None
+
+
+EMBEDDING_BACKENDS = {
+    GeminiEmbeddingBackend.name: GeminiEmbeddingBackend,
+    OpenAIEmbeddingBackend.name: OpenAIEmbeddingBackend,
+    LocalEmbeddingBackend.name: LocalEmbeddingBackend,
+}
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def get_embedding_backend(name=None):
+    """Return the process-wide instance of the configured embedding backend"""
+    name = name or settings.CHATBOT_EMBEDDING_BACKEND
+    if name not in _backends:
+        with _backends_lock:
+            if name not in _backends:
+                try:
+                    _backends[name] = EMBEDDING_BACKENDS[name]()
+                except KeyError:
+                    raise EmbeddingError(f'Unknown CHATBOT_EMBEDDING_BACKEND: {name}')
+    return _backends[name]
@@ -0,0 +1,238 @@
+"""
+Batched, concurrent embedding pipeline for bulk imports
+
+- Packs many texts into each API request (batch_size)
+- Keeps at most max_in_flight requests running at once (thread pool)
+- Paces requests with an adaptive token bucket: the rate is cut on every
+  429 / RESOURCE_EXHAUSTED and slowly raised again after successes (AIMD),
+  so imports run close to the provider's real quota instead of sleeping
+  a fixed delay.
+
+Works with any embed_batch(texts) -> vectors callable (Gemini, OpenAI, local).
+"""
+import logging
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.conf import settings
+
+from .embedding_backends import get_embedding_backend
+from .embedding_sync import SYNC_FIELDS, mark_embedded
+
+logger = logging.getLogger(__name__)
+
+
+def is_rate_limit_error(exc):
+    """True for HTTP 429 / quota errors from Gemini, google-genai or OpenAI clients"""
+    while exc is not None:
+        status = getattr(exc, 'status_code', None) or getattr(exc, 'code', None)
+        if status == 429 or type(exc).__name__ in ('ResourceExhausted', 'RateLimitError', 'TooManyRequests'):
+            return True
+        text = str(exc)
+        if '429' in text or 'RESOURCE_EXHAUSTED' in text or 'quota' in text.lower():
+            return True
+        exc = exc.__cause__
+    return False
+
+
+def retry_after_seconds(exc):
+    """Retry-After header value from an HTTP error, if the client exposes it"""
+    response = getattr(exc, 'response', None)
+    headers = getattr(response, 'headers', None) or {}
+    try:
+        return float(headers.get('retry-after'))
+    except (TypeError, ValueError):
+        return None
+
+
+class AdaptiveTokenBucket:
+    """
+    Thread-safe token bucket whose refill rate adapts to rate-limit errors.
+
+    rate is in tokens per second (a token is whatever cost the caller charges,
+    e.g. one per text). On a 429 the rate is multiplied by decrease_factor and
+    the bucket pauses; every success_window successes it grows by increase_step.
+    """
+
+    def __init__(self, rate, burst=None, min_rate=None, max_rate=None,
+                 decrease_factor=0.5, increase_step=None, success_window=10):
+        self.rate = float(rate)
+        self.max_rate = float(max_rate or rate)
+        self.min_rate = float(min_rate or max(self.max_rate / 50, 0.1))
+        self.burst = float(burst or rate)
+        self.decrease_factor = decrease_factor
+        self.increase_step = increase_step or self.max_rate / 20
+        self.success_window = success_window
+        self.tokens = self.burst
+        self.updated_at = time.monotonic()
+        self.blocked_until = 0.0
+        self.successes = 0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def acquire(self, tokens=1):
+        """Block until tokens are available (a cost above burst waits for a full bucket)"""
+        tokens = min(float(tokens), self.burst)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self.blocked_until and self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                wait_for = max(
+                    self.blocked_until - now,
+                    (tokens - self.tokens) / self.rate,
+                )
+            time.sleep(min(max(wait_for, 0.01), 5))
+
+    def on_success(self):
+        with self._lock:
+            self.successes += 1
+            if self.successes >= self.success_window and self.rate < self.max_rate:
+                self.successes = 0
+                self.rate = min(self.max_rate, self.rate + self.increase_step)
+
+    def on_rate_limited(self, retry_after=None):
+        with self._lock:
+            now = time.monotonic()
+            self.successes = 0
+            self.tokens = 0
+            if now < self.blocked_until and retry_after is None:
+                # Other in-flight requests hitting the same limit - already slowed down
+                return
+            self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+            pause = retry_after if retry_after is not None else min(self.burst / self.rate, 60)
+            self.blocked_until = max(self.blocked_until, now + pause)
+            logger.warning(f"Embedding rate limited, slowing to {self.rate:.1f}/s for {pause:.1f}s")
+
+
+class EmbeddingPipeline:
+    """
+    Embed (key, text) items in concurrent batches.
+
+    run() yields (key, vector, error) per item in completion order - error is
+    None on success. Results are yielded on the calling thread, so callers can
+    save them with the ORM directly.
+    """
+
+    def __init__(self, embed_batch, batch_size=None, max_in_flight=None, rate=None,
+                 cost=len, max_retries=5):
+        self.embed_batch = embed_batch
+        self.batch_size = batch_size or settings.CHATBOT_EMBEDDING_BATCH_SIZE
+        self.max_in_flight = max_in_flight or settings.CHATBOT_EMBEDDING_MAX_IN_FLIGHT
+        rate = rate or settings.CHATBOT_EMBEDDING_RATE
+        self.limiter = AdaptiveTokenBucket(rate, burst=max(rate, self.batch_size))
+        self.cost = cost
+        self.max_retries = max_retries
+        self.stats = {'requests': 0, 'texts': 0, 'rate_limited': 0, 'retries': 0, 'failed': 0}
+        self._stats_lock = threading.Lock()
+
+    @classmethod
+    def for_backend(cls, backend=None, task_type=None, **kwargs):
+        """Pipeline over a chatbot embedding backend (default CHATBOT_EMBEDDING_BACKEND)"""
+        backend = backend or get_embedding_backend()
+        kwargs.setdefault('batch_size', min(
+            settings.CHATBOT_EMBEDDING_BATCH_SIZE, backend.max_batch_size
+        ))
+        return cls(lambda texts: backend.embed(texts, task_type=task_type), **kwargs)
+
+    def _count(self, **amounts):
+        with self._stats_lock:
+            for name, amount in amounts.items():
+                self.stats[name] += amount
+
+    def _embed_with_retry(self, batch):
+        keys = [key for key, _ in batch]
+        texts = [text for _, text in batch]
+        error = None
+        for attempt in range(self.max_retries):
+            self.limiter.acquire(self.cost(texts))
+            try:
+                vectors = self.embed_batch(texts)
+            except Exception as e:
+                error = e
+                if is_rate_limit_error(e):
+                    self._count(rate_limited=1, retries=1)
+                    self.limiter.on_rate_limited(retry_after_seconds(e))
+                else:
+                    self._count(retries=1)
+                    time.sleep(min(2 ** attempt, 30))
+                continue
+            self.limiter.on_success()
+            self._count(requests=1, texts=len(texts))
+            return [(key, vector, None) for key, vector in zip(keys, vectors)]
+
+        self._count(failed=len(batch))
+        logger.error(f"Embedding batch of {len(batch)} failed after {self.max_retries} attempts: {error}")
+        return [(key, None, error) for key in keys]
+
+    def run(self, items):
+        batch = []
+        pending = set()
+        with ThreadPoolExecutor(max_workers=self.max_in_flight) as executor:
+            for item in items:
+                batch.append(item)
+                if len(batch) < self.batch_size:
+                    continue
+                while len(pending) >= self.max_in_flight:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield from future.result()
+                pending.add(executor.submit(self._embed_with_retry, batch))
+                batch = []
+
+            if batch:
+                pending.add(executor.submit(self._embed_with_retry, batch))
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield from future.result()
+
+
+def embedding_fields(model_class):
+    """Columns written when model_class.embedding changes (KnowBase also saves its quantized copies)"""
+    if hasattr(model_class, 'embedding_half'):
+        return ['embedding', 'embedding_half', 'embedding_bits']
+    return ['embedding']
+
+
+def embed_and_save(pipeline, pending, update_fields=None, progress=None, progress_every=100,
+                   model=None):
+    """
+    Embed [(obj, text), ...] through the pipeline and save each obj.embedding.
+
+    update_fields defaults to embedding_fields() of each obj, so the
+    halfvec / binary columns set by the pre_save signal are never left stale.
+    With model set, the text hash / model / version are saved too
+    (see chatbot/embedding_sync.py).
+    progress(done, total) is called every progress_every saved rows.
+    Returns (saved_count, [(obj, error), ...] for the rows that failed).
+    """
+    extra_fields = SYNC_FIELDS if model is not None else []
+    objects = {}
+    items = []
+    for i, (obj, text) in enumerate(pending):
+        objects[i] = (obj, text)
+        items.append((i, text))
+
+    saved = 0
+    failed = []
+    for key, vector, error in pipeline.run(items):
+        obj, text = objects.pop(key)
+        if error is not None:
+            failed.append((obj, error))
+            continue
+        obj.embedding = vector
+        if model is not None:
+            mark_embedded(obj, text, model)
+        fields = list(update_fields) if update_fields is not None else embedding_fields(type(obj))
+        obj.save(update_fields=fields + extra_fields)
+        saved += 1
+        if progress and saved % progress_every == 0:
+            progress(saved, len(items))
+    return saved, failed
@@ -0,0 +1,160 @@
+"""
+Embedding space registry
+
+An embedding space is one (model, dimensions) pair with its own vectors and
+HNSW index. 'primary' is KnowBase.embedding (CHATBOT_EMBEDDING_BACKEND);
+the others are typed side tables (KnowBaseOpenAIEmbedding, KnowBaseLocalEmbedding).
+
+Retrieval searches settings.CHATBOT_EMBEDDING_SPACE. A new space is filled in
+the background with manage.py sync_embeddings --space <name> while the live
+space keeps serving; switching is a settings change, switching back is too.
+"""
+import logging
+
+from django.conf import settings
+from django.db.models import F
+
+from .embedding_backends import EmbeddingError, get_embedding_backend
+from .embedding_pipeline import embed_and_save
+from .embedding_sync import stale_rows, text_hash
+from .models import KnowBase, KnowBaseLocalEmbedding, KnowBaseOpenAIEmbedding
+
+logger = logging.getLogger(__name__)
+
+PRIMARY_SPACE = 'primary'
+
+
+class EmbeddingSpace:
+    """One embedding model / dimension and where its KnowBase vectors are stored"""
+
+    def __init__(self, name, backend=None, dimensions=768, table=None):
+        self.name = name
+        self.backend_name = backend  # None = CHATBOT_EMBEDDING_BACKEND
+        self.dimensions = dimensions
+        self.table = table  # None = KnowBase.embedding
+
+    @property
+    def is_primary(self):
+        return self.table is None
+
+    @property
+    def backend(self):
+        return get_embedding_backend(self.backend_name)
+
+    @property
+    def related_name(self):
+        """KnowBase reverse accessor of the side table"""
+        return self.table._meta.get_field('knowbase').related_query_name()
+
+    def __repr__(self):
+        return f"<EmbeddingSpace {self.name}>"
+
+
+EMBEDDING_SPACES = {
+    space.name: space
+    for space in [
+        EmbeddingSpace(PRIMARY_SPACE),
+        EmbeddingSpace('openai-1536', backend='openai', dimensions=1536, table=KnowBaseOpenAIEmbedding),
+        EmbeddingSpace('local-768', backend='local', dimensions=768, table=KnowBaseLocalEmbedding),
+    ]
+}
+
+
+def get_embedding_space(name=None):
+    """Return the named space (default settings.CHATBOT_EMBEDDING_SPACE)"""
+    name = name or settings.CHATBOT_EMBEDDING_SPACE
+    try:
+        return EMBEDDING_SPACES[name]
+    except KeyError:
+        raise EmbeddingError(f'Unknown CHATBOT_EMBEDDING_SPACE: {name}')
+
+
+def stale_space_rows(space, queryset=None, chunk_size=1000):
+    """
+    Yield (knowbase, text) for active KnowBase rows whose vector in this space
+    is missing or was computed from other text / another model.
+    """
+    queryset = queryset if queryset is not None else KnowBase.objects.filter(is_active=True)
+    model = space.backend.model
+    if space.is_primary:
+        yield from stale_rows(queryset, model, chunk_size=chunk_size)
+        return
+
+    related = space.related_name
+    queryset = (
+        queryset
+        .defer('embedding', 'embedding_half', 'embedding_bits', 'raw_data')
+        .annotate(
+            space_hash=F(f'{related}__embedding_hash'),
+            space_model=F(f'{related}__embedding_model'),
+        )
+    )
+    for obj in queryset.order_by('id').iterator(chunk_size=chunk_size):
+        text = obj.get_embedding_text()
+        if obj.space_model != model or obj.space_hash != text_hash(text):
+            yield obj, text
+
+
+def save_space_embeddings(space, rows):
+    """Upsert [(knowbase, text, vector), ...] into the side table of space"""
+    # semantic_cache -> retrieval -> embedding_spaces
+    from .semantic_cache import invalidate_for_knowbase
+
+    model = space.backend.model
+    space.table.objects.bulk_create(
+        [
+            space.table(knowbase=obj, embedding=vector, embedding_hash=text_hash(text), embedding_model=model)
+            for obj, text, vector in rows
+        ],
+        update_conflicts=True,
+        unique_fields=['knowbase'],
+        update_fields=['embedding', 'embedding_hash', 'embedding_model', 'updated_at'],
+    )
+    # bulk_create sends no post_save - drop the cached answers built from these rows here
+    invalidate_for_knowbase([obj.id for obj, _, _ in rows])
+
+
+def embed_into_space(space, pipeline, pending, progress=None, flush_every=200):
+    """
+    Embed [(knowbase, text), ...] through the pipeline into space.
+
+    Side tables are written in bulk upserts of flush_every rows (progress(done, total)
+    is called after each); the live space and its index are never touched.
+    Returns (saved_count, [(obj, error), ...]).
+    """
+    if space.is_primary:
+        return embed_and_save(
+            pipeline,
+            pending,
+            update_fields=['embedding', 'embedding_half', 'embedding_bits'],
+            progress=progress,
+            progress_every=flush_every,
+            model=space.backend.model,
+        )
+
+    objects = {}
+    items = []
+    for i, (obj, text) in enumerate(pending):
+        objects[i] = (obj, text)
+        items.append((i, text))
+
+    saved = 0
+    failed = []
+    buffer = []
+    for key, vector, error in pipeline.run(items):
+        obj, text = objects.pop(key)
+        if error is not None:
+            failed.append((obj, error))
+            continue
+        buffer.append((obj, text, vector))
+        if len(buffer) >= flush_every:
+            save_space_embeddings(space, buffer)
+            saved += len(buffer)
+            buffer = []
+            if progress:
+                progress(saved, len(items))
+    if buffer:
+        save_space_embeddings(space, buffer)
+        saved += len(buffer)
+    logger.info(f"Embedding space {space.name}: {saved} vectors written, {len(failed)} failed")
+    return saved, failed
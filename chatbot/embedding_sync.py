@@ -0,0 +1,55 @@
+"""
+Change tracking for stored document embeddings
+
+Every embedded row keeps a SHA-256 of the exact text that was embedded plus
+the embedding model and the model class's EMBEDDING_TEXT_VERSION. A row is
+stale when its text, the configured model or the text recipe changed, so
+re-imports and manage.py sync_embeddings only re-embed what actually changed.
+"""
+import hashlib
+
+from django.db.models import BooleanField, ExpressionWrapper, Q
+
+# Fields written together with the embedding
+SYNC_FIELDS = ['embedding_hash', 'embedding_model', 'embedding_version']
+
+
+def text_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def is_stale(obj, model, text=None, has_embedding=None):
+    """True when obj has no embedding or it was computed from other text / model / recipe"""
+    if has_embedding is None:
+        has_embedding = obj.embedding is not None
+    if not has_embedding:
+        return True
+    if obj.embedding_model != model or obj.embedding_version != obj.EMBEDDING_TEXT_VERSION:
+        return True
+    text = text if text is not None else obj.get_embedding_text()
+    return obj.embedding_hash != text_hash(text)
+
+
+def mark_embedded(obj, text, model):
+    """Record what obj.embedding was computed from (caller saves SYNC_FIELDS)"""
+    obj.embedding_hash = text_hash(text)
+    obj.embedding_model = model
+    obj.embedding_version = obj.EMBEDDING_TEXT_VERSION
+
+
+def stale_rows(queryset, model, chunk_size=1000):
+    """
+    Yield (obj, text) for every stale row of queryset.
+
+    Vectors are not loaded - only whether one exists - so a scan over an
+    unchanged table reads the text columns and hashes them, nothing more.
+    """
+    queryset = queryset.defer('embedding', 'raw_data').annotate(
+        has_embedding=ExpressionWrapper(Q(embedding__isnull=False), output_field=BooleanField())
+    )
+    if hasattr(queryset.model, 'embedding_half'):
+        queryset = queryset.defer('embedding_half', 'embedding_bits')
+    for obj in queryset.order_by('id').iterator(chunk_size=chunk_size):
+        text = obj.get_embedding_text()
+        if is_stale(obj, model, text=text, has_embedding=obj.has_embedding):
+            yield obj, text
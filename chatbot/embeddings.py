@@ -0,0 +1,203 @@
+"""
+Query embeddings for chatbot retrieval (backend from CHATBOT_EMBEDDING_BACKEND)
+
+embed_query() sits in front of the embedding API with a two-tier cache:
+1. in-process LRU (per worker, no I/O)
+2. QueryEmbeddingCache table (shared by all workers and scripts)
+Both tiers are keyed by model + task_type + normalized text and expire after
+CHATBOT_EMBEDDING_CACHE_TTL seconds.
+"""
+import hashlib
+import logging
+import random
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError
+from django.db.models import F
+from django.utils import timezone
+
+from .embedding_backends import EmbeddingError, get_embedding_backend  # noqa: F401 (re-exported)
+from .models import QueryEmbeddingCache
+
+logger = logging.getLogger(__name__)
+
+# Zero-width characters often pasted in with Thai text
+_ZERO_WIDTH_RE = re.compile('[\u200b\u200c\u200d\u2060\ufeff]')
+_WHITESPACE_RE = re.compile(r'\s+')
+_EDGE_PUNCT = ' ?!.,;:"\'()[]{}~…'
+
+
+def embed_texts(texts, task_type=None, backend=None):
+    """Embed many texts (uncached) with the configured backend, batched"""
+    backend = backend or get_embedding_backend()
+    return backend.embed_batched(list(texts), task_type=task_type)
+
+
+def embed_text(text, task_type='retrieval_query', backend=None):
+    """Embed a single text (uncached) with the configured backend"""
+    return embed_texts([text], task_type=task_type, backend=backend)[0]
+
+
+def normalize_query(text):
+    """
+    Normalize query text for cache lookups:
+    NFC (Thai vowel/tone mark order), drop zero-width chars,
+    collapse whitespace, casefold Latin, trim edge punctuation.
+    """
+    text = unicodedata.normalize('NFC', text or '')
+    text = _ZERO_WIDTH_RE.sub('', text)
+    text = _WHITESPACE_RE.sub(' ', text)
+    return text.casefold().strip(_EDGE_PUNCT)
+
+
+def make_cache_key(normalized_text, model, task_type):
+    raw = f"{model}\x00{task_type or ''}\x00{normalized_text}"
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+class LRUCache:
+    """Thread-safe in-process LRU with per-entry expiry"""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class EmbeddingCache:
+    """Two-tier (LRU + QueryEmbeddingCache table) cache for query embeddings"""
+
+    # Only bump last_used_at when it is older than this, to avoid a write per hit
+    TOUCH_INTERVAL = timedelta(hours=1)
+    # Run size/TTL eviction on roughly 1 in PRUNE_EVERY database writes
+    PRUNE_EVERY = 100
+
+    def __init__(self, lru_size=None, ttl=None, max_rows=None):
+        self.ttl = ttl or settings.CHATBOT_EMBEDDING_CACHE_TTL
+        self.max_rows = max_rows or settings.CHATBOT_EMBEDDING_CACHE_MAX_ROWS
+        self.lru = LRUCache(lru_size or settings.CHATBOT_EMBEDDING_CACHE_LRU_SIZE, self.ttl)
+
+    def get(self, key):
+        vector = self.lru.get(key)
+        if vector is not None:
+            return vector
+
+        now = timezone.now()
+        try:
+            row = (
+                QueryEmbeddingCache.objects
+                .filter(cache_key=key, created_at__gte=now - timedelta(seconds=self.ttl))
+                .only('id', 'embedding', 'last_used_at')
+                .first()
+            )
+            if row is None:
+                return None
+            updates = {'hit_count': F('hit_count') + 1}
+            if row.last_used_at < now - self.TOUCH_INTERVAL:
+                updates['last_used_at'] = now
+            QueryEmbeddingCache.objects.filter(pk=row.pk).update(**updates)
+        except DatabaseError as e:
+            logger.warning(f"Embedding cache read failed: {e}")
+            return None
+
+        vector = [float(x) for x in row.embedding]
+        self.lru.set(key, vector)
+        return vector
+
+    def set(self, key, vector, text, model, task_type):
+        self.lru.set(key, vector)
+
+        try:
+            QueryEmbeddingCache.objects.update_or_create(
+                cache_key=key,
+                defaults={
+                    'text': text,
+                    'model': model,
+                    'task_type': task_type or '',
+                    'embedding': vector,
+                    'created_at': timezone.now(),
+                    'last_used_at': timezone.now(),
+                },
+            )
+            if random.randrange(self.PRUNE_EVERY) == 0:
+                self.prune()
+        except DatabaseError as e:
+            logger.warning(f"Embedding cache write failed: {e}")
+
+    def prune(self):
+        """Delete expired rows, then least recently used rows above max_rows"""
+        cutoff = timezone.now() - timedelta(seconds=self.ttl)
+        expired, _ = QueryEmbeddingCache.objects.filter(created_at__lt=cutoff).delete()
+
+        evicted = 0
+        boundary = list(
+            QueryEmbeddingCache.objects
+            .order_by('-last_used_at')
+            .values_list('last_used_at', flat=True)[self.max_rows:self.max_rows + 1]
+        )
+        if boundary:
+            evicted, _ = QueryEmbeddingCache.objects.filter(last_used_at__lte=boundary[0]).delete()
+
+        if expired or evicted:
+            logger.info(f"Embedding cache pruned: {expired} expired, {evicted} evicted")
+        return expired, evicted
+
+
+_cache = None
+
+
+def get_embedding_cache():
+    global _cache
+    if _cache is None:
+        _cache = EmbeddingCache()
+    return _cache
+
+
+def embed_query(text, task_type='retrieval_query', backend=None):
+    """Embed a query, serving repeats from the LRU / shared cache"""
+    backend = backend or get_embedding_backend()
+    model = backend.model
+    normalized = normalize_query(text)
+    key = make_cache_key(normalized, model, task_type)
+    cache = get_embedding_cache()
+
+    vector = cache.get(key)
+    if vector is not None:
+        return vector
+
+    vector = embed_text(normalized, task_type=task_type, backend=backend)
+    cache.set(key, vector, normalized, model, task_type)
+    return vector
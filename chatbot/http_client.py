@@ -0,0 +1,194 @@
+"""
+Shared upstream clients for the chatbot (n8n webhook, Gemini)
+
+- One pooled keep-alive httpx client per process (sync) and per event loop (async)
+- Per-call deadline on every request
+- Circuit breaker: after CHATBOT_BREAKER_FAILURES consecutive failures the
+  upstream is skipped for CHATBOT_BREAKER_RESET_SECONDS, so callers go straight
+  to the fallback answer instead of waiting for a timeout
+"""
+import asyncio
+import logging
+import threading
+import time
+import weakref
+
+import httpx
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class UpstreamError(Exception):
+    """Upstream call failed (connection error, timeout, bad status or bad body)"""
+
+
+class CircuitOpenError(UpstreamError):
+    """Upstream skipped because its circuit breaker is open"""
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker (closed -> open -> half-open -> closed).
+    In half-open state a single trial call is let through; if that trial never
+    reports back (e.g. the client disconnected) another one is allowed after reset_timeout.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name, failure_threshold=None, reset_timeout=None):
+        self.name = name
+        self.failure_threshold = failure_threshold or settings.CHATBOT_BREAKER_FAILURES
+        self.reset_timeout = reset_timeout or settings.CHATBOT_BREAKER_RESET_SECONDS
+        self.failures = 0
+        self.opened_at = None
+        self.trial_started_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return self.CLOSED
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def allow(self):
+        """Return True if a call may be attempted now"""
+        with self._lock:
+            state = self.state
+            if state == self.CLOSED:
+                return True
+            now = time.monotonic()
+            if state == self.HALF_OPEN and (
+                self.trial_started_at is None
+                or now - self.trial_started_at >= self.reset_timeout
+            ):
+                self.trial_started_at = now
+                return True
+            return False
+
+    def check(self):
+        if not self.allow():
+            raise CircuitOpenError(f'{self.name} circuit open, skipping call')
+
+    def record_success(self):
+        with self._lock:
+            if self.opened_at is not None:
+                logger.info(f"Circuit {self.name} closed")
+            self.failures = 0
+            self.opened_at = None
+            self.trial_started_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self.trial_started_at = None
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+                logger.warning(f"Circuit {self.name} open after {self.failures} failures")
+
+
+def get_limits():
+    return httpx.Limits(
+        max_connections=settings.CHATBOT_HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.CHATBOT_HTTP_MAX_CONNECTIONS,
+        keepalive_expiry=30,
+    )
+
+
+def get_timeout(deadline):
+    return httpx.Timeout(deadline, connect=min(deadline, settings.CHATBOT_HTTP_CONNECT_TIMEOUT))
+
+
+class JSONWebhookClient:
+    """POST JSON to a single webhook URL with pooling, deadlines and a circuit breaker"""
+
+    def __init__(self, name, url, deadline):
+        self.name = name
+        self.url = url
+        self.deadline = deadline
+        self.breaker = CircuitBreaker(name)
+        self._client = None
+        self._client_lock = threading.Lock()
+        # AsyncClient connections are bound to the loop that created them
+        self._async_clients = weakref.WeakKeyDictionary()
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = httpx.Client(limits=get_limits(), timeout=get_timeout(self.deadline))
+        return self._client
+
+    @property
+    def async_client(self):
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            client = httpx.AsyncClient(limits=get_limits(), timeout=get_timeout(self.deadline))
+            self._async_clients[loop] = client
+        return client
+
+    def _handle_response(self, response):
+        if response.status_code != 200:
+            raise UpstreamError(f'{self.name} error: {response.status_code} - {response.text[:200]}')
+        try:
+            return response.json()
+        except ValueError as e:
+            raise UpstreamError(f'{self.name} returned invalid JSON') from e
+
+    def post(self, payload, deadline=None):
+        """Synchronous POST, returns decoded JSON"""
+        self.breaker.check()
+        try:
+            response = self.client.post(
+                self.url, json=payload, timeout=get_timeout(deadline or self.deadline)
+            )
+            data = self._handle_response(response)
+        except Exception as e:
+            self.breaker.record_failure()
+            raise UpstreamError(f'{self.name} request failed: {e}') from e
+        self.breaker.record_success()
+        return data
+
+    async def apost(self, payload, deadline=None):
+        """Async POST, returns decoded JSON"""
+        self.breaker.check()
+        try:
+            response = await self.async_client.post(
+                self.url, json=payload, timeout=get_timeout(deadline or self.deadline)
+            )
+            data = self._handle_response(response)
+        except Exception as e:
+            self.breaker.record_failure()
+            raise UpstreamError(f'{self.name} request failed: {e}') from e
+        self.breaker.record_success()
+        return data
+
+
+_n8n_client = None
+_llm_breaker = None
+_lock = threading.Lock()
+
+
+def get_n8n_client():
+    """Process-wide n8n webhook client"""
+    global _n8n_client
+    if _n8n_client is None:
+        with _lock:
+            if _n8n_client is None:
+                _n8n_client = JSONWebhookClient('n8n', settings.N8N_WEBHOOK_URL, settings.N8N_TIMEOUT)
+    return _n8n_client
+
+
+def get_llm_breaker():
+    """Process-wide circuit breaker for Gemini generation calls"""
+    global _llm_breaker
+    if _llm_breaker is None:
+        with _lock:
+            if _llm_breaker is None:
+                _llm_breaker = CircuitBreaker('gemini')
+    return _llm_breaker
@@ -0,0 +1,273 @@
+"""
+First-stage intent router
+
+Classifies a chatbot message against a table of intents before it reaches the
+semantic cache, the RAG pipeline or n8n, and answers high-confidence intents
+from templates:
+
+- one compiled regex (every intent's keywords as a named group) finds all
+  keyword hits in a single pass; a short message whose only hits belong to
+  the greeting or the booking intent, with no negation ("ไม่", "ยกเลิก"),
+  is answered on that alone
+- otherwise the query embedding is compared with each intent's centroid, the
+  mean of its example embeddings (computed once per process through the
+  query embedding cache; manage.py build_intent_centroids warms it)
+
+Intents without a route are never answered directly - they are scored so
+that e.g. a brake question does not end up closest to the greeting, and they
+still serve fallback_answer() when the backends are down.
+"""
+import logging
+import math
+import re
+import threading
+
+from django.conf import settings
+
+from .embeddings import EmbeddingError, embed_query, get_embedding_backend
+
+logger = logging.getLogger(__name__)
+
+
+class Intent:
+    """
+    route: 'keyword' (keyword hit in a short message, or embedding match),
+    'embedding' (embedding match only) or None (fallback only).
+    context_free intents are also answered in the middle of a conversation.
+
+    Thai has no spaces between words, so a keyword that also occurs inside
+    other words carries a lookbehind (e.g. นัด but not ถนัด).
+    """
+
+    def __init__(self, name, keywords, examples, answer, route=None, context_free=False):
+        self.name = name
+        self.keywords = keywords
+        self.examples = examples
+        self.answer = answer
+        self.route = route
+        self.context_free = context_free
+
+    def __repr__(self):
+        return f"<Intent {self.name}>"
+
+
+class IntentMatch:
+    def __init__(self, intent, confidence, method):
+        self.intent = intent
+        self.confidence = confidence
+        self.method = method  # 'keyword' or 'embedding'
+
+
+# In priority order - the first keyword hit wins in fallback_answer()
+INTENTS = [
+    Intent(
+        'greeting',
+        keywords=['สวัสดี', 'หวัดดี', r'\bhello\b', r'\bhi\b'],
+        examples=['สวัสดีครับ', 'สวัสดีค่ะ', 'หวัดดี', 'ดีครับ มีใครอยู่ไหม', 'hello', 'hi'],
+        answer='สวัสดีครับ! ผมคือ AI ผู้ช่วยของ THE ONE ยินดีให้คำปรึกษาเกี่ยวกับรถจักรยานยนต์ครับ',
+        route='keyword',
+        context_free=True,
+    ),
+    Intent(
+        'no_start',
+        keywords=['สตาร์ท', 'ติด', 'เครื่อง'],
+        examples=['รถสตาร์ทไม่ติด', 'กดสตาร์ทแล้วเครื่องไม่ติด', 'เครื่องติดยากตอนเช้า'],
+        answer='''หากรถสตาร์ทไม่ติด อาจเกิดจากสาเหตุดังนี้:
+1. 🔋 แบตเตอรี่หมด - ลองตรวจสอบไฟหน้ารถว่าสว่างหรือไม่
+2. ⛽ น้ำมันหมด - ตรวจสอบปริมาณน้ำมันในถัง
+3. 🔌 หัวเทียนชำรุด - อายุการใช้งานประมาณ 10,000-15,000 กม.
+4. 🛢️ น้ำมันเครื่องน้อย - อาจทำให้เครื่องยนต์ล็อค
+
+แนะนำให้นำรถเข้าตรวจสอบที่ THE ONE ครับ''',
+    ),
+    Intent(
+        'brakes',
+        keywords=['เบรค', 'ห้าม'],
+        examples=['เบรคไม่อยู่', 'เบรคมีเสียงดัง', 'ผ้าเบรคหมดหรือยัง'],
+        answer='''การดูแลระบบเบรค:
+🛑 อาการที่ต้องระวัง:
+- มีเสียงดังเวลาเบรค
+- เบรคไม่แน่น ต้องบีบแรง
+- มีเสียงเครือเวลาหยุด
+- รถดันหรือเบรคด้านเดียว
+
+💡 คำแนะนำ:
+- ตรวจสอบผ้าเบรคทุก 5,000 กม.
+- เปลี่ยนน้ำมันเบรคทุก 10,000 กม.
+- อย่าปล่อยให้ผ้าเบรคบางจนหมด
+
+หากพบอาการดังกล่าว แนะนำให้จองคิวซ่อมที่ THE ONE ครับ''',
+    ),
+    Intent(
+        'oil_change',
+        keywords=['น้ำมัน', 'เปลี่ยน', 'ถ่าย'],
+        examples=[
+            'ควรเปลี่ยนน้ำมันเครื่องทุกกี่กิโล',
+            'น้ำมันเครื่องเปลี่ยนกี่โลครั้ง',
+            'ถ่ายน้ำมันเครื่องบ่อยแค่ไหน',
+            'เปลี่ยนน้ำมันเครื่องราคาเท่าไหร่',
+            'how often should I change the engine oil',
+        ],
+        answer='''การเปลี่ยนน้ำมันเครื่อง:
+🛢️ ระยะเวลาเปลี่ยน:
+- รถเครื่องเล็ก 100-150cc: ทุก 1,000-1,500 กม.
+- รถเครื่องกลาง 250-500cc: ทุก 3,000-4,000 กม.
+- รถเครื่องใหญ่ 600cc+: ทุก 5,000-6,000 กม.
+
+💰 ราคาโดยประมาณ:
+- น้ำมันสังเคราะห์: 250-500 บาท
+- น้ำมันกึ่งสังเคราะห์: 150-300 บาท
+- น้ำมันแร่: 80-150 บาท
+
+จองคิวเปลี่ยนน้ำมันที่ THE ONE ได้เลยครับ!''',
+        route='embedding',
+    ),
+    Intent(
+        'price_list',
+        keywords=['ราคา', 'ค่า', 'เท่าไหร่'],
+        examples=[
+            'ค่าซ่อมประมาณเท่าไหร่',
+            'ค่าบริการซ่อมรถราคาเท่าไร',
+            'ซ่อมเบรคราคาเท่าไหร่',
+            'เปลี่ยนยางกี่บาท',
+            'มีเรทราคาค่าซ่อมไหม',
+        ],
+        answer='''💰 ค่าบริการโดยประมาณ:
+
+🔧 ซ่อมบำรุงทั่วไป: 300-800 บาท
+⚙️ ซ่อมเครื่องยนต์: 1,000-5,000 บาท
+🛑 ซ่อมเบรค: 500-1,500 บาท
+⚡ ระบบไฟฟ้า: 500-2,000 บาท
+🛞 เปลี่ยนยาง: 800-3,000 บาท
+
+*ราคาอาจแตกต่างตามรุ่นรถและอะไหล่*
+
+สามารถจองคิวเพื่อประเมินราคาที่แม่นยำได้ครับ!''',
+        route='embedding',
+    ),
+    Intent(
+        'booking',
+        keywords=['จอง', '(?<!ถ)นัด', 'คิว'],
+        examples=[
+            'จองคิวซ่อมยังไง',
+            'อยากนัดเข้าศูนย์ต้องทำยังไง',
+            'จองคิวเปลี่ยนน้ำมันเครื่องได้ที่ไหน',
+            'นัดซ่อมรถได้ไหม',
+            'how do I book a repair',
+        ],
+        answer='คุณสามารถจองคิวซ่อมได้ที่หน้า "จองคิวซ่อม" หรือคลิกที่เมนูด้านบนครับ เพียงเลือกรถ วันที่ และประเภทการซ่อมที่ต้องการ เราจะดูแลรถของคุณอย่างดีที่สุดครับ!',
+        route='keyword',
+        context_free=True,
+    ),
+]
+INTENTS_BY_NAME = {intent.name: intent for intent in INTENTS}
+
+# All keywords in one alternation, one named group per intent
+KEYWORD_PATTERN = re.compile(
+    '|'.join(f"(?P<{intent.name}>{'|'.join(intent.keywords)})" for intent in INTENTS),
+    re.IGNORECASE,
+)
+# A short message containing one of these is not answered on keywords alone
+# ("ยกเลิกการจองคิว" is not a booking how-to question)
+NEGATION_PATTERN = re.compile(
+    '|'.join(['ไม่', 'ยกเลิก', 'อย่า', r'\bnot?\b', r"\bdon'?t\b", r'\bcancel']),
+    re.IGNORECASE,
+)
+
+
+def keyword_hits(message):
+    """Names of the intents with a keyword in message"""
+    return {match.lastgroup for match in KEYWORD_PATTERN.finditer(message)}
+
+
+def fallback_answer(message):
+    """Template answer when no backend is available"""
+    hits = keyword_hits(message)
+    for intent in INTENTS:
+        if intent.name in hits:
+            return intent.answer
+    return f'''ขอบคุณสำหรับคำถามครับ!
+
+สำหรับ "{message}" แนะนำให้คุณ:
+1. 📝 จองคิวเพื่อตรวจสอบรถให้แน่ใจ
+2. 🔍 ถ่ายรูปอาการส่งให้ช่างดู
+3. 📞 โทรติดต่อ THE ONE โดยตรง
+
+เรามีช่างมืออาชีพพร้อมให้บริการครับ!'''
+
+
+def normalize(vector):
+    norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+    return [x / norm for x in vector]
+
+
+_centroids = {}
+_centroids_lock = threading.Lock()
+
+
+def get_centroids():
+    """{intent name: unit centroid} for the current embedding model (computed once per process)"""
+    model = get_embedding_backend().model
+    if model not in _centroids:
+        with _centroids_lock:
+            if model not in _centroids:
+                centroids = {}
+                for intent in INTENTS:
+                    vectors = [
+                        normalize(embed_query(example, task_type='retrieval_query'))
+                        for example in intent.examples
+                    ]
+                    centroids[intent.name] = normalize([sum(values) for values in zip(*vectors)])
+                _centroids[model] = centroids
+    return _centroids[model]
+
+
+def score_intents(query_embedding):
+    """[(cosine similarity, intent name), ...] best first"""
+    query = normalize(query_embedding)
+    return sorted(
+        (
+            (sum(x * y for x, y in zip(query, centroid)), name)
+            for name, centroid in get_centroids().items()
+        ),
+        reverse=True,
+    )
+
+
+def route_intent(message, query_embedding=None, history=None):
+    """
+    Return an IntentMatch when message can be answered from a template, else None.
+
+    With a conversation history only context_free intents are answered.
+    """
+    if not settings.CHATBOT_INTENT_ROUTER:
+        return None
+
+    def answerable(intent):
+        return intent.route is not None and (not history or intent.context_free)
+
+    text = message.strip()
+    hits = keyword_hits(text)
+    negated = NEGATION_PATTERN.search(text) is not None
+    # Only when the keywords point at one intent - "สวัสดี เบรคไม่อยู่" is a brake question
+    if len(hits) == 1 and not negated and len(text) <= settings.CHATBOT_INTENT_KEYWORD_MAX_CHARS:
+        intent = INTENTS_BY_NAME[next(iter(hits))]
+        if intent.route == 'keyword' and answerable(intent):
+            return IntentMatch(intent, 1.0, 'keyword')
+
+    if query_embedding is None:
+        return None
+    try:
+        scores = score_intents(query_embedding)
+    except EmbeddingError as e:
+        logger.warning(f"Intent routing skipped, centroids unavailable: {e}")
+        return None
+
+    (best, name), (runner_up, _) = scores[0], scores[1]
+    intent = INTENTS_BY_NAME[name]
+    threshold = settings.CHATBOT_INTENT_THRESHOLD
+    if name in hits and not negated:
+        threshold -= settings.CHATBOT_INTENT_KEYWORD_BONUS
+    if answerable(intent) and best >= threshold and best - runner_up >= settings.CHATBOT_INTENT_MARGIN:
+        return IntentMatch(intent, best, 'embedding')
+    return None
@@ -0,0 +1,97 @@
+"""
+Direct Gemini LLM calls for the chatbot (replaces the n8n AI Agent node)
+"""
+import logging
+
+from django.conf import settings
+
+from .embedding_backends import configure_genai, genai
+from .http_client import CircuitOpenError, get_llm_breaker
+
+logger = logging.getLogger(__name__)
+
+
+SYSTEM_PROMPT = (
+    'คุณคือ AI ผู้ช่วยของศูนย์ซ่อมรถจักรยานยนต์ THE ONE '
+    'ตอบคำถามเป็นภาษาไทยอย่างสุภาพ กระชับ และถูกต้อง '
+    'ใช้ข้อมูลจาก "ข้อมูลอ้างอิง" เป็นหลัก หากข้อมูลไม่เพียงพอให้บอกตรงๆ '
+    'และแนะนำให้จองคิวตรวจสอบรถที่ THE ONE'
+)
+
+
+class LLMError(Exception):
+    """Raised when the LLM call fails or returns no text"""
+
+
+def build_prompt(message, context, history=None):
+    """Build the user prompt from the conversation history, the retrieved context and the question"""
+    parts = []
+    if history:
+        parts.append(history.as_text())
+    if context:
+        parts.append(f"ข้อมูลอ้างอิง:\n{context}")
+    parts.append(f"คำถามของลูกค้า: {message}")
+    return "\n\n".join(parts)
+
+
+def get_model():
+    configure_genai()
+    return genai.GenerativeModel(
+        settings.CHATBOT_LLM_MODEL,
+        system_instruction=SYSTEM_PROMPT,
+    )
+
+
+def generate_answer(prompt):
+    """Generate a full answer for prompt and return its text"""
+    breaker = get_llm_breaker()
+    try:
+        breaker.check()
+    except CircuitOpenError as e:
+        raise LLMError(str(e)) from e
+    try:
+        response = get_model().generate_content(
+            prompt,
+            generation_config={
+                'temperature': settings.CHATBOT_LLM_TEMPERATURE,
+                'max_output_tokens': settings.CHATBOT_LLM_MAX_TOKENS,
+            },
+            request_options={'timeout': settings.CHATBOT_LLM_TIMEOUT},
+        )
+        text = response.text
+    except Exception as e:
+        breaker.record_failure()
+        logger.error(f"LLM error ({settings.CHATBOT_LLM_MODEL}): {e}")
+        raise LLMError(str(e)) from e
+
+    breaker.record_success()
+    if not text:
+        raise LLMError('Empty response from LLM')
+    return text
+
+
+async def stream_answer(prompt):
+    """Async generator yielding answer text chunks as Gemini produces them"""
+    breaker = get_llm_breaker()
+    try:
+        breaker.check()
+    except CircuitOpenError as e:
+        raise LLMError(str(e)) from e
+    try:
+        response = await get_model().generate_content_async(
+            prompt,
+            generation_config={
+                'temperature': settings.CHATBOT_LLM_TEMPERATURE,
+                'max_output_tokens': settings.CHATBOT_LLM_MAX_TOKENS,
+            },
+            request_options={'timeout': settings.CHATBOT_LLM_TIMEOUT},
+            stream=True,
+        )
+        async for chunk in response:
+            if chunk.text:
+                yield chunk.text
+    except Exception as e:
+        breaker.record_failure()
+        logger.error(f"LLM stream error ({settings.CHATBOT_LLM_MODEL}): {e}")
+        raise LLMError(str(e)) from e
+    breaker.record_success()
@@ -0,0 +1,301 @@
+"""
+Management command to benchmark and evaluate KnowBase retrieval
+(float / halfvec / binary vector search and hybrid) against exact search
+
+Queries file is JSONL, one labelled query per line:
+    {"query": "CBR250rr เปลี่ยนน้ำมันเครื่องกี่กิโล", "expected_ids": [12, 57]}
+
+For every mode x ef_search x concurrency it reports recall@k and MRR against
+the labels, recall@k against exact (sequential scan) search, p50/p95/p99
+latency and QPS. --output writes the same numbers as JSON so runs can be
+diffed after changing the HNSW index (m / ef_construction) or the importers.
+"""
+import json
+import statistics
+import threading
+import time
+from queue import Empty, Queue
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+from pgvector.django import CosineDistance
+
+from chatbot.embedding_spaces import EMBEDDING_SPACES, get_embedding_space
+from chatbot.embeddings import embed_query
+from chatbot.management.commands.quantize_embeddings import VECTOR_INDEXES, format_size, index_size
+from chatbot.models import KnowBase
+from chatbot.retrieval import hybrid_search, search_knowbase
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def parse_ints(value):
+    return [int(v) for v in value.split(',') if v.strip()]
+
+
+def load_queries(path):
+    queries = []
+    with open(path, encoding='utf-8') as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                item = json.loads(line)
+            except ValueError as e:
+                raise CommandError(f'{path}:{line_no}: invalid JSON ({e})')
+            if 'query' not in item or 'expected_ids' not in item:
+                raise CommandError(f'{path}:{line_no}: needs "query" and "expected_ids"')
+            queries.append(item)
+    return queries
+
+
+def exact_search(query_embedding, k, space):
+    """Exact top-k KnowBase ids (HNSW disabled, sequential scan)"""
+    if space.is_primary:
+        queryset = KnowBase.objects.filter(is_active=True, embedding__isnull=False).annotate(
+            distance=CosineDistance('embedding', query_embedding)
+        ).values_list('id', flat=True)
+    else:
+        queryset = space.table.objects.filter(knowbase__is_active=True).annotate(
+            distance=CosineDistance('embedding', query_embedding)
+        ).values_list('knowbase_id', flat=True)
+
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_indexscan = off')
+        return list(queryset.order_by('distance')[:k])
+
+
+def reciprocal_rank(ranked_ids, expected):
+    for rank, doc_id in enumerate(ranked_ids, 1):
+        if doc_id in expected:
+            return 1 / rank
+    return 0.0
+
+
+class Command(BaseCommand):
+    help = 'Benchmark recall@k, MRR, latency and QPS of the KnowBase retrieval strategies'
+
+    # search(item, k, ef_search, space) -> ranked ids
+    MODES = {
+        'exact': lambda item, k, ef, space: exact_search(item['embedding'], k, space),
+        'vector': lambda item, k, ef, space: [
+            doc.id for doc in search_knowbase(item['embedding'], k=k, ef_search=ef, storage='float', space=space)
+        ],
+        'halfvec': lambda item, k, ef, space: [
+            doc.id for doc in search_knowbase(item['embedding'], k=k, ef_search=ef, storage='halfvec')
+        ],
+        'binary': lambda item, k, ef, space: [
+            doc.id for doc in search_knowbase(item['embedding'], k=k, ef_search=ef, storage='binary')
+        ],
+        'hybrid': lambda item, k, ef, space: [
+            doc.id for doc in hybrid_search(item['query'], item['embedding'], k=k, ef_search=ef, space=space)
+        ],
+    }
+    # Quantized columns only exist in the primary space
+    PRIMARY_ONLY_MODES = {'halfvec', 'binary'}
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queries', required=True, help='JSONL file of {"query", "expected_ids"}')
+        parser.add_argument('--k', type=int, default=5, help='Number of results per query')
+        parser.add_argument(
+            '--modes',
+            default='exact,vector,halfvec,binary,hybrid',
+            help='Comma separated retrieval modes to compare (exact, vector, halfvec, binary, hybrid)'
+        )
+        parser.add_argument(
+            '--ef-search',
+            default=str(settings.CHATBOT_HNSW_EF_SEARCH),
+            help='Comma separated hnsw.ef_search values, e.g. 20,40,80,160'
+        )
+        parser.add_argument(
+            '--concurrency',
+            default='1',
+            help='Comma separated numbers of concurrent clients, e.g. 1,4,8'
+        )
+        parser.add_argument(
+            '--space',
+            choices=list(EMBEDDING_SPACES),
+            help='Embedding space to evaluate (default CHATBOT_EMBEDDING_SPACE)'
+        )
+        parser.add_argument('--repeat', type=int, default=3, help='Timed runs per query')
+        parser.add_argument('--output', help='Write the report as JSON to this file ("-" for stdout)')
+
+    def handle(self, *args, **options):
+        k = options['k']
+        space = get_embedding_space(options['space'])
+        ef_values = parse_ints(options['ef_search'])
+        concurrency_levels = parse_ints(options['concurrency'])
+        modes = [m.strip() for m in options['modes'].split(',') if m.strip()]
+        unknown = [m for m in modes if m not in self.MODES]
+        if unknown:
+            raise CommandError(f'Unknown mode(s): {", ".join(unknown)}')
+        if not space.is_primary:
+            skipped = [m for m in modes if m in self.PRIMARY_ONLY_MODES]
+            if skipped:
+                self.stdout.write(self.style.WARNING(
+                    f'⚠️  {", ".join(skipped)} only exist in the primary space, skipped'
+                ))
+            modes = [m for m in modes if m not in self.PRIMARY_ONLY_MODES]
+        if not ef_values or not concurrency_levels:
+            raise CommandError('--ef-search and --concurrency need at least one value')
+
+        queries = load_queries(options['queries'])
+        if not queries:
+            raise CommandError('No queries found')
+
+        # Embed once up front so the timings only cover the database search
+        self.stdout.write(f'📊 Embedding {len(queries)} queries ({space.name}: {space.backend.model})...')
+        for item in queries:
+            item['embedding'] = embed_query(item['query'], task_type='retrieval_query', backend=space.backend)
+
+        # Exact nearest neighbours are the reference for how much HNSW / quantization loses
+        exact = [set(exact_search(item['embedding'], k, space)) for item in queries]
+
+        results = []
+        for mode in modes:
+            for ef_search in ([None] if mode == 'exact' else ef_values):
+                results.extend(self.run_mode(mode, ef_search, concurrency_levels, queries, exact, space, k, options))
+
+        report = {
+            'generated_at': timezone.now().isoformat(),
+            'space': space.name,
+            'embedding_model': space.backend.model,
+            'k': k,
+            'queries': len(queries),
+            'repeat': options['repeat'],
+            'knowbase_rows': KnowBase.objects.filter(is_active=True).count(),
+            'indexes': self.index_report(space),
+            'results': results,
+        }
+        self.stdout.write('\n📦 Indexes:')
+        for index in report['indexes']:
+            self.stdout.write(f'  {index["name"]:<32} {format_size(index["size_bytes"])}  {index["definition"] or "-"}')
+
+        if options['output']:
+            data = json.dumps(report, ensure_ascii=False, indent=2)
+            if options['output'] == '-':
+                self.stdout.write(data)
+            else:
+                with open(options['output'], 'w', encoding='utf-8') as f:
+                    f.write(data + '\n')
+                self.stdout.write(self.style.SUCCESS(f'\n✅ Report written to {options["output"]}'))
+
+        failed = sum(row['errors'] for row in results)
+        if failed:
+            raise CommandError(f'{failed} queries failed during the load runs - timings are not reliable')
+
+    def run_mode(self, mode, ef_search, concurrency_levels, queries, exact, space, k, options):
+        search = self.MODES[mode]
+        search(queries[0], k, ef_search, space)  # Warm up
+
+        # Quality does not depend on concurrency - measure it once
+        recalls = []
+        exact_recalls = []
+        reciprocal_ranks = []
+        for i, item in enumerate(queries):
+            ranked = search(item, k, ef_search, space)
+            found = set(ranked)
+            expected = set(item['expected_ids'])
+            recalls.append(len(found & expected) / len(expected) if expected else 1.0)
+            reciprocal_ranks.append(reciprocal_rank(ranked, expected))
+            if exact[i]:
+                exact_recalls.append(len(found & exact[i]) / len(exact[i]))
+
+        rows = []
+        for concurrency in concurrency_levels:
+            latencies, errors, elapsed = self.run_load(
+                search, queries, k, ef_search, space, concurrency, options['repeat']
+            )
+            row = {
+                'mode': mode,
+                'ef_search': ef_search,
+                'concurrency': concurrency,
+                'recall_at_k': round(statistics.mean(recalls), 4),
+                'mrr': round(statistics.mean(reciprocal_ranks), 4),
+                'exact_recall_at_k': round(statistics.mean(exact_recalls), 4) if exact_recalls else None,
+                'p50_ms': round(percentile(latencies, 50), 2) if latencies else None,
+                'p95_ms': round(percentile(latencies, 95), 2) if latencies else None,
+                'p99_ms': round(percentile(latencies, 99), 2) if latencies else None,
+                'qps': round(len(latencies) / elapsed, 1),
+                'errors': len(errors),
+            }
+            rows.append(row)
+            style = self.style.ERROR if errors else self.style.SUCCESS
+            self.stdout.write(style(
+                f'{mode:>7} ef={ef_search or "-":<4} c={concurrency:<3} '
+                f'recall@{k}={row["recall_at_k"]:.3f}  mrr={row["mrr"]:.3f}  '
+                f'exact@{k}={row["exact_recall_at_k"] or 0:.3f}  '
+                f'p50={row["p50_ms"] or 0:.1f}ms  p95={row["p95_ms"] or 0:.1f}ms  p99={row["p99_ms"] or 0:.1f}ms  '
+                f'qps={row["qps"]:.0f}  errors={row["errors"]}'
+            ))
+            if errors:
+                self.stdout.write(self.style.ERROR(f'  ❌ First error: {errors[0]}'))
+        return rows
+
+    def run_load(self, search, queries, k, ef_search, space, concurrency, repeat):
+        """
+        Run every query repeat times from concurrency threads;
+        return (latencies_ms, errors, wall_seconds). A failed query is counted
+        in errors instead of stopping its thread.
+        """
+        work = Queue()
+        for _ in range(repeat):
+            for item in queries:
+                work.put(item)
+        latencies = []
+        errors = []
+        lock = threading.Lock()
+
+        def worker():
+            try:
+                while True:
+                    try:
+                        item = work.get_nowait()
+                    except Empty:
+                        return
+                    start = time.perf_counter()
+                    try:
+                        search(item, k, ef_search, space)
+                    except Exception as e:
+                        with lock:
+                            errors.append(f'{type(e).__name__}: {e}')
+                        continue
+                    latency = (time.perf_counter() - start) * 1000
+                    with lock:
+                        latencies.append(latency)
+            finally:
+                connection.close()  # Each thread has its own connection
+
+        threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return latencies, errors, time.perf_counter() - start
+
+    def index_report(self, space):
+        if space.is_primary:
+            names = VECTOR_INDEXES
+        else:
+            names = [index.name for index in space.table._meta.indexes]
+        indexes = []
+        with connection.cursor() as cursor:
+            for name in names:
+                cursor.execute('SELECT indexdef FROM pg_indexes WHERE indexname = %s', [name])
+                row = cursor.fetchone()
+                indexes.append({
+                    'name': name,
+                    'definition': row[0] if row else None,
+                    'size_bytes': index_size(cursor, name),
+                })
+        return indexes
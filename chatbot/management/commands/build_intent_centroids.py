@@ -0,0 +1,65 @@
+"""
+Management command to build and check the intent router centroids
+
+Embeds every intent example (stored in the query embedding cache, so the web
+workers compute their centroids without calling the embedding API) and shows,
+for each example, the intent it lands closest to and by what margin - an
+example closer to another intent than to its own means the table needs work.
+
+--test "message" routes one message the way the chatbot would.
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from chatbot.embeddings import EmbeddingError, embed_query, get_embedding_backend
+from chatbot.intents import INTENTS, get_centroids, keyword_hits, route_intent, score_intents
+
+
+class Command(BaseCommand):
+    help = 'Embed the intent examples, build the intent centroids and report how well they separate'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--test',
+            action='append',
+            default=[],
+            help='Route this message and show the intent scores (repeatable)'
+        )
+
+    def handle(self, *args, **options):
+        backend = get_embedding_backend()
+        self.stdout.write(self.style.WARNING(f'🧠 Embedding backend: {backend.name} ({backend.model})'))
+        try:
+            get_centroids()
+        except EmbeddingError as e:
+            raise CommandError(f'Could not embed the intent examples: {e}')
+
+        self.stdout.write(
+            f'📊 {len(INTENTS)} intents, threshold {settings.CHATBOT_INTENT_THRESHOLD}, '
+            f'margin {settings.CHATBOT_INTENT_MARGIN}'
+        )
+        misplaced = 0
+        for intent in INTENTS:
+            self.stdout.write(f'\n{intent.name} (route: {intent.route or "-"})')
+            for example in intent.examples:
+                scores = score_intents(embed_query(example, task_type='retrieval_query'))
+                (best, name), (runner_up, _) = scores[0], scores[1]
+                line = f'  {best:.3f} (+{best - runner_up:.3f}) {name:<12} {example}'
+                if name == intent.name:
+                    self.stdout.write(line)
+                else:
+                    misplaced += 1
+                    self.stdout.write(self.style.ERROR(line))
+
+        if misplaced:
+            self.stdout.write(self.style.WARNING(f'\n⚠️  {misplaced} examples are closer to another intent'))
+        else:
+            self.stdout.write(self.style.SUCCESS('\n✅ Every example is closest to its own intent'))
+
+        for message in options['test']:
+            embedding = embed_query(message, task_type='retrieval_query')
+            match = route_intent(message, query_embedding=embedding)
+            scores = ', '.join(f'{name} {score:.3f}' for score, name in score_intents(embedding)[:3])
+            hits = ', '.join(sorted(keyword_hits(message))) or '-'
+            result = f'{match.intent.name} ({match.method}, {match.confidence:.3f})' if match else 'no intent'
+            self.stdout.write(f'\n🔎 "{message}" -> {result}\n   keywords: {hits}\n   scores: {scores}')
@@ -0,0 +1,86 @@
+"""
+Management command to split KnowBase documents into embedded chunks (document_chunks)
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from chatbot.chunking import chunk_documents
+from chatbot.embedding_pipeline import EmbeddingPipeline
+from chatbot.models import KnowBase
+
+# Documents split and embedded together (bounds memory on large tables)
+DOCUMENTS_PER_ROUND = 100
+
+
+class Command(BaseCommand):
+    help = 'Split KnowBase documents into overlapping chunks and embed each chunk'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Rebuild chunks for documents that already have them'
+        )
+        parser.add_argument(
+            '--source',
+            type=str,
+            help='Only documents from this source (e.g. yamaha_manual)'
+        )
+        parser.add_argument(
+            '--rate',
+            type=float,
+            help='Starting embedding rate in texts/second (default CHATBOT_EMBEDDING_RATE, lowered on 429)'
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            help='Embedding requests in flight at once (default CHATBOT_EMBEDDING_MAX_IN_FLIGHT)'
+        )
+
+    def handle(self, *args, **options):
+        queryset = (
+            KnowBase.objects
+            .filter(is_active=True)
+            .defer('embedding_half', 'embedding_bits', 'raw_data')
+        )
+        if options['source']:
+            queryset = queryset.filter(source=options['source'])
+        if not options['force']:
+            queryset = queryset.filter(chunks__isnull=True)
+
+        total_count = queryset.count()
+        if total_count == 0:
+            self.stdout.write(self.style.SUCCESS('✅ All documents already have chunks!'))
+            return
+
+        self.stdout.write(self.style.WARNING(f'📊 Chunking {total_count} documents...'))
+        pipeline = EmbeddingPipeline.for_backend(rate=options['rate'], max_in_flight=options['concurrency'])
+        start_time = time.time()
+        total_chunks = 0
+        errors = 0
+        done = 0
+
+        documents = []
+        for knowbase in queryset.order_by('id').iterator(chunk_size=DOCUMENTS_PER_ROUND):
+            documents.append(knowbase)
+            if len(documents) < DOCUMENTS_PER_ROUND:
+                continue
+            total_chunks, errors = self.chunk(pipeline, documents, total_chunks, errors)
+            done += len(documents)
+            documents = []
+            self.stdout.write(f'  {done}/{total_count} documents, {total_chunks} chunks')
+        if documents:
+            total_chunks, errors = self.chunk(pipeline, documents, total_chunks, errors)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Done in {time.time() - start_time:.1f}s: '
+            f'{total_chunks} chunks, {errors} errors '
+            f'({pipeline.stats["requests"]} requests, {pipeline.stats["rate_limited"]} rate limited)'
+        ))
+
+    def chunk(self, pipeline, documents, total_chunks, errors):
+        saved, failed = chunk_documents(documents, pipeline=pipeline)
+        for knowbase, error in failed:
+            self.stdout.write(self.style.ERROR(f'  ❌ {knowbase.id} {knowbase.title[:50]}: {error}'))
+        return total_chunks + saved, errors + len(failed)
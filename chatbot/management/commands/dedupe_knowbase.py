@@ -0,0 +1,134 @@
+"""
+Management command to cluster near-duplicate KnowBase documents (MinHash + LSH)
+
+Recomputes every signature and assigns clusters greedily. Rows are visited
+best first: rows with an embedding, then longer content, then older rows.
+Each row joins the first canonical row it matches, or becomes canonical
+itself. Duplicates are deactivated and lose their vectors and chunks
+(chatbot/dedup.py). A former duplicate that becomes canonical is
+reactivated; manage.py sync_embeddings embeds it.
+
+The importers apply the same check to every row they save, so this is for
+existing data and for trying another --threshold.
+"""
+import time
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+from django.db.models import BooleanField, ExpressionWrapper, Q
+from django.db.models.functions import Length
+
+from chatbot.dedup import NearDuplicateIndex, dedup_group, retire_duplicate, signature
+from chatbot.models import KnowBase
+
+
+class Command(BaseCommand):
+    help = 'Cluster near-duplicate KnowBase documents and keep one canonical row per cluster'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--threshold',
+            type=float,
+            help='Estimated Jaccard similarity that counts as a duplicate (default CHATBOT_DEDUP_THRESHOLD)'
+        )
+        parser.add_argument(
+            '--source',
+            type=str,
+            help='Only cluster rows from this source (e.g. pantip)'
+        )
+        parser.add_argument(
+            '--show',
+            type=int,
+            default=10,
+            help='Number of largest clusters to print'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report the clusters, change nothing'
+        )
+
+    def handle(self, *args, **options):
+        # Active rows and current duplicates; rows deactivated for other reasons are left alone
+        queryset = KnowBase.objects.filter(Q(is_active=True) | Q(duplicate_of__isnull=False))
+        if options['source']:
+            queryset = queryset.filter(source=options['source'])
+        queryset = queryset.annotate(
+            content_length=Length('content'),
+            has_embedding=ExpressionWrapper(Q(embedding__isnull=False), output_field=BooleanField()),
+        ).only('id', 'title', 'content', 'brand')
+
+        start_time = time.time()
+        rows = []
+        for i, obj in enumerate(queryset.order_by('id').iterator(chunk_size=500), 1):
+            sig = signature(obj.get_dedup_text())
+            if sig is not None:
+                rows.append((obj.id, dedup_group(obj), sig, obj.has_embedding, obj.content_length))
+            if i % 1000 == 0:
+                self.stdout.write(f'  {i} signatures...')
+        self.stdout.write(f'📊 {len(rows)} signatures in {time.time() - start_time:.1f}s')
+
+        # Prefer rows that are already embedded, then the most complete text, then the oldest
+        rows.sort(key=lambda row: (not row[3], -row[4], row[0]))
+        index = NearDuplicateIndex(options['threshold'])
+        assignment = {}  # id -> (canonical id or None, similarity)
+        for obj_id, group, sig, _, _ in rows:
+            match = index.match(group, sig)
+            if match is None:
+                index.add(obj_id, group, sig)
+                assignment[obj_id] = (None, 1.0)
+            else:
+                assignment[obj_id] = match
+
+        clusters = defaultdict(list)
+        for obj_id, (canonical_id, score) in assignment.items():
+            if canonical_id is not None:
+                clusters[canonical_id].append((obj_id, score))
+        duplicate_count = sum(len(members) for members in clusters.values())
+        self.stdout.write(self.style.SUCCESS(
+            f'🧬 {len(index)} canonical rows, {duplicate_count} near-duplicates in {len(clusters)} clusters '
+            f'(threshold {index.threshold})'
+        ))
+
+        largest = sorted(clusters.items(), key=lambda item: -len(item[1]))[:options['show']]
+        titles = dict(
+            KnowBase.objects.filter(
+                id__in=[cid for cid, members in largest] + [mid for _, members in largest for mid, _ in members]
+            ).values_list('id', 'title')
+        )
+        for canonical_id, members in largest:
+            self.stdout.write(f'\n  [{canonical_id}] {titles.get(canonical_id, "")[:80]}')
+            for member_id, score in sorted(members, key=lambda member: -member[1])[:5]:
+                self.stdout.write(f'     {score:.2f} [{member_id}] {titles.get(member_id, "")[:70]}')
+            if len(members) > 5:
+                self.stdout.write(f'     ... {len(members) - 5} more')
+
+        if options['dry_run']:
+            return
+
+        signatures = {obj_id: sig for obj_id, _, sig, _, _ in rows}
+        retired = 0
+        reactivated = 0
+        for obj in KnowBase.objects.filter(id__in=list(assignment)).defer('raw_data').iterator(chunk_size=500):
+            canonical_id, _ = assignment[obj.id]
+            obj.minhash = signatures[obj.id]
+            if canonical_id is not None:
+                if obj.duplicate_of_id != canonical_id or obj.is_active:
+                    retire_duplicate(obj, canonical_id)
+                    retired += 1
+                else:
+                    obj.save(update_fields=['minhash'])
+                continue
+            fields = ['minhash']
+            if obj.duplicate_of_id is not None or not obj.is_active:
+                obj.duplicate_of = None
+                obj.is_active = True
+                fields += ['duplicate_of', 'is_active', 'updated_at']
+                reactivated += 1
+            obj.save(update_fields=fields)
+
+        self.stdout.write(self.style.SUCCESS(f'\n✅ Retired {retired} duplicates, reactivated {reactivated} rows'))
+        if reactivated:
+            self.stdout.write(self.style.WARNING(
+                '⚠️  Reactivated rows have no embedding yet - run manage.py sync_embeddings'
+            ))
@@ -0,0 +1,90 @@
+"""
+Management command to build the quantized KnowBase embedding columns
+
+Fills embedding_half (halfvec) and embedding_bits (binary_quantize) from
+embedding inside PostgreSQL, in id-range batches, then optionally rebuilds
+the quantized HNSW indexes and reports their size and build time.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from chatbot.models import KnowBase
+
+QUANTIZED_INDEXES = ['knowbase_half_hnsw_idx', 'knowbase_bits_hnsw_idx']
+VECTOR_INDEXES = ['knowbase_embedding_hnsw_idx'] + QUANTIZED_INDEXES
+
+
+def index_size(cursor, name):
+    """On-disk size of an index in bytes (None if it does not exist)"""
+    cursor.execute('SELECT pg_relation_size(to_regclass(%s))', [name])
+    return cursor.fetchone()[0]
+
+
+def format_size(size):
+    if size is None:
+        return '-'
+    return f'{size / 1024 / 1024:.1f} MB'
+
+
+class Command(BaseCommand):
+    help = 'Backfill KnowBase.embedding_half / embedding_bits and rebuild their HNSW indexes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of rows updated per transaction'
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Recompute quantized columns even if they are already filled'
+        )
+        parser.add_argument(
+            '--reindex',
+            action='store_true',
+            help='Rebuild the quantized HNSW indexes after the backfill and time the build'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        table = connection.ops.quote_name(KnowBase._meta.db_table)
+
+        queryset = KnowBase.objects.filter(embedding__isnull=False)
+        if not options['force']:
+            queryset = queryset.filter(embedding_bits__isnull=True)
+        ids = list(queryset.order_by('id').values_list('id', flat=True))
+
+        if not ids:
+            self.stdout.write(self.style.SUCCESS('✅ All embeddings are already quantized!'))
+        else:
+            self.stdout.write(self.style.WARNING(f'📊 Quantizing {len(ids)} embeddings...'))
+            start_time = time.time()
+            for i in range(0, len(ids), batch_size):
+                batch = ids[i:i + batch_size]
+                with transaction.atomic(), connection.cursor() as cursor:
+                    cursor.execute(
+                        f'UPDATE {table} '
+                        f'SET embedding_half = embedding::halfvec(768), '
+                        f'    embedding_bits = binary_quantize(embedding)::bit(768) '
+                        f'WHERE id = ANY(%s)',
+                        [batch],
+                    )
+                self.stdout.write(f'  {min(i + batch_size, len(ids))}/{len(ids)}')
+            self.stdout.write(self.style.SUCCESS(
+                f'✅ Backfill done in {time.time() - start_time:.1f}s'
+            ))
+
+        with connection.cursor() as cursor:
+            if options['reindex']:
+                for name in QUANTIZED_INDEXES:
+                    start_time = time.time()
+                    cursor.execute(f'REINDEX INDEX {connection.ops.quote_name(name)}')
+                    self.stdout.write(f'🔨 {name}: rebuilt in {time.time() - start_time:.1f}s')
+
+            self.stdout.write('\n📦 Index sizes:')
+            for name in VECTOR_INDEXES:
+                self.stdout.write(f'  {name:<30} {format_size(index_size(cursor, name))}')
@@ -0,0 +1,124 @@
+"""
+Management command to re-embed the whole KnowBase with the configured embedding backend
+
+With CHATBOT_EMBEDDING_BACKEND=local this runs batched on CPU (no API quota),
+so a full re-embed takes minutes instead of hours.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from chatbot.embedding_backends import EmbeddingError, get_embedding_backend
+from chatbot.embedding_sync import SYNC_FIELDS, mark_embedded
+from chatbot.models import KnowBase, KnowBaseChunk
+from chatbot.semantic_cache import invalidate_for_knowbase
+
+
+class Command(BaseCommand):
+    help = 'Re-embed KnowBase documents (and their chunks) with the configured embedding backend'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--backend',
+            type=str,
+            help='Embedding backend to use (gemini or local, default CHATBOT_EMBEDDING_BACKEND)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=256,
+            help='Number of records embedded and saved per batch'
+        )
+        parser.add_argument(
+            '--missing-only',
+            action='store_true',
+            help='Only embed records that have no embedding yet'
+        )
+        parser.add_argument(
+            '--chunks',
+            action='store_true',
+            help='Also re-embed document_chunks'
+        )
+
+    def handle(self, *args, **options):
+        backend = get_embedding_backend(options['backend'])
+        self.stdout.write(self.style.WARNING(f'🧠 Embedding backend: {backend.name} ({backend.model})'))
+
+        # Near-duplicates (chatbot/dedup.py) deliberately have no embedding
+        queryset = KnowBase.objects.filter(duplicate_of__isnull=True).defer('embedding_half', 'embedding_bits', 'raw_data')
+        if options['missing_only']:
+            queryset = queryset.filter(embedding__isnull=True)
+        self.embed_queryset(
+            backend,
+            queryset,
+            text=lambda obj: obj.get_embedding_text(),
+            fields=['embedding', 'embedding_half', 'embedding_bits', *SYNC_FIELDS],
+            batch_size=options['batch_size'],
+            label='documents',
+        )
+
+        if options['chunks']:
+            chunks = KnowBaseChunk.objects.select_related('knowbase').only(
+                'id', 'content', 'embedding', 'knowbase__title'
+            )
+            if options['missing_only']:
+                chunks = chunks.filter(embedding__isnull=True)
+            self.embed_queryset(
+                backend,
+                chunks,
+                text=lambda chunk: f"{chunk.knowbase.title}\n{chunk.content}",
+                fields=['embedding'],
+                batch_size=options['batch_size'],
+                label='chunks',
+            )
+
+    def embed_queryset(self, backend, queryset, text, fields, batch_size, label):
+        total_count = queryset.count()
+        if total_count == 0:
+            self.stdout.write(self.style.SUCCESS(f'✅ No {label} to embed'))
+            return
+
+        self.stdout.write(self.style.WARNING(f'📊 Embedding {total_count} {label}...'))
+        start_time = time.time()
+        processed = 0
+        errors = 0
+
+        batch = []
+        for obj in queryset.order_by('id').iterator(chunk_size=batch_size):
+            batch.append(obj)
+            if len(batch) == batch_size:
+                errors += self.embed_batch(backend, batch, text, fields)
+                processed += len(batch)
+                batch = []
+                elapsed = time.time() - start_time
+                self.stdout.write(f'  {processed}/{total_count} ({processed / elapsed:.0f}/s)')
+        if batch:
+            errors += self.embed_batch(backend, batch, text, fields)
+            processed += len(batch)
+
+        elapsed = time.time() - start_time
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ {processed} {label} in {elapsed:.1f}s ({processed / elapsed:.0f}/s), {errors} errors'
+        ))
+
+    def embed_batch(self, backend, batch, text, fields):
+        """Embed and save one batch, return the number of failed records"""
+        texts = [text(obj) for obj in batch]
+        try:
+            # Documents are embedded without task_type (same as the importers)
+            vectors = backend.embed_batched(texts, task_type=None)
+        except EmbeddingError as e:
+            self.stdout.write(self.style.ERROR(f'  ❌ Batch failed: {e}'))
+            return len(batch)
+
+        model = type(batch[0])
+        for obj, vector, obj_text in zip(batch, vectors, texts):
+            obj.embedding = vector
+            if 'embedding_hash' in fields:
+                mark_embedded(obj, obj_text, backend.model)
+            if hasattr(obj, 'set_quantized_embeddings'):
+                obj.set_quantized_embeddings()  # bulk_update skips the pre_save signal
+        model.objects.bulk_update(batch, fields)
+        # bulk_update sends no post_save - drop the cached answers built from these rows here
+        invalidate_for_knowbase({getattr(obj, 'knowbase_id', obj.pk) for obj in batch})
+        return 0
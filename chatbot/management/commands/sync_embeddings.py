@@ -0,0 +1,154 @@
+"""
+Management command to re-embed only the KnowBase / KnowlageDatabase rows whose
+embedded text, embedding model or text recipe changed since they were embedded
+
+Meant to run after every (nightly) re-import: when nothing changed it hashes
+the text columns and makes no embedding requests at all.
+
+--space <name> fills / refreshes the side table of another embedding space
+(chatbot/embedding_spaces.py) in the background; retrieval keeps using
+CHATBOT_EMBEDDING_SPACE until it is switched.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from chatbot.chunking import chunk_documents
+from chatbot.embedding_backends import get_embedding_backend
+from chatbot.embedding_pipeline import EmbeddingPipeline, embed_and_save
+from chatbot.embedding_spaces import EMBEDDING_SPACES, embed_into_space, get_embedding_space, stale_space_rows
+from chatbot.embedding_sync import stale_rows
+from chatbot.models import KnowBase, KnowlageDatabase
+
+
+class Command(BaseCommand):
+    help = 'Re-embed stale KnowBase / KnowlageDatabase rows (changed text, model or recipe) in batches'
+
+    TARGETS = {
+        'knowbase': (KnowBase, ['embedding', 'embedding_half', 'embedding_bits']),
+        'knowlage': (KnowlageDatabase, ['embedding']),
+    }
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--target',
+            choices=[*self.TARGETS, 'all'],
+            default='all',
+            help='Table to sync (knowbase, knowlage or all)'
+        )
+        parser.add_argument(
+            '--space',
+            choices=list(EMBEDDING_SPACES),
+            help='Sync KnowBase into this embedding space instead (uses the space\'s backend)'
+        )
+        parser.add_argument(
+            '--backend',
+            type=str,
+            help='Embedding backend to use (gemini or local, default CHATBOT_EMBEDDING_BACKEND)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            help='Number of texts sent in each embedding request (default CHATBOT_EMBEDDING_BATCH_SIZE)'
+        )
+        parser.add_argument(
+            '--rate',
+            type=float,
+            help='Starting embedding rate in texts/second (default CHATBOT_EMBEDDING_RATE, lowered on 429)'
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            help='Embedding requests in flight at once (default CHATBOT_EMBEDDING_MAX_IN_FLIGHT)'
+        )
+        parser.add_argument(
+            '--chunks',
+            action='store_true',
+            help='Also rebuild document_chunks of re-embedded KnowBase rows'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only count stale rows'
+        )
+
+    def handle(self, *args, **options):
+        if options['space']:
+            space = get_embedding_space(options['space'])
+            backend = space.backend
+            self.stdout.write(self.style.WARNING(
+                f'🧠 Embedding space: {space.name} ({backend.model}, {space.dimensions} dimensions)'
+            ))
+            self.sync(
+                backend,
+                label=f'knowbase [{space.name}]',
+                queryset=KnowBase.objects.filter(is_active=True),
+                find_stale=lambda queryset: stale_space_rows(space, queryset),
+                save=lambda pipeline, pending, progress: embed_into_space(
+                    space, pipeline, pending, progress=progress
+                ),
+                options=options,
+                chunks=space.is_primary,
+            )
+            return
+
+        backend = get_embedding_backend(options['backend'])
+        self.stdout.write(self.style.WARNING(f'🧠 Embedding backend: {backend.name} ({backend.model})'))
+
+        targets = self.TARGETS if options['target'] == 'all' else [options['target']]
+        for target in targets:
+            model_class, fields = self.TARGETS[target]
+            self.sync(
+                backend,
+                label=model_class._meta.db_table,
+                queryset=model_class.objects.filter(is_active=True),
+                find_stale=lambda queryset: stale_rows(queryset, backend.model),
+                save=lambda pipeline, pending, progress, fields=fields: embed_and_save(
+                    pipeline, pending, update_fields=fields, model=backend.model, progress=progress
+                ),
+                options=options,
+                chunks=model_class is KnowBase,
+            )
+
+    def sync(self, backend, label, queryset, find_stale, save, options, chunks=False):
+        total_count = queryset.count()
+
+        start_time = time.time()
+        pending = list(find_stale(queryset))
+        self.stdout.write(
+            f'📊 {label}: {len(pending)}/{total_count} stale '
+            f'(scanned in {time.time() - start_time:.1f}s)'
+        )
+        if not pending or options['dry_run']:
+            return
+
+        kwargs = {'rate': options['rate'], 'max_in_flight': options['concurrency']}
+        if options['batch_size']:
+            kwargs['batch_size'] = min(options['batch_size'], backend.max_batch_size)
+        # Documents are embedded without task_type (same as the importers)
+        pipeline = EmbeddingPipeline.for_backend(backend, **kwargs)
+
+        start_time = time.time()
+        saved, failed = save(
+            pipeline,
+            pending,
+            lambda done, total: self.stdout.write(f'  {done}/{total}'),
+        )
+        for obj, error in failed[:10]:
+            self.stdout.write(self.style.ERROR(f'  ❌ {obj.id}: {str(error)[:100]}'))
+
+        elapsed = time.time() - start_time
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ {label}: {saved} re-embedded in {elapsed:.1f}s, {len(failed)} errors '
+            f'({pipeline.stats["requests"]} requests, {pipeline.stats["rate_limited"]} rate limited)'
+        ))
+
+        if options['chunks'] and chunks:
+            failed_ids = {obj.id for obj, _ in failed}
+            documents = [obj for obj, _ in pending if obj.id not in failed_ids]
+            _, chunk_failed = chunk_documents(documents, pipeline=pipeline)
+            for obj, error in chunk_failed:
+                self.stdout.write(self.style.ERROR(f'  ❌ Chunks of {obj.id}: {str(error)[:100]}'))
+            self.stdout.write(self.style.SUCCESS(
+                f'✅ Rebuilt chunks of {len(documents) - len(chunk_failed)} documents'
+            ))
@@ -0,0 +1,170 @@
+"""
+Conversation memory for chatbot sessions
+
+Prompts get the last CHATBOT_MEMORY_TURNS user/bot turns verbatim plus
+ChatSession.summary, a rolling summary of everything older. Loading it is one
+indexed LIMIT query on top of the session row, however long the session is.
+
+update_summary() runs after a turn is saved and folds the messages that left
+the window into the summary, CHATBOT_MEMORY_SUMMARY_BATCH messages at a time
+(one LLM call per batch, plain truncation when the LLM is unavailable).
+schedule_summary() runs it on a background thread so the request that saved
+the turn does not wait for that LLM call.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from .llm import LLMError, generate_answer
+from .models import ChatSession
+
+logger = logging.getLogger(__name__)
+
+SENDER_LABELS = {'user': 'ลูกค้า', 'bot': 'THE ONE'}
+# Longest single message copied into a prompt
+MAX_MESSAGE_CHARS = 500
+
+SUMMARY_PROMPT = (
+    'สรุปบทสนทนาระหว่างลูกค้ากับศูนย์ซ่อม THE ONE ให้สั้นและครบถ้วน '
+    'เก็บรุ่นรถ อาการ คำแนะนำ ราคา และสิ่งที่ลูกค้าต้องการไว้ '
+    'รวมสรุปเดิมกับบทสนทนาเพิ่มเติมเป็นสรุปเดียว ตอบเฉพาะสรุป'
+)
+
+# Background summaries: one worker, at most one queued job per session
+_summary_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='chat-summary')
+_summary_pending = set()
+_summary_lock = threading.Lock()
+
+
+def format_messages(messages):
+    """[(sender, text), ...] -> one line per message"""
+    return "\n".join(
+        f"{SENDER_LABELS.get(sender, sender)}: {text[:MAX_MESSAGE_CHARS]}"
+        for sender, text in messages
+    )
+
+
+class ConversationHistory:
+    """Summary + recent messages of one session (falsy when there is neither)"""
+
+    def __init__(self, summary='', messages=None):
+        self.summary = summary
+        self.messages = messages or []
+
+    def __bool__(self):
+        return bool(self.summary or self.messages)
+
+    def last_user_message(self):
+        for sender, text in reversed(self.messages):
+            if sender == 'user':
+                return text
+        return None
+
+    def search_query(self, message):
+        """Retrieval query for a follow-up question: previous question + this one"""
+        previous = self.last_user_message()
+        if previous:
+            return f"{previous[:MAX_MESSAGE_CHARS]}\n{message}"
+        return message
+
+    def as_text(self):
+        """History block for the LLM prompt"""
+        parts = []
+        if self.summary:
+            parts.append(f"สรุปบทสนทนาก่อนหน้า:\n{self.summary}")
+        if self.messages:
+            parts.append(f"บทสนทนาล่าสุด:\n{format_messages(self.messages)}")
+        return "\n\n".join(parts)
+
+    def as_payload(self):
+        """History for the n8n webhook payload"""
+        return {
+            'summary': self.summary,
+            'messages': [{'sender': sender, 'message': text} for sender, text in self.messages],
+        }
+
+
+def window_size():
+    return settings.CHATBOT_MEMORY_TURNS * 2
+
+
+def get_history(session, before_id=None):
+    """History of session, optionally only the messages before message id before_id"""
+    queryset = session.messages.order_by('-id')
+    if before_id is not None:
+        queryset = queryset.filter(id__lt=before_id)
+    recent = list(queryset.values_list('sender', 'message')[:window_size()])
+    recent.reverse()
+    return ConversationHistory(session.summary, recent)
+
+
+def summarize(previous, messages):
+    """Fold messages into the previous summary"""
+    transcript = format_messages(messages)
+    prompt = f"{SUMMARY_PROMPT}\n\nสรุปเดิม:\n{previous or '-'}\n\nบทสนทนาเพิ่มเติม:\n{transcript}"
+    try:
+        summary = generate_answer(prompt).strip()
+    except LLMError as e:
+        logger.warning(f"Summary LLM call failed, truncating instead: {e}")
+        summary = f"{previous}\n{transcript}".strip()
+    # Keep the most recent part when over the limit
+    return summary[-settings.CHATBOT_MEMORY_SUMMARY_MAX_CHARS:]
+
+
+def update_summary(session):
+    """
+    Fold messages that left the memory window into session.summary.
+    Returns True when the summary changed.
+    """
+    batch = settings.CHATBOT_MEMORY_SUMMARY_BATCH
+    window = window_size()
+    boundary = list(session.messages.order_by('-id').values_list('id', flat=True)[window - 1:window])
+    if not boundary:
+        return False
+
+    # Bounded so a long session from before the memory existed catches up gradually
+    old = list(
+        session.messages
+        .filter(id__gt=session.summary_until_id, id__lt=boundary[0])
+        .order_by('id')
+        .values_list('id', 'sender', 'message')[:batch * 8]
+    )
+    if len(old) < batch:
+        return False
+
+    summary = summarize(session.summary, [(sender, text) for _, sender, text in old])
+    until_id = old[-1][0]
+    # Another request may have folded the same messages meanwhile
+    updated = ChatSession.objects.filter(
+        pk=session.pk, summary_until_id=session.summary_until_id
+    ).update(summary=summary, summary_until_id=until_id)
+    if updated:
+        session.summary = summary
+        session.summary_until_id = until_id
+    return bool(updated)
+
+
+def _summarize_in_background(session_pk):
+    with _summary_lock:
+        _summary_pending.discard(session_pk)
+    close_old_connections()
+    try:
+        session = ChatSession.objects.filter(pk=session_pk).first()
+        if session is not None:
+            update_summary(session)
+    except Exception:
+        logger.exception(f"Background summary failed for session {session_pk}")
+    finally:
+        close_old_connections()
+
+
+def schedule_summary(session):
+    """Run update_summary(session) off the request path"""
+    with _summary_lock:
+        if session.pk in _summary_pending:
+            return
+        _summary_pending.add(session.pk)
+    _summary_executor.submit(_summarize_in_background, session.pk)
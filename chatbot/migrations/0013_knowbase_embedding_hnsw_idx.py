@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-17 15:01
+
+import pgvector.django.indexes
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0012_rename_knowbase_source_da5da4_idx_knowbase_source_eae662_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='knowbase',
+            index=pgvector.django.indexes.HnswIndex(ef_construction=64, fields=['embedding'], m=16, name='knowbase_embedding_hnsw_idx', opclasses=['vector_cosine_ops']),
+        ),
+    ]
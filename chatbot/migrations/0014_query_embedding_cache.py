@@ -0,0 +1,33 @@
+# Generated by Django 5.2.8 on 2026-10-17 15:02
+
+import pgvector.django.vector
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0013_knowbase_embedding_hnsw_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QueryEmbeddingCache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cache_key', models.CharField(max_length=64, unique=True)),
+                ('text', models.TextField(verbose_name='Normalized text')),
+                ('model', models.CharField(max_length=100)),
+                ('task_type', models.CharField(blank=True, default='', max_length=50)),
+                ('embedding', pgvector.django.vector.VectorField()),
+                ('hit_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('last_used_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                'verbose_name': 'Query Embedding Cache',
+                'verbose_name_plural': 'Query Embedding Cache',
+                'db_table': 'query_embedding_cache',
+            },
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.8 on 2026-10-17 15:03
+
+import django.contrib.postgres.fields
+import django.contrib.postgres.indexes
+import pgvector.django.indexes
+import pgvector.django.vector
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0014_query_embedding_cache'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SemanticCacheStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True)),
+                ('hits', models.PositiveIntegerField(default=0)),
+                ('misses', models.PositiveIntegerField(default=0)),
+                ('near_misses', models.PositiveIntegerField(default=0)),
+                ('invalidations', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Semantic Cache Stats',
+                'verbose_name_plural': 'Semantic Cache Stats',
+                'db_table': 'semantic_cache_stats',
+                'ordering': ['-date'],
+            },
+        ),
+        migrations.CreateModel(
+            name='SemanticAnswerCache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('query', models.TextField(verbose_name='คำถาม')),
+                ('embedding', pgvector.django.vector.VectorField(dimensions=768)),
+                ('answer', models.TextField(verbose_name='คำตอบ')),
+                ('knowbase_ids', django.contrib.postgres.fields.ArrayField(base_field=models.BigIntegerField(), blank=True, default=list, size=None)),
+                ('backend', models.CharField(blank=True, default='', max_length=20)),
+                ('hit_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('last_hit_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Semantic Answer Cache',
+                'verbose_name_plural': 'Semantic Answer Cache',
+                'db_table': 'semantic_answer_cache',
+                'ordering': ['-created_at'],
+                'indexes': [pgvector.django.indexes.HnswIndex(ef_construction=64, fields=['embedding'], m=16, name='semantic_cache_embedding_idx', opclasses=['vector_cosine_ops']), django.contrib.postgres.indexes.GinIndex(fields=['knowbase_ids'], name='semantic_cache_kb_ids_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.8 on 2026-10-17 15:08
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0015_semantic_answer_cache'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddIndex(
+            model_name='knowbase',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['title'], name='knowbase_title_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='knowbase',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['model'], name='knowbase_model_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='knowbase',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['content'], name='knowbase_content_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.8 on 2026-10-17 15:09
+
+import pgvector.django.indexes
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0016_knowbase_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='semanticanswercache',
+            name='scope',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=200),
+        ),
+        migrations.AddIndex(
+            model_name='knowbase',
+            index=pgvector.django.indexes.HnswIndex(condition=models.Q(('brand__iexact', 'honda')), ef_construction=64, fields=['embedding'], m=16, name='knowbase_honda_hnsw_idx', opclasses=['vector_cosine_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='knowbase',
+            index=pgvector.django.indexes.HnswIndex(condition=models.Q(('brand__iexact', 'yamaha')), ef_construction=64, fields=['embedding'], m=16, name='knowbase_yamaha_hnsw_idx', opclasses=['vector_cosine_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='knowbase',
+            index=pgvector.django.indexes.HnswIndex(condition=models.Q(('brand__iexact', 'kawasaki')), ef_construction=64, fields=['embedding'], m=16, name='knowbase_kawasaki_hnsw_idx', opclasses=['vector_cosine_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='knowbase',
+            index=pgvector.django.indexes.HnswIndex(condition=models.Q(('brand__iexact', 'bmw')), ef_construction=64, fields=['embedding'], m=16, name='knowbase_bmw_hnsw_idx', opclasses=['vector_cosine_ops']),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.8 on 2026-10-17 15:10
+
+import pgvector.django.bit
+import pgvector.django.halfvec
+import pgvector.django.indexes
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0017_knowbase_brand_hnsw_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='knowbase',
+            name='embedding_bits',
+            field=pgvector.django.bit.BitField(blank=True, length=768, null=True),
+        ),
+        migrations.AddField(
+            model_name='knowbase',
+            name='embedding_half',
+            field=pgvector.django.halfvec.HalfVectorField(blank=True, dimensions=768, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='knowbase',
+            index=pgvector.django.indexes.HnswIndex(ef_construction=64, fields=['embedding_half'], m=16, name='knowbase_half_hnsw_idx', opclasses=['halfvec_cosine_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='knowbase',
+            index=pgvector.django.indexes.HnswIndex(ef_construction=64, fields=['embedding_bits'], m=16, name='knowbase_bits_hnsw_idx', opclasses=['bit_hamming_ops']),
+        ),
+    ]
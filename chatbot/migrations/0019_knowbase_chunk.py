@@ -0,0 +1,37 @@
+# Generated by Django 5.2.8 on 2026-10-17 15:12
+
+import django.db.models.deletion
+import pgvector.django.indexes
+import pgvector.django.vector
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0018_knowbase_quantized_embeddings'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='KnowBaseChunk',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('chunk_index', models.PositiveIntegerField()),
+                ('content', models.TextField(verbose_name='Content')),
+                ('char_start', models.PositiveIntegerField(default=0)),
+                ('token_count', models.PositiveIntegerField(default=0)),
+                ('embedding', pgvector.django.vector.VectorField(blank=True, dimensions=768, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('knowbase', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chunks', to='chatbot.knowbase')),
+            ],
+            options={
+                'verbose_name': 'Knowledge Base Chunk',
+                'verbose_name_plural': 'Knowledge Base Chunks',
+                'db_table': 'document_chunks',
+                'ordering': ['knowbase', 'chunk_index'],
+                'indexes': [pgvector.django.indexes.HnswIndex(ef_construction=64, fields=['embedding'], m=16, name='document_chunks_embedding_idx', opclasses=['vector_cosine_ops'])],
+                'constraints': [models.UniqueConstraint(fields=('knowbase', 'chunk_index'), name='document_chunks_unique_index')],
+            },
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.8 on 2026-10-17 15:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0019_knowbase_chunk'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='knowbase',
+            name='embedding_hash',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='knowbase',
+            name='embedding_model',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+        migrations.AddField(
+            model_name='knowbase',
+            name='embedding_version',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='knowlagedatabase',
+            name='embedding_hash',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='knowlagedatabase',
+            name='embedding_model',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+        migrations.AddField(
+            model_name='knowlagedatabase',
+            name='embedding_version',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+    ]
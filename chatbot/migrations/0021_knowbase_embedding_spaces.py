@@ -0,0 +1,52 @@
+# Generated by Django 5.2.8 on 2026-10-17 15:21
+
+import django.db.models.deletion
+import pgvector.django.indexes
+import pgvector.django.vector
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0020_embedding_change_tracking'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='KnowBaseLocalEmbedding',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('embedding_hash', models.CharField(max_length=64)),
+                ('embedding_model', models.CharField(max_length=100)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('embedding', pgvector.django.vector.VectorField(dimensions=768)),
+                ('knowbase', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='local_embedding', to='chatbot.knowbase')),
+            ],
+            options={
+                'verbose_name': 'Knowledge Base Local Embedding',
+                'verbose_name_plural': 'Knowledge Base Local Embeddings',
+                'db_table': 'knowbase_embeddings_local_768',
+                'indexes': [pgvector.django.indexes.HnswIndex(ef_construction=64, fields=['embedding'], m=16, name='knowbase_local_768_hnsw_idx', opclasses=['vector_cosine_ops'])],
+            },
+        ),
+        migrations.CreateModel(
+            name='KnowBaseOpenAIEmbedding',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('embedding_hash', models.CharField(max_length=64)),
+                ('embedding_model', models.CharField(max_length=100)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('embedding', pgvector.django.vector.VectorField(dimensions=1536)),
+                ('knowbase', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='openai_embedding', to='chatbot.knowbase')),
+            ],
+            options={
+                'verbose_name': 'Knowledge Base OpenAI Embedding',
+                'verbose_name_plural': 'Knowledge Base OpenAI Embeddings',
+                'db_table': 'knowbase_embeddings_openai_1536',
+                'indexes': [pgvector.django.indexes.HnswIndex(ef_construction=64, fields=['embedding'], m=16, name='knowbase_openai_1536_hnsw_idx', opclasses=['vector_cosine_ops'])],
+            },
+        ),
+    ]
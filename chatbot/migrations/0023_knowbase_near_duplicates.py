@@ -0,0 +1,25 @@
+# Generated by Django 5.2.8 on 2026-10-17 15:32
+
+import django.contrib.postgres.fields
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0022_chat_session_memory'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='knowbase',
+            name='duplicate_of',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='duplicates', to='chatbot.knowbase'),
+        ),
+        migrations.AddField(
+            model_name='knowbase',
+            name='minhash',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.BigIntegerField(), blank=True, null=True, size=None),
+        ),
+    ]
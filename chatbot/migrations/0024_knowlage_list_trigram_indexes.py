@@ -0,0 +1,27 @@
+# Generated by Django 5.2.8 on 2026-10-17 15:35
+
+import django.contrib.postgres.indexes
+import django.db.models.functions.text
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0023_knowbase_near_duplicates'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='knowlagedatabase',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('brand'), name='gin_trgm_ops'), name='knowlage_brand_trgm_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='knowlagedatabase',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('model'), name='gin_trgm_ops'), name='knowlage_model_trgm_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='knowlagedatabase',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('category'), name='gin_trgm_ops'), name='knowlage_category_trgm_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-17 16:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0024_knowlage_list_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='semanticanswercache',
+            name='embedding_model',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+    ]
@@ -1,6 +1,9 @@
 from django.db import models
+from django.db.models.functions import Upper
 from django.conf import settings
-from pgvector.django import VectorField
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from pgvector.django import BitField, HalfVectorField, HnswIndex, VectorField
 
 
 class ChatSession(models.Model):
@@ -24,6 +27,10 @@ class ChatSession(models.Model):
     )
     is_active = models.BooleanField(default=True, verbose_name='กำลังใช้งาน')
     
+    # Rolling summary of the messages older than the memory window (chatbot/memory.py)
+    summary = models.TextField(blank=True, default='', verbose_name='สรุปบทสนทนา')
+    summary_until_id = models.BigIntegerField(default=0)
+    
     class Meta:
         verbose_name = 'เซสชันแชท'
         verbose_name_plural = 'เซสชันแชททั้งหมด'
@@ -65,6 +72,10 @@ class ChatMessage(models.Model):
         verbose_name = 'ข้อความแชท'
         verbose_name_plural = 'ข้อความแชททั้งหมด'
         ordering = ['created_at']
+        indexes = [
+            # Memory window / message paging: latest messages of one session
+            models.Index(fields=['session', '-id'], name='chat_message_session_idx'),
+        ]
     
     def __str__(self):
         return f"{self.get_sender_display()}: {self.message[:50]}"
@@ -155,6 +166,13 @@ class KnowlageDatabase(models.Model):
         blank=True,
         verbose_name='Vector Embedding'
     )
+    # What the embedding was computed from (manage.py sync_embeddings re-embeds stale rows)
+    embedding_hash = models.CharField(max_length=64, blank=True, default='')
+    embedding_model = models.CharField(max_length=100, blank=True, default='')
+    embedding_version = models.PositiveSmallIntegerField(default=0)
+    
+    # Bump when get_embedding_text() changes so every row is re-embedded
+    EMBEDDING_TEXT_VERSION = 1
     
     class Meta:
         db_table = 'DatabaseKnowlage'
@@ -166,10 +184,26 @@ class KnowlageDatabase(models.Model):
             models.Index(fields=['brand', 'model']),
             models.Index(fields=['is_active']),
             models.Index(fields=['-published_at']),
+            # Trigram indexes for the substring filters of KnowlageDatabaseListView (needs pg_trgm).
+            # icontains compiles to UPPER(col) LIKE UPPER('%...%'), so the indexed expression is UPPER(col)
+            GinIndex(OpClass(Upper('brand'), name='gin_trgm_ops'), name='knowlage_brand_trgm_idx'),
+            GinIndex(OpClass(Upper('model'), name='gin_trgm_ops'), name='knowlage_model_trgm_idx'),
+            GinIndex(OpClass(Upper('category'), name='gin_trgm_ops'), name='knowlage_category_trgm_idx'),
         ]
     
     def __str__(self):
         return f"[{self.source}] {self.title[:80]}"
+    
+    def get_embedding_text(self):
+        """Text embedded into KnowlageDatabase.embedding (same as generate_embeddings)"""
+        text = f"{self.title}\n{self.content[:1500]}"
+        if self.brand and self.model:
+            text = f"{self.brand} {self.model}\n{text}"
+        return text
+
+
+# Brands with their own partial HNSW index (filtered search for owners of these bikes)
+KNOWBASE_INDEXED_BRANDS = ['honda', 'yamaha', 'kawasaki', 'bmw']
 
 
 class KnowBase(models.Model):
@@ -191,6 +225,25 @@ class KnowBase(models.Model):
     # Vector Embedding (768 dimensions for Gemini text-embedding-004)
     # For OpenAI: use 1536 dimensions with import_honda_openai/import_pantip_openai
     embedding = VectorField(dimensions=768, null=True, blank=True)
+    # Quantized copies of embedding (filled on save / by manage.py quantize_embeddings)
+    # used when CHATBOT_VECTOR_STORAGE is 'halfvec' or 'binary'
+    embedding_half = HalfVectorField(dimensions=768, null=True, blank=True)
+    embedding_bits = BitField(length=768, null=True, blank=True)
+    # What the embedding was computed from (manage.py sync_embeddings re-embeds stale rows)
+    embedding_hash = models.CharField(max_length=64, blank=True, default='')
+    embedding_model = models.CharField(max_length=100, blank=True, default='')
+    embedding_version = models.PositiveSmallIntegerField(default=0)
+    
+    # Near-duplicate detection (chatbot/dedup.py): MinHash signature of get_dedup_text()
+    # and the canonical row this one duplicates (duplicates are inactive and have no vectors)
+    minhash = ArrayField(models.BigIntegerField(), blank=True, null=True)
+    duplicate_of = models.ForeignKey(
+        'self',
+        on_delete=models.SET_NULL,
+        blank=True,
+        null=True,
+        related_name='duplicates'
+    )
     
     # Additional data
     raw_data = models.JSONField(blank=True, null=True)
@@ -200,6 +253,9 @@ class KnowBase(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     is_active = models.BooleanField(default=True, db_index=True)
     
+    # Bump when get_embedding_text() changes so every row is re-embedded
+    EMBEDDING_TEXT_VERSION = 1
+    
     class Meta:
         db_table = 'knowbase'
         verbose_name = 'Knowledge Base'
@@ -208,7 +264,258 @@ class KnowBase(models.Model):
         indexes = [
             models.Index(fields=['source', 'brand']),
             models.Index(fields=['brand', 'model']),
+            # HNSW index for cosine similarity search (same parameters as create_vector_index.py)
+            HnswIndex(
+                name='knowbase_embedding_hnsw_idx',
+                fields=['embedding'],
+                m=16,
+                ef_construction=64,
+                opclasses=['vector_cosine_ops'],
+            ),
+            # Partial HNSW per brand - matches brand__iexact filters in chatbot/retrieval.py
+            *[
+                HnswIndex(
+                    name=f'knowbase_{brand}_hnsw_idx',
+                    fields=['embedding'],
+                    m=16,
+                    ef_construction=64,
+                    opclasses=['vector_cosine_ops'],
+                    condition=models.Q(brand__iexact=brand),
+                )
+                for brand in KNOWBASE_INDEXED_BRANDS
+            ],
+            # Quantized indexes: halfvec is half the size, bit is 1/32 (re-ranked on embedding)
+            HnswIndex(
+                name='knowbase_half_hnsw_idx',
+                fields=['embedding_half'],
+                m=16,
+                ef_construction=64,
+                opclasses=['halfvec_cosine_ops'],
+            ),
+            HnswIndex(
+                name='knowbase_bits_hnsw_idx',
+                fields=['embedding_bits'],
+                m=16,
+                ef_construction=64,
+                opclasses=['bit_hamming_ops'],
+            ),
+            # Trigram indexes for the lexical side of hybrid search (needs pg_trgm)
+            GinIndex(name='knowbase_title_trgm_idx', fields=['title'], opclasses=['gin_trgm_ops']),
+            GinIndex(name='knowbase_model_trgm_idx', fields=['model'], opclasses=['gin_trgm_ops']),
+            GinIndex(name='knowbase_content_trgm_idx', fields=['content'], opclasses=['gin_trgm_ops']),
+        ]
+    
+    def __str__(self):
+        return f"{self.brand} {self.model}" if self.brand and self.model else self.title[:80]
+    
+    def set_quantized_embeddings(self):
+        """Derive embedding_half / embedding_bits from embedding"""
+        if self.embedding is None:
+            self.embedding_half = None
+            self.embedding_bits = None
+            return
+        values = [float(x) for x in self.embedding]
+        self.embedding_half = values
+        self.embedding_bits = ''.join('1' if x > 0 else '0' for x in values)
+    
+    def get_embedding_text(self):
+        """Text embedded into KnowBase.embedding (same as import_to_knowbase.py)"""
+        return f"{self.title}\n{self.content[:2000]}"
+    
+    def get_dedup_text(self):
+        """Text compared for near-duplicate detection"""
+        return f"{self.title}\n{self.content[:settings.CHATBOT_DEDUP_MAX_CHARS]}"
+    
+    def get_context_text(self):
+        """Return formatted text for the RAG prompt"""
+        parts = []
+        if self.brand and self.model:
+            parts.append(f"{self.brand} {self.model}")
+        parts.append(self.title)
+        matched_chunks = getattr(self, 'matched_chunks', None)
+        if matched_chunks:
+            # Chunk retrieval: only the passages that matched the query
+            parts.extend(chunk.content for chunk in matched_chunks)
+        elif self.content:
+            parts.append(self.content[:1500])  # Limit content length
+        return "\n".join(parts)
+
+
+class KnowBaseChunk(models.Model):
+    """
+    Overlapping, token-bounded piece of a KnowBase document with its own embedding.
+    Long documents (PDF manuals, long Pantip threads) are searchable end to end.
+    """
+    knowbase = models.ForeignKey(KnowBase, on_delete=models.CASCADE, related_name='chunks')
+    chunk_index = models.PositiveIntegerField()
+    content = models.TextField(verbose_name='Content')
+    char_start = models.PositiveIntegerField(default=0)
+    token_count = models.PositiveIntegerField(default=0)
+    embedding = VectorField(dimensions=768, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        db_table = 'document_chunks'
+        verbose_name = 'Knowledge Base Chunk'
+        verbose_name_plural = 'Knowledge Base Chunks'
+        ordering = ['knowbase', 'chunk_index']
+        constraints = [
+            models.UniqueConstraint(fields=['knowbase', 'chunk_index'], name='document_chunks_unique_index'),
+        ]
+        indexes = [
+            HnswIndex(
+                name='document_chunks_embedding_idx',
+                fields=['embedding'],
+                m=16,
+                ef_construction=64,
+                opclasses=['vector_cosine_ops'],
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.knowbase_id} #{self.chunk_index}"
+
+
+class KnowBaseSpaceEmbedding(models.Model):
+    """
+    Embedding of a KnowBase document in an extra embedding space
+    (another model / dimension, see chatbot/embedding_spaces.py).
+    One concrete table per space, each with its own HNSW index.
+    """
+    embedding_hash = models.CharField(max_length=64)
+    embedding_model = models.CharField(max_length=100)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        abstract = True
+    
+    def __str__(self):
+        return f"{self.knowbase_id} ({self.embedding_model})"
+
+
+class KnowBaseOpenAIEmbedding(KnowBaseSpaceEmbedding):
+    """OpenAI text-embedding-3-large, 1536 dimensions (import_honda_openai / import_pantip_openai)"""
+    knowbase = models.OneToOneField(KnowBase, on_delete=models.CASCADE, related_name='openai_embedding')
+    embedding = VectorField(dimensions=1536)
+    
+    class Meta:
+        db_table = 'knowbase_embeddings_openai_1536'
+        verbose_name = 'Knowledge Base OpenAI Embedding'
+        verbose_name_plural = 'Knowledge Base OpenAI Embeddings'
+        indexes = [
+            HnswIndex(
+                name='knowbase_openai_1536_hnsw_idx',
+                fields=['embedding'],
+                m=16,
+                ef_construction=64,
+                opclasses=['vector_cosine_ops'],
+            ),
+        ]
+
+
+class KnowBaseLocalEmbedding(KnowBaseSpaceEmbedding):
+    """Local sentence-transformers model, 768 dimensions (CHATBOT_LOCAL_EMBEDDING_MODEL)"""
+    knowbase = models.OneToOneField(KnowBase, on_delete=models.CASCADE, related_name='local_embedding')
+    embedding = VectorField(dimensions=768)
+    
+    class Meta:
+        db_table = 'knowbase_embeddings_local_768'
+        verbose_name = 'Knowledge Base Local Embedding'
+        verbose_name_plural = 'Knowledge Base Local Embeddings'
+        indexes = [
+            HnswIndex(
+                name='knowbase_local_768_hnsw_idx',
+                fields=['embedding'],
+                m=16,
+                ef_construction=64,
+                opclasses=['vector_cosine_ops'],
+            ),
         ]
+
+
+class QueryEmbeddingCache(models.Model):
+    """
+    Shared (cross-process) cache of query embeddings.
+    Keyed by sha256 of model + task_type + normalized query text.
+    """
+    cache_key = models.CharField(max_length=64, unique=True)
+    text = models.TextField(verbose_name='Normalized text')
+    model = models.CharField(max_length=100)
+    task_type = models.CharField(max_length=50, blank=True, default='')
+    # No fixed dimensions: cache works for any embedding model
+    embedding = VectorField()
+    hit_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    last_used_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    
+    class Meta:
+        db_table = 'query_embedding_cache'
+        verbose_name = 'Query Embedding Cache'
+        verbose_name_plural = 'Query Embedding Cache'
     
     def __str__(self):
-        return f"{self.brand} {self.model}" if self.brand and self.model else self.title[:80]
\ No newline at end of file
+        return f"[{self.model}/{self.task_type}] {self.text[:80]}"
+
+
+class SemanticAnswerCache(models.Model):
+    """
+    Past chatbot answers keyed by query embedding.
+    A new query within CHATBOT_SEMANTIC_CACHE_THRESHOLD cosine similarity reuses the answer.
+    """
+    query = models.TextField(verbose_name='คำถาม')
+    embedding = VectorField(dimensions=768)
+    answer = models.TextField(verbose_name='คำตอบ')
+    # KnowBase rows used to build the answer - entries are dropped when any of them change
+    knowbase_ids = ArrayField(models.BigIntegerField(), default=list, blank=True)
+    backend = models.CharField(max_length=20, blank=True, default='')
+    # Model of the query embedding - vectors of different models are not comparable
+    embedding_model = models.CharField(max_length=100, blank=True, default='')
+    # Retrieval filter the answer was built with (e.g. "brand:honda"), '' = unfiltered
+    scope = models.CharField(max_length=200, blank=True, default='', db_index=True)
+    hit_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    last_hit_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        db_table = 'semantic_answer_cache'
+        verbose_name = 'Semantic Answer Cache'
+        verbose_name_plural = 'Semantic Answer Cache'
+        ordering = ['-created_at']
+        indexes = [
+            HnswIndex(
+                name='semantic_cache_embedding_idx',
+                fields=['embedding'],
+                m=16,
+                ef_construction=64,
+                opclasses=['vector_cosine_ops'],
+            ),
+            GinIndex(fields=['knowbase_ids'], name='semantic_cache_kb_ids_idx'),
+        ]
+    
+    def __str__(self):
+        return self.query[:80]
+
+
+class SemanticCacheStats(models.Model):
+    """Daily hit/miss counters for tuning the semantic cache threshold"""
+    date = models.DateField(unique=True)
+    hits = models.PositiveIntegerField(default=0)
+    misses = models.PositiveIntegerField(default=0)
+    # Misses whose best match was within CHATBOT_SEMANTIC_CACHE_NEAR_MISS of the threshold
+    near_misses = models.PositiveIntegerField(default=0)
+    invalidations = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        db_table = 'semantic_cache_stats'
+        verbose_name = 'Semantic Cache Stats'
+        verbose_name_plural = 'Semantic Cache Stats'
+        ordering = ['-date']
+    
+    def __str__(self):
+        return f"{self.date}: {self.hits} hits / {self.misses} misses"
+    
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
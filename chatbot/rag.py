@@ -0,0 +1,236 @@
+"""
+Chatbot answer backends
+
+- LocalRAGBackend: embed query -> KnowBase HNSW search -> build context -> Gemini (in-process)
+- N8NBackend: forward the message to N8N_WEBHOOK_URL (previous behaviour)
+
+Select with settings.CHATBOT_BACKEND ('local' or 'n8n').
+answer_message() puts the intent router (chatbot/intents.py), the semantic answer
+cache and request coalescing (chatbot/admission.py) in front of either backend.
+Both backends take an optional ConversationHistory (chatbot/memory.py) so
+follow-up questions keep their context.
+"""
+import logging
+import time
+
+from django.conf import settings
+
+from .admission import flight_key, single_flight
+from .embeddings import EmbeddingError, embed_query, normalize_query
+from .http_client import UpstreamError, get_n8n_client
+from .intents import route_intent
+from .llm import LLMError, build_prompt, generate_answer
+from .embedding_spaces import get_embedding_space
+from .retrieval import brand_scope, build_context, embed_space_query, get_user_brands, retrieve_documents
+from . import semantic_cache
+
+logger = logging.getLogger(__name__)
+
+
+class ChatBackendError(Exception):
+    """Raised when a backend cannot produce an answer (caller should use the fallback)"""
+
+
+def extract_n8n_answer(data):
+    """n8n AI Agent returns 'output'; older workflows return 'response' or 'text'"""
+    return data.get('output', data.get('response', data.get('text')))
+
+
+class LocalRAGBackend:
+    """Retrieval + generation inside Django, no n8n round trip"""
+    name = 'local'
+
+    def retrieve(self, message, brands=None, query_embedding=None):
+        """
+        Embed the message and return (documents, context), optionally filtered by brand.
+
+        query_embedding is the primary backend's vector of message (as used by
+        the semantic cache); it is reused when the search space is primary.
+        """
+        if query_embedding is None or not get_embedding_space().is_primary:
+            query_embedding = embed_space_query(message)
+        documents = retrieve_documents(message, query_embedding, brands=brands)
+        return documents, build_context(documents)
+
+    def cache_scope(self, user):
+        """Semantic cache scope - answers depend on the user's motorcycle brands"""
+        return brand_scope(get_user_brands(user))
+
+    def flight_scope(self, user, session_id=None):
+        """Coalescing scope - users with the same brands share one answer"""
+        return self.cache_scope(user)
+
+    def answer(self, message, user=None, session_id=None, history=None, query_embedding=None):
+        started = time.monotonic()
+        search_query = history.search_query(message) if history else message
+        if history:
+            query_embedding = None
+        try:
+            documents, context = self.retrieve(
+                search_query, brands=get_user_brands(user), query_embedding=query_embedding
+            )
+            response = generate_answer(build_prompt(message, context, history))
+        except (EmbeddingError, LLMError) as e:
+            raise ChatBackendError(str(e)) from e
+
+        return {
+            'response': response,
+            'sources': [
+                {
+                    'id': doc.id,
+                    'title': doc.title,
+                    'source_url': doc.source_url,
+                    'similarity': round(1 - doc.distance, 4),
+                }
+                for doc in documents
+            ],
+            'backend': self.name,
+            'elapsed_ms': int((time.monotonic() - started) * 1000),
+        }
+
+
+class N8NBackend:
+    """Forward the message to the n8n RAG workflow (pooled client + circuit breaker)"""
+    name = 'n8n'
+
+    def cache_scope(self, user):
+        """n8n answers do not depend on the user"""
+        return ''
+
+    def flight_scope(self, user, session_id=None):
+        """
+        Coalescing scope - n8n gets the user and session in the payload and keeps
+        per-session memory, so only duplicates from the same session share a call
+        """
+        return f"user:{user.id if user is not None else ''}:session:{session_id or ''}"
+
+    def build_payload(self, message, user=None, session_id=None, history=None):
+        payload = {'message': message}
+        if user is not None:
+            payload.update({
+                'user_id': user.id,
+                'username': user.username,
+                'user_type': user.user_type,
+            })
+        if session_id:
+            payload.update({'session_id': session_id, 'user_message': message})
+        if history:
+            payload['conversation'] = history.as_payload()
+        return payload
+
+    def build_result(self, data, started):
+        bot_response = extract_n8n_answer(data)
+        if not bot_response:
+            raise ChatBackendError('n8n returned no answer')
+        return {
+            'response': bot_response,
+            'sources': [],
+            'backend': self.name,
+            'elapsed_ms': int((time.monotonic() - started) * 1000),
+            'raw': data,
+        }
+
+    def answer(self, message, user=None, session_id=None, history=None, query_embedding=None):
+        started = time.monotonic()
+        try:
+            data = get_n8n_client().post(self.build_payload(message, user, session_id, history))
+        except UpstreamError as e:
+            raise ChatBackendError(str(e)) from e
+        return self.build_result(data, started)
+
+    async def aanswer(self, message, user=None, session_id=None, history=None):
+        started = time.monotonic()
+        try:
+            data = await get_n8n_client().apost(self.build_payload(message, user, session_id, history))
+        except UpstreamError as e:
+            raise ChatBackendError(str(e)) from e
+        return self.build_result(data, started)
+
+
+BACKENDS = {
+    LocalRAGBackend.name: LocalRAGBackend,
+    N8NBackend.name: N8NBackend,
+}
+
+
+def get_chat_backend(name=None):
+    """Return the configured chatbot backend instance"""
+    name = name or settings.CHATBOT_BACKEND
+    try:
+        return BACKENDS[name]()
+    except KeyError:
+        raise ChatBackendError(f'Unknown CHATBOT_BACKEND: {name}')
+
+
+def answer_message(message, user=None, session_id=None, history=None):
+    """
+    Answer a chatbot message through the intent router, the semantic cache
+    and the configured backend. Raises ChatBackendError when no answer can be produced.
+
+    With a conversation history the answer depends on earlier turns,
+    so the semantic cache is bypassed. Without one, identical questions in
+    flight at the same time share one backend call (single_flight) within
+    the backend's flight_scope(); a shared result carries no raw n8n payload.
+    """
+    started = time.monotonic()
+    query_embedding = None
+    if not history:
+        try:
+            query_embedding = embed_query(message, task_type='retrieval_query')
+        except EmbeddingError as e:
+            # Cache needs the embedding; the n8n backend can still answer without it
+            logger.warning(f"Semantic cache skipped, embedding failed: {e}")
+
+    match = route_intent(message, query_embedding=query_embedding, history=history)
+    if match is not None:
+        return {
+            'response': match.intent.answer,
+            'sources': [],
+            'backend': 'intent',
+            'cached': False,
+            'intent': match.intent.name,
+            'confidence': round(match.confidence, 4),
+            'elapsed_ms': int((time.monotonic() - started) * 1000),
+        }
+
+    backend = get_chat_backend()
+    scope = backend.cache_scope(user)
+
+    if query_embedding is not None:
+        entry = semantic_cache.lookup(query_embedding, scope=scope)
+        if entry is not None:
+            return {
+                'response': entry.answer,
+                'sources': [{'id': kb_id} for kb_id in entry.knowbase_ids],
+                'backend': 'cache',
+                'cached': True,
+                'similarity': round(entry.similarity, 4),
+                'elapsed_ms': int((time.monotonic() - started) * 1000),
+            }
+
+    if history:
+        result = backend.answer(message, user=user, session_id=session_id, history=history)
+        coalesced = False
+    else:
+        result, coalesced = single_flight(
+            flight_key(backend.name, backend.flight_scope(user, session_id), normalize_query(message)),
+            lambda: backend.answer(message, user=user, session_id=session_id, query_embedding=query_embedding),
+        )
+    result['cached'] = False
+    if coalesced:
+        # Another request made the call and stores it in the semantic cache
+        result.pop('raw', None)
+        result['coalesced'] = True
+        result['elapsed_ms'] = int((time.monotonic() - started) * 1000)
+        return result
+
+    if query_embedding is not None:
+        semantic_cache.store(
+            message,
+            query_embedding,
+            result['response'],
+            knowbase_ids=[source['id'] for source in result['sources']],
+            backend=result['backend'],
+            scope=scope,
+        )
+    return result
@@ -0,0 +1,31 @@
+"""
+Shared Redis connection (the redis service in docker-compose.yml)
+
+One pooled client per process with short timeouts: callers treat Redis as an
+optimisation and carry on without it (RedisError) when it is down.
+"""
+import threading
+
+import redis
+from django.conf import settings
+
+RedisError = redis.RedisError
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_redis():
+    """Return the process-wide Redis client for settings.REDIS_URL"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = redis.Redis.from_url(
+                    settings.REDIS_URL,
+                    socket_connect_timeout=settings.REDIS_CONNECT_TIMEOUT,
+                    socket_timeout=settings.REDIS_TIMEOUT,
+                    health_check_interval=30,
+                    decode_responses=True,
+                )
+    return _client
@@ -0,0 +1,492 @@
+"""
+KnowBase retrieval for the in-process RAG engine
+
+- search_knowbase(): cosine top-k on KnowBase.embedding (knowbase_embedding_hnsw_idx)
+- hybrid_search(): vector top-N + pg_trgm lexical top-N merged with reciprocal
+  rank fusion in one SQL statement (finds exact model codes like "CBR250rr")
+- retrieve_documents(): picks one of the above from CHATBOT_RETRIEVAL_MODE
+
+Both searches accept a brand filter (taken from the customer's booking.Motorcycle
+rows). Brand-agnostic rows (no brand, or a GENERAL_BRANDS source such as Pantip
+threads) always pass it. pgvector iterative scans keep walking the global
+index until k rows pass the filter.
+retrieve_documents() tops up with unfiltered rows so k results are always returned.
+
+CHATBOT_VECTOR_STORAGE picks the vector column searched: 'float' (embedding),
+'halfvec' (embedding_half) or 'binary' (Hamming top-N on embedding_bits,
+re-ranked by exact cosine distance on embedding).
+
+With CHATBOT_USE_CHUNKS, search_chunks() searches KnowBaseChunk embeddings
+instead and groups the matching chunks under their parent documents.
+
+CHATBOT_EMBEDDING_SPACE other than 'primary' searches that space's side table
+(chatbot/embedding_spaces.py) with a query embedded by the space's backend.
+Chunks only exist in the primary space, so chunk search is skipped there.
+"""
+import logging
+import re
+
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Q
+from pgvector.django import CosineDistance, HammingDistance
+
+from .embedding_spaces import get_embedding_space
+from .embeddings import embed_query
+from .models import KnowBase, KnowBaseChunk
+
+try:
+    from pythainlp.tokenize import word_tokenize
+except ImportError:  # Optional - falls back to character windows
+    word_tokenize = None
+
+# Latin model codes ("CBR250rr", "PCX-160") or runs of Thai characters
+_TERM_RE = re.compile(r'[A-Za-z0-9][A-Za-z0-9\-.]*[A-Za-z0-9]|[\u0E00-\u0E7F]{2,}')
+_THAI_RE = re.compile(r'^[\u0E00-\u0E7F]+$')
+MAX_LEXICAL_TERMS = 8
+# KnowBase.brand of content that applies to every motorcycle (forum threads, general guides)
+GENERAL_BRANDS = ['pantip', 'general']
+
+logger = logging.getLogger(__name__)
+
+
+def set_ef_search(cursor, ef_search):
+    """Set hnsw.ef_search for the current transaction only"""
+    cursor.execute('SET LOCAL hnsw.ef_search = %s', [int(ef_search)])
+
+
+def set_iterative_scan(cursor):
+    """
+    Enable HNSW iterative index scans for the current transaction (pgvector >= 0.8),
+    so filtered queries keep scanning until enough rows match instead of
+    returning fewer than k. Older pgvector keeps the plain scan.
+    """
+    try:
+        with transaction.atomic():
+            cursor.execute("SET LOCAL hnsw.iterative_scan = 'relaxed_order'")
+            cursor.execute(
+                'SET LOCAL hnsw.max_scan_tuples = %s',
+                [int(settings.CHATBOT_HNSW_MAX_SCAN_TUPLES)],
+            )
+    except DatabaseError as e:
+        logger.warning(f"HNSW iterative scan not available (pgvector < 0.8?): {e}")
+
+
+def quantize_bits(embedding):
+    """Binary quantization (same as pgvector binary_quantize): 1 for each positive dimension"""
+    return ''.join('1' if float(x) > 0 else '0' for x in embedding)
+
+
+def normalize_brands(brands):
+    """Lowercase, de-duplicated brand list ([] = no filter)"""
+    return sorted({b.strip().lower() for b in brands or [] if b and b.strip()})
+
+
+def get_user_brands(user):
+    """Brands of the motorcycles the user owns (used as the retrieval filter)"""
+    if not settings.CHATBOT_FILTER_BY_MOTORCYCLE or user is None or not user.is_authenticated:
+        return []
+    from booking.models import Motorcycle
+
+    return normalize_brands(
+        Motorcycle.objects.filter(owner=user).values_list('brand', flat=True).distinct()
+    )
+
+
+def is_general_brand(brand):
+    """True for KnowBase rows that pass every brand filter"""
+    return not brand or not brand.strip() or brand.strip().lower() in GENERAL_BRANDS
+
+
+def brand_scope(brands):
+    """Semantic cache scope string for a brand filter (the filter also admits general rows)"""
+    brands = normalize_brands(brands)
+    return f"brand:{','.join(brands)}+general" if brands else ''
+
+
+def brand_q(brands):
+    """OR of brand__iexact lookups, plus the brand-agnostic rows"""
+    q = Q(brand__isnull=True) | Q(brand='')
+    for brand in [*brands, *GENERAL_BRANDS]:
+        q |= Q(brand__iexact=brand)
+    return q
+
+
+def vector_literal(embedding):
+    """pgvector text literal for raw SQL parameters"""
+    return '[' + ','.join(str(float(x)) for x in embedding) + ']'
+
+
+def search_knowbase(query_embedding, k=None, ef_search=None, brands=None, storage=None, space=None):
+    """
+    Return the top-k active KnowBase rows closest to query_embedding,
+    optionally restricted to the given brands.
+
+    Each returned object has a ``distance`` attribute (cosine distance, 0 = identical).
+    space (an EmbeddingSpace) searches a side table instead; storage only
+    applies to the primary space.
+    """
+    k = k or settings.CHATBOT_TOP_K
+    ef_search = ef_search or settings.CHATBOT_HNSW_EF_SEARCH
+    storage = storage or settings.CHATBOT_VECTOR_STORAGE
+    brands = normalize_brands(brands)
+    if space is not None and not space.is_primary:
+        return search_space(space, query_embedding, k, ef_search, brands)
+
+    queryset = KnowBase.objects.filter(is_active=True, embedding__isnull=False)
+    if brands:
+        queryset = queryset.filter(brand_q(brands))
+
+    if storage == 'binary':
+        # Coarse Hamming pass on the bit index, exact cosine re-rank of the candidates
+        candidates = max(settings.CHATBOT_BINARY_CANDIDATES, k)
+        ef_search = max(ef_search, candidates)
+        candidate_ids = (
+            queryset
+            .order_by(HammingDistance('embedding_bits', quantize_bits(query_embedding)))
+            .values('id')[:candidates]
+        )
+        queryset = KnowBase.objects.filter(id__in=candidate_ids).annotate(
+            distance=CosineDistance('embedding', query_embedding)
+        )
+    elif storage == 'halfvec':
+        queryset = queryset.annotate(distance=CosineDistance('embedding_half', query_embedding))
+    else:
+        queryset = queryset.annotate(distance=CosineDistance('embedding', query_embedding))
+
+    queryset = queryset.defer('embedding', 'embedding_half', 'embedding_bits', 'raw_data').order_by('distance')
+
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            set_ef_search(cursor, ef_search)
+            if brands:
+                set_iterative_scan(cursor)
+        documents = list(queryset[:k])
+    # relaxed_order may return neighbours slightly out of order
+    return sorted(documents, key=lambda doc: doc.distance)
+
+
+def search_space(space, query_embedding, k, ef_search, brands):
+    """search_knowbase() over the side table of a non-primary embedding space"""
+    queryset = space.table.objects.filter(knowbase__is_active=True)
+    if brands:
+        queryset = queryset.filter(
+            knowbase__in=KnowBase.objects.filter(brand_q(brands)).values('id')
+        )
+    queryset = (
+        queryset
+        .annotate(distance=CosineDistance('embedding', query_embedding))
+        .only('knowbase_id')
+        .order_by('distance')
+    )
+
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            set_ef_search(cursor, ef_search)
+            if brands:
+                set_iterative_scan(cursor)
+        hits = sorted(queryset[:k], key=lambda hit: hit.distance)
+
+    parents = (
+        KnowBase.objects
+        .defer('embedding', 'embedding_half', 'embedding_bits', 'raw_data')
+        .in_bulk([hit.knowbase_id for hit in hits])
+    )
+    documents = []
+    for hit in hits:
+        document = parents[hit.knowbase_id]
+        document.distance = hit.distance
+        documents.append(document)
+    return documents
+
+
+def search_chunks(query_embedding, k=None, ef_search=None, brands=None, chunks_per_doc=None):
+    """
+    Return the top-k parent KnowBase rows ranked by their best matching chunk.
+
+    Each returned document has ``distance`` (best chunk) and ``matched_chunks``
+    (up to chunks_per_doc chunks in document order) used by get_context_text().
+    """
+    k = k or settings.CHATBOT_TOP_K
+    ef_search = ef_search or settings.CHATBOT_HNSW_EF_SEARCH
+    chunks_per_doc = chunks_per_doc or settings.CHATBOT_CHUNKS_PER_DOC
+    brands = normalize_brands(brands)
+
+    queryset = KnowBaseChunk.objects.filter(knowbase__is_active=True, embedding__isnull=False)
+    if brands:
+        queryset = queryset.filter(
+            knowbase__in=KnowBase.objects.filter(brand_q(brands)).values('id')
+        )
+    # Several chunks usually come from the same document - over-fetch before grouping
+    limit = k * chunks_per_doc * 2
+    queryset = (
+        queryset
+        .annotate(distance=CosineDistance('embedding', query_embedding))
+        .defer('embedding')
+        .order_by('distance')
+    )
+
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            set_ef_search(cursor, max(ef_search, limit))
+            set_iterative_scan(cursor)
+        chunks = sorted(queryset[:limit], key=lambda chunk: chunk.distance)
+
+    grouped = {}
+    for chunk in chunks:
+        parent_chunks = grouped.setdefault(chunk.knowbase_id, [])
+        if len(parent_chunks) < chunks_per_doc:
+            parent_chunks.append(chunk)
+    parent_ids = list(grouped)[:k]
+
+    parents = (
+        KnowBase.objects
+        .defer('embedding', 'embedding_half', 'embedding_bits', 'raw_data')
+        .in_bulk(parent_ids)
+    )
+    documents = []
+    for parent_id in parent_ids:
+        document = parents[parent_id]
+        document.distance = grouped[parent_id][0].distance
+        document.matched_chunks = sorted(grouped[parent_id], key=lambda chunk: chunk.chunk_index)
+        documents.append(document)
+    return documents
+
+
+def build_context(documents, max_chars=None):
+    """Join retrieved documents into a numbered context block for the prompt"""
+    max_chars = max_chars or settings.CHATBOT_CONTEXT_MAX_CHARS
+    parts = []
+    total = 0
+    for i, doc in enumerate(documents, 1):
+        text = f"[{i}] {doc.get_context_text()}"
+        if doc.source_url:
+            text += f"\nที่มา: {doc.source_url}"
+        if total + len(text) > max_chars:
+            break
+        parts.append(text)
+        total += len(text)
+    return "\n\n".join(parts)
+
+
+def lexical_terms(query):
+    """
+    Split a query into lexical search terms.
+
+    Thai is written without spaces, so Thai runs are segmented with pythainlp when
+    installed, otherwise cut into overlapping 4-character windows that still hit
+    the trigram indexes.
+    """
+    codes = []  # Model codes first - they are the most selective terms
+    thai = []
+    for token in _TERM_RE.findall(query):
+        if not _THAI_RE.match(token):
+            codes.append(token.lower())
+        elif word_tokenize is not None:
+            thai.extend(w for w in word_tokenize(token, keep_whitespace=False) if len(w) >= 2)
+        elif len(token) <= 6:
+            thai.append(token)
+        else:
+            thai.extend(token[i:i + 4] for i in range(0, len(token) - 3, 3))
+
+    unique_terms = []
+    for term in codes + thai:
+        if term not in unique_terms:
+            unique_terms.append(term)
+    return unique_terms[:MAX_LEXICAL_TERMS]
+
+
+# Vector side of HYBRID_SQL for each CHATBOT_VECTOR_STORAGE
+VECTOR_CANDIDATES_SQL = {
+    'float': """
+        SELECT id, embedding <=> %(embedding)s::vector AS distance
+        FROM {table}
+        WHERE is_active AND embedding IS NOT NULL{brand_filter}
+        ORDER BY embedding <=> %(embedding)s::vector
+        LIMIT %(candidates)s""",
+    'halfvec': """
+        SELECT id, embedding_half <=> %(embedding)s::halfvec AS distance
+        FROM {table}
+        WHERE is_active AND embedding_half IS NOT NULL{brand_filter}
+        ORDER BY embedding_half <=> %(embedding)s::halfvec
+        LIMIT %(candidates)s""",
+    'binary': """
+        SELECT id, embedding <=> %(embedding)s::vector AS distance
+        FROM (
+            SELECT id, embedding
+            FROM {table}
+            WHERE is_active AND embedding_bits IS NOT NULL{brand_filter}
+            ORDER BY embedding_bits <~> binary_quantize(%(embedding)s::vector)
+            LIMIT %(binary_candidates)s
+        ) b
+        ORDER BY distance
+        LIMIT %(candidates)s""",
+    # Side table of a non-primary embedding space
+    'space': """
+        SELECT s.knowbase_id AS id, s.embedding <=> %(embedding)s::vector AS distance
+        FROM {space_table} s
+        JOIN {table} kb ON kb.id = s.knowbase_id
+        WHERE kb.is_active{brand_filter}
+        ORDER BY s.embedding <=> %(embedding)s::vector
+        LIMIT %(candidates)s""",
+}
+
+# Final distance column of HYBRID_SQL
+PRIMARY_DISTANCE_SQL = 'coalesce(kb.embedding <=> %(embedding)s::vector, 1)'
+SPACE_DISTANCE_SQL = (
+    'coalesce((SELECT s.embedding <=> %(embedding)s::vector FROM {space_table} s '
+    'WHERE s.knowbase_id = kb.id), 1)'
+)
+
+
+HYBRID_SQL = """
+WITH vector_hits AS (
+    SELECT id, row_number() OVER (ORDER BY distance) AS rank
+    FROM (
+{vector_candidates}
+    ) v
+),
+lexical_hits AS (
+    SELECT id, row_number() OVER (ORDER BY score DESC, id) AS rank
+    FROM (
+        SELECT id,
+               GREATEST(
+                   word_similarity(%(query)s, title),
+                   word_similarity(%(query)s, coalesce(model, ''))
+               )
+               + (SELECT count(*) FROM unnest(%(patterns)s::text[]) AS p
+                  WHERE title ILIKE p OR model ILIKE p OR content ILIKE p) AS score
+        FROM {table}
+        WHERE is_active AND ({lexical_filter}){brand_filter}
+        ORDER BY score DESC
+        LIMIT %(candidates)s
+    ) l
+),
+fused AS (
+    SELECT id, SUM(1.0 / (%(rrf_k)s + rank)) AS rrf_score
+    FROM (
+        SELECT id, rank FROM vector_hits
+        UNION ALL
+        SELECT id, rank FROM lexical_hits
+    ) ranked
+    GROUP BY id
+    ORDER BY rrf_score DESC
+    LIMIT %(k)s
+)
+SELECT kb.id, kb.title, kb.content, kb.source, kb.brand, kb.model, kb.category,
+       kb.source_url, kb.created_at, kb.updated_at, kb.is_active,
+       fused.rrf_score,
+       {distance} AS distance
+FROM fused
+JOIN {table} kb ON kb.id = fused.id
+ORDER BY fused.rrf_score DESC
+"""
+
+
+def hybrid_search(query, query_embedding, k=None, candidates=None, ef_search=None, brands=None,
+                  storage=None, space=None):
+    """
+    Vector + lexical search merged with reciprocal rank fusion (one round trip).
+
+    Lexical side uses the pg_trgm GIN indexes on title / model / content.
+    Returned objects carry ``rrf_score`` and ``distance`` attributes.
+    """
+    k = k or settings.CHATBOT_TOP_K
+    candidates = candidates or settings.CHATBOT_HYBRID_CANDIDATES
+    ef_search = ef_search or settings.CHATBOT_HNSW_EF_SEARCH
+    storage = storage or settings.CHATBOT_VECTOR_STORAGE
+    if space is not None and not space.is_primary:
+        storage = 'space'
+    brands = normalize_brands(brands)
+    binary_candidates = max(settings.CHATBOT_BINARY_CANDIDATES, candidates)
+    if storage == 'binary':
+        ef_search = max(ef_search, binary_candidates)
+
+    terms = lexical_terms(query)
+    patterns = [f"%{term}%" for term in terms]
+    # Expanded OR (not ILIKE ANY) so each branch can use its trigram index
+    filters = [
+        '%(query)s <%% title',
+        '%(query)s <%% model',
+    ]
+    params = {
+        'embedding': vector_literal(query_embedding),
+        'query': query,
+        'patterns': patterns,
+        'candidates': candidates,
+        'binary_candidates': binary_candidates,
+        'rrf_k': settings.CHATBOT_RRF_K,
+        'k': k,
+    }
+    for i, pattern in enumerate(patterns):
+        params[f'p{i}'] = pattern
+        filters.append(f'title ILIKE %(p{i})s OR model ILIKE %(p{i})s OR content ILIKE %(p{i})s')
+
+    # Same expressions as brand_q()
+    brand_filters = ["brand IS NULL", "brand = ''"] if brands else []
+    for i, brand in enumerate([*brands, *GENERAL_BRANDS] if brands else []):
+        params[f'b{i}'] = brand
+        brand_filters.append(f'UPPER(brand::text) = UPPER(%(b{i})s)')
+
+    table = connection.ops.quote_name(KnowBase._meta.db_table)
+    brand_filter = f" AND ({' OR '.join(brand_filters)})" if brand_filters else ''
+    if storage == 'space':
+        space_table = connection.ops.quote_name(space.table._meta.db_table)
+        distance = SPACE_DISTANCE_SQL.format(space_table=space_table)
+    else:
+        space_table = None
+        distance = PRIMARY_DISTANCE_SQL
+    sql = HYBRID_SQL.format(
+        vector_candidates=VECTOR_CANDIDATES_SQL[storage].format(
+            table=table, space_table=space_table, brand_filter=brand_filter
+        ),
+        table=table,
+        lexical_filter=' OR '.join(f'({f})' for f in filters),
+        brand_filter=brand_filter,
+        distance=distance,
+    )
+
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            set_ef_search(cursor, ef_search)
+            if brands:
+                set_iterative_scan(cursor)
+            cursor.execute(
+                'SET LOCAL pg_trgm.word_similarity_threshold = %s',
+                [settings.CHATBOT_TRGM_THRESHOLD],
+            )
+        return list(KnowBase.objects.raw(sql, params))
+
+
+def embed_space_query(query, space=None):
+    """Embed a search query with the backend of the space retrieve_documents() searches"""
+    space = space or get_embedding_space()
+    return embed_query(query, task_type='retrieval_query', backend=space.backend)
+
+
+def retrieve_documents(query, query_embedding, k=None, brands=None):
+    """
+    Run the retrieval strategy selected by CHATBOT_USE_CHUNKS / CHATBOT_RETRIEVAL_MODE
+    in the CHATBOT_EMBEDDING_SPACE space.
+
+    query_embedding must come from the space's backend (embed_space_query()),
+    so a question is embedded once. With a brand filter, results are topped up with
+    unfiltered rows when the brand has fewer than k matching documents,
+    so k results are always returned.
+    """
+    k = k or settings.CHATBOT_TOP_K
+    space = get_embedding_space()
+
+    def search(brands):
+        if settings.CHATBOT_USE_CHUNKS and space.is_primary:
+            return search_chunks(query_embedding, k=k, brands=brands)
+        if settings.CHATBOT_RETRIEVAL_MODE == 'hybrid':
+            return hybrid_search(query, query_embedding, k=k, brands=brands, space=space)
+        return search_knowbase(query_embedding, k=k, brands=brands, space=space)
+
+    brands = normalize_brands(brands)
+    documents = search(brands)
+    if brands and len(documents) < k:
+        seen = {doc.id for doc in documents}
+        documents += [doc for doc in search(None) if doc.id not in seen][:k - len(documents)]
+    return documents
@@ -0,0 +1,140 @@
+"""
+Semantic answer cache for the chatbot
+
+Reuses a stored answer when a new query embedding is within
+CHATBOT_SEMANTIC_CACHE_THRESHOLD cosine similarity of a past query.
+Entries are invalidated when a KnowBase row they were built from changes
+(see chatbot/signals.py) and expire after CHATBOT_SEMANTIC_CACHE_TTL seconds.
+Answers built without any source (nothing relevant was found, or n8n, which
+reports none) are also dropped when a KnowBase row of their brand scope is
+added. n8n answers expire after CHATBOT_SEMANTIC_CACHE_N8N_TTL seconds.
+Entries only match lookups with the same scope (retrieval filter, e.g. "brand:honda+general")
+and the same embedding model (CHATBOT_EMBEDDING_BACKEND).
+"""
+import logging
+import re
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from pgvector.django import CosineDistance
+
+from .embedding_backends import get_embedding_backend
+from .models import SemanticAnswerCache, SemanticCacheStats
+from .retrieval import is_general_brand, normalize_brands, set_ef_search, set_iterative_scan
+
+logger = logging.getLogger(__name__)
+
+
+def record_stat(field, amount=1):
+    """Increment today's hits / misses / near_misses / invalidations counter"""
+    try:
+        today_stats = SemanticCacheStats.objects.filter(date=timezone.localdate())
+        if not today_stats.update(**{field: F(field) + amount}):
+            SemanticCacheStats.objects.get_or_create(date=timezone.localdate())
+            today_stats.update(**{field: F(field) + amount})
+    except DatabaseError as e:
+        logger.warning(f"Semantic cache stats update failed: {e}")
+
+
+def lookup(query_embedding, scope=''):
+    """
+    Return the closest cached entry if it is within the similarity threshold, else None.
+    Every lookup is counted as a hit or a miss.
+    """
+    if not settings.CHATBOT_SEMANTIC_CACHE_ENABLED:
+        return None
+
+    threshold = settings.CHATBOT_SEMANTIC_CACHE_THRESHOLD
+    now = timezone.now()
+    cutoff = now - timedelta(seconds=settings.CHATBOT_SEMANTIC_CACHE_TTL)
+    n8n_cutoff = now - timedelta(seconds=settings.CHATBOT_SEMANTIC_CACHE_N8N_TTL)
+    model = get_embedding_backend().model
+    try:
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                set_ef_search(cursor, settings.CHATBOT_HNSW_EF_SEARCH)
+                set_iterative_scan(cursor)
+            entry = (
+                SemanticAnswerCache.objects
+                .filter(created_at__gte=cutoff, scope=scope, embedding_model=model)
+                .filter(~Q(backend='n8n') | Q(created_at__gte=n8n_cutoff))
+                .annotate(distance=CosineDistance('embedding', query_embedding))
+                .defer('embedding')
+                .order_by('distance')
+                .first()
+            )
+    except DatabaseError as e:
+        logger.warning(f"Semantic cache lookup failed: {e}")
+        return None
+
+    similarity = 1 - entry.distance if entry is not None else None
+    if similarity is not None and similarity >= threshold:
+        SemanticAnswerCache.objects.filter(pk=entry.pk).update(
+            hit_count=F('hit_count') + 1,
+            last_hit_at=timezone.now(),
+        )
+        record_stat('hits')
+        entry.similarity = similarity
+        logger.info(f"Semantic cache hit (similarity={similarity:.4f}): {entry.query[:50]}")
+        return entry
+
+    record_stat('misses')
+    if similarity is not None and similarity >= threshold - settings.CHATBOT_SEMANTIC_CACHE_NEAR_MISS:
+        record_stat('near_misses')
+    if similarity is not None:
+        logger.info(f"Semantic cache miss (best similarity={similarity:.4f})")
+    return None
+
+
+def store(query, query_embedding, answer, knowbase_ids=None, backend='', scope=''):
+    """Save a generated answer for future lookups"""
+    if not settings.CHATBOT_SEMANTIC_CACHE_ENABLED:
+        return None
+    if backend == 'n8n' and settings.CHATBOT_SEMANTIC_CACHE_N8N_TTL <= 0:
+        return None
+    try:
+        return SemanticAnswerCache.objects.create(
+            query=query,
+            embedding=query_embedding,
+            answer=answer,
+            knowbase_ids=list(knowbase_ids or []),
+            backend=backend,
+            embedding_model=get_embedding_backend().model,
+            scope=scope,
+        )
+    except DatabaseError as e:
+        logger.warning(f"Semantic cache store failed: {e}")
+        return None
+
+
+def invalidate_for_knowbase(knowbase_ids):
+    """Delete cached answers built from any of the given KnowBase rows"""
+    knowbase_ids = list(knowbase_ids)
+    if not knowbase_ids:
+        return 0
+    deleted, _ = SemanticAnswerCache.objects.filter(knowbase_ids__overlap=knowbase_ids).delete()
+    if deleted:
+        record_stat('invalidations', deleted)
+        logger.info(f"Semantic cache: invalidated {deleted} answers for KnowBase {knowbase_ids[:10]}")
+    return deleted
+
+
+def invalidate_unsourced(brand=''):
+    """
+    Delete cached answers built without any source whose scope covers brand
+    (all of them for a general row, see retrieval.GENERAL_BRANDS) - a new KnowBase
+    row may answer them now
+    """
+    entries = SemanticAnswerCache.objects.filter(knowbase_ids=[])
+    if not is_general_brand(brand):
+        brand = normalize_brands([brand])[0]
+        # '' (unfiltered) or a "brand:a,b+general" scope listing the brand
+        entries = entries.filter(Q(scope='') | Q(scope__regex=rf'^brand:(.*,)?{re.escape(brand)}(,|\+|$)'))
+    deleted, _ = entries.delete()
+    if deleted:
+        record_stat('invalidations', deleted)
+        logger.info(f"Semantic cache: invalidated {deleted} unsourced answers for brand '{brand}'")
+    return deleted
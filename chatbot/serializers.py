@@ -1,3 +1,4 @@
+from django.conf import settings
 from rest_framework import serializers
 from .models import ChatSession, ChatMessage, KnowlageDatabase
 
@@ -12,14 +13,26 @@ class ChatMessageSerializer(serializers.ModelSerializer):
 
 
 class ChatSessionSerializer(serializers.ModelSerializer):
-    """Serializer for ChatSession model"""
-    messages = ChatMessageSerializer(many=True, read_only=True)
+    """Serializer for ChatSession model (messages are paged via sessions/<session_id>/messages/)"""
     
     class Meta:
         model = ChatSession
         fields = ('id', 'user', 'session_id', 'started_at', 'ended_at', 
-                  'is_active', 'messages')
-        read_only_fields = ('id', 'started_at')
+                  'is_active', 'summary')
+        read_only_fields = ('id', 'started_at', 'summary')
+
+
+class ChatSessionDetailSerializer(ChatSessionSerializer):
+    """ChatSession with its latest messages (the conversation memory window)"""
+    recent_messages = serializers.SerializerMethodField()
+    
+    class Meta(ChatSessionSerializer.Meta):
+        fields = ChatSessionSerializer.Meta.fields + ('recent_messages',)
+    
+    def get_recent_messages(self, obj):
+        messages = list(obj.messages.order_by('-id')[:settings.CHATBOT_MEMORY_TURNS * 2])
+        messages.reverse()
+        return ChatMessageSerializer(messages, many=True).data
 
 
 class KnowlageDatabaseSerializer(serializers.ModelSerializer):
@@ -31,3 +44,13 @@ class KnowlageDatabaseSerializer(serializers.ModelSerializer):
                   'author', 'brand', 'model', 'price', 'views', 'comments_count',
                   'raw_data', 'published_at', 'created_at', 'updated_at', 'is_active')
         read_only_fields = ('id', 'created_at', 'updated_at')
+
+
+class KnowlageDatabaseListSerializer(serializers.ModelSerializer):
+    """Knowledge list row without content / raw_data (KnowlageDatabaseListView)"""
+    
+    class Meta:
+        model = KnowlageDatabase
+        fields = ('id', 'source', 'source_url', 'title', 'category', 'author', 'brand', 'model',
+                  'price', 'views', 'comments_count', 'published_at', 'updated_at')
+        read_only_fields = fields
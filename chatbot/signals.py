@@ -0,0 +1,26 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from .models import KnowBase
+from .semantic_cache import invalidate_for_knowbase, invalidate_unsourced
+
+
+@receiver(pre_save, sender=KnowBase)
+def quantize_knowbase_embedding(sender, instance, **kwargs):
+    """Keep embedding_half / embedding_bits in step with embedding"""
+    instance.set_quantized_embeddings()
+
+
+@receiver(post_save, sender=KnowBase)
+@receiver(post_delete, sender=KnowBase)
+def invalidate_semantic_cache(sender, instance, **kwargs):
+    """
+    Drop cached chatbot answers that were built from this KnowBase row
+    once the change is committed
+    """
+    knowbase_id = instance.pk
+    transaction.on_commit(lambda: invalidate_for_knowbase([knowbase_id]))
+    if kwargs.get('created'):
+        # Answers that found nothing relevant (or came from n8n) may be answerable now
+        brand = instance.brand
+        transaction.on_commit(lambda: invalidate_unsourced(brand))
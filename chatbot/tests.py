@@ -1,3 +1,96 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.test import SimpleTestCase, override_settings
+
+from . import intents
+from .embeddings import EmbeddingCache, normalize_query
+from .intents import INTENTS, keyword_hits, route_intent
+from .memory import ConversationHistory
+
+
+@override_settings(CHATBOT_INTENT_ROUTER=True, CHATBOT_INTENT_KEYWORD_MAX_CHARS=20)
+class KeywordRouteTests(SimpleTestCase):
+    """Keyword-only routing (no query embedding, so the centroid check never runs)"""
+
+    def route(self, message, history=None):
+        match = route_intent(message, query_embedding=None, history=history)
+        return match.intent.name if match else None
+
+    def test_greeting_and_booking_questions_are_routed(self):
+        self.assertEqual(self.route('สวัสดีครับ'), 'greeting')
+        self.assertEqual(self.route('hello'), 'greeting')
+        self.assertEqual(self.route('จองคิวซ่อมยังไง'), 'booking')
+        self.assertEqual(self.route('อยากนัดซ่อมรถ'), 'booking')
+
+    def test_greeting_with_a_repair_question_is_not_routed(self):
+        self.assertIsNone(self.route('สวัสดี เบรคไม่อยู่'))
+        self.assertIsNone(self.route('hi ผ้าเบรคหมด'))
+
+    def test_negated_booking_is_not_routed(self):
+        self.assertIsNone(self.route('ยกเลิกการจองคิว'))
+        self.assertIsNone(self.route('ไม่อยากจองคิวแล้ว'))
+
+    def test_keyword_inside_another_word_is_not_a_hit(self):
+        self.assertNotIn('booking', keyword_hits('ไม่ถนัดขับ'))
+        self.assertIsNone(self.route('ไม่ถนัดขับ'))
+        self.assertIsNone(self.route('ถนัดขับรถ'))
+
+    def test_follow_up_is_not_hijacked(self):
+        history = ConversationHistory(messages=[('user', 'เบรคมีเสียงดัง'), ('bot', 'ควรตรวจผ้าเบรค')])
+        self.assertIsNone(self.route('สวัสดี เบรคไม่อยู่', history=history))
+        self.assertIsNone(self.route('ยกเลิกการจองคิว', history=history))
+        self.assertEqual(self.route('จองคิวได้ที่ไหน', history=history), 'booking')
+
+
+def one_hot(index, size=len(INTENTS)):
+    return [1.0 if i == index else 0.0 for i in range(size)]
+
+
+def fake_embed_texts(texts, task_type=None, backend=None):
+    """Every example of intent i embeds to the i-th unit vector"""
+    examples = {
+        normalize_query(example): i
+        for i, intent in enumerate(INTENTS)
+        for example in intent.examples
+    }
+    return [one_hot(examples[text]) for text in texts]
+
+
+@override_settings(
+    CHATBOT_INTENT_ROUTER=True,
+    CHATBOT_INTENT_THRESHOLD=0.80,
+    CHATBOT_INTENT_MARGIN=0.05,
+)
+class CentroidRouteTests(SimpleTestCase):
+    """Embedding routing against centroids built from a stubbed embed_texts"""
+
+    def setUp(self):
+        patches = [
+            mock.patch('chatbot.embeddings.embed_texts', side_effect=fake_embed_texts),
+            mock.patch.object(EmbeddingCache, 'get', return_value=None),
+            mock.patch.object(EmbeddingCache, 'set'),
+            mock.patch.dict(intents._centroids, clear=True),
+        ]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def embedding_for(self, name):
+        return one_hot([intent.name for intent in INTENTS].index(name))
+
+    def test_query_near_a_centroid_is_routed(self):
+        oil = self.embedding_for('oil_change')
+        match = route_intent('น้ำมันเครื่องต้องเปลี่ยนตอนไหน', oil)
+        self.assertEqual(match.intent.name, 'oil_change')
+        self.assertEqual(match.method, 'embedding')
+        self.assertAlmostEqual(match.confidence, 1.0)
+
+    def test_ambiguous_or_follow_up_query_is_not_routed(self):
+        oil, price = self.embedding_for('oil_change'), self.embedding_for('price_list')
+        between = [x + y for x, y in zip(oil, price)]
+        self.assertIsNone(route_intent('น้ำมันเครื่องราคาเท่าไหร่', between))
+
+        history = ConversationHistory(
+            messages=[('user', 'รถสตาร์ทไม่ติด'), ('bot', 'ลองเช็คแบต')]
+        )
+        self.assertIsNone(route_intent('แล้วน้ำมันเครื่องล่ะ', oil, history=history))
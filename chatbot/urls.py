@@ -1,6 +1,7 @@
 from django.urls import path
 from . import views
 from . import views_web
+from . import views_stream
 
 app_name = 'chatbot'
 
@@ -10,8 +11,10 @@ urlpatterns = [
     
     # API endpoints (JSON)
     path('api/chat/', views.simple_chat_view, name='simple_chat'),  # Simple chat endpoint
+    path('api/chat/stream/', views_stream.chat_stream_view, name='chat_stream'),  # SSE streaming (ASGI)
     path('sessions/', views.ChatSessionListCreateView.as_view(), name='session_list'),
     path('sessions/<str:session_id>/', views.ChatSessionDetailView.as_view(), name='session_detail'),
+    path('sessions/<str:session_id>/messages/', views.ChatSessionMessageListView.as_view(), name='session_messages'),
     path('messages/', views.ChatMessageCreateView.as_view(), name='message_create'),
     path('messages/<int:pk>/', views.ChatMessageDetailView.as_view(), name='message_detail'),
     
@@ -1,18 +1,30 @@
+import hashlib
+
+from django.conf import settings
+from django.db.models import Count, Max
+from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
 from rest_framework import generics, permissions, status
+from rest_framework.pagination import CursorPagination
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.decorators import api_view, permission_classes
-from django.conf import settings
-import requests
 import uuid
+from .admission import AdmissionRejected, admit
 from .models import ChatSession, ChatMessage, KnowlageDatabase
-from .serializers import ChatSessionSerializer, ChatMessageSerializer, KnowlageDatabaseSerializer
+from .intents import fallback_answer
+from .memory import get_history, schedule_summary
+from .rag import ChatBackendError, answer_message
+from .serializers import (
+    ChatSessionSerializer, ChatSessionDetailSerializer, ChatMessageSerializer, KnowlageDatabaseListSerializer
+)
 
 
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
 def simple_chat_view(request):
-    """Simple chat endpoint without session management - sends to n8n"""
+    """Simple chat endpoint without session management - answers via CHATBOT_BACKEND"""
     message = request.data.get('message', '')
     
     if not message:
@@ -20,42 +32,26 @@ def simple_chat_view(request):
             'error': 'Message is required'
         }, status=status.HTTP_400_BAD_REQUEST)
     
+    print(f"👤 User: {request.user.username} (ID: {request.user.id}, Type: {request.user.user_type})")
+    print(f"💬 Message: {message}")
+    
     try:
-        # Get n8n webhook URL from settings
-        n8n_url = getattr(settings, 'N8N_WEBHOOK_URL', 'http://localhost:5678/webhook/chatbot-rag')
-        
-        # Always try to send to n8n first
-        print(f"📤 Sending to n8n: {n8n_url}")
-        print(f"👤 User: {request.user.username} (ID: {request.user.id}, Type: {request.user.user_type})")
-        print(f"💬 Message: {message}")
-        
-        response = requests.post(n8n_url, json={
-            'message': message,
-            'user_id': request.user.id,
-            'username': request.user.username,
-            'user_type': request.user.user_type
-        }, timeout=30)
-        
-        print(f"📥 n8n response status: {response.status_code}")
-        
-        if response.status_code == 200:
-            response_data = response.json()
-            # n8n AI Agent returns 'output' field
-            bot_response = response_data.get('output', response_data.get('response', response_data.get('text', 'ไม่สามารถประมวลผลได้')))
-            print(f"✅ Bot response: {bot_response[:100]}...")
-        else:
-            print(f"⚠️ n8n error: {response.status_code} - {response.text[:200]}")
+        admission = admit(request.user)
+    except AdmissionRejected as e:
+        print(f"🚦 Rejected ({e.reason}), retry after {e.retry_after}s")
+        return too_many_requests(e)
+    
+    with admission:
+        try:
+            result = answer_message(message, user=request.user)
+            bot_response = result['response']
+            print(f"✅ Bot response ({result['backend']}, {result['elapsed_ms']} ms): {bot_response[:100]}...")
+        except ChatBackendError as e:
+            print(f"⚠️ Chat backend error: {e}, using fallback response")
+            bot_response = generate_simple_response(message)
+        except Exception as e:
+            print(f"❌ Unexpected error: {e}")
             bot_response = generate_simple_response(message)
-            
-    except requests.exceptions.Timeout:
-        print("⏱️ n8n timeout, using fallback response")
-        bot_response = generate_simple_response(message)
-    except requests.exceptions.RequestException as e:
-        print(f"❌ n8n connection error: {e}")
-        bot_response = generate_simple_response(message)
-    except Exception as e:
-        print(f"❌ Unexpected error: {e}")
-        bot_response = generate_simple_response(message)
     
     return Response({
         'response': bot_response,
@@ -63,77 +59,18 @@ def simple_chat_view(request):
     }, status=status.HTTP_200_OK)
 
 
-def generate_simple_response(message):
-    """Generate a simple response based on keywords"""
-    message_lower = message.lower()
-    
-    # Keywords mapping
-    if any(word in message_lower for word in ['สวัสดี', 'หวัดดี', 'hello', 'hi']):
-        return 'สวัสดีครับ! ผมคือ AI ผู้ช่วยของ THE ONE ยินดีให้คำปรึกษาเกี่ยวกับรถจักรยานยนต์ครับ'
-    
-    elif any(word in message_lower for word in ['สตาร์ท', 'ติด', 'เครื่อง']):
-        return '''หากรถสตาร์ทไม่ติด อาจเกิดจากสาเหตุดังนี้:
-1. 🔋 แบตเตอรี่หมด - ลองตรวจสอบไฟหน้ารถว่าสว่างหรือไม่
-2. ⛽ น้ำมันหมด - ตรวจสอบปริมาณน้ำมันในถัง
-3. 🔌 หัวเทียนชำรุด - อายุการใช้งานประมาณ 10,000-15,000 กม.
-4. 🛢️ น้ำมันเครื่องน้อย - อาจทำให้เครื่องยนต์ล็อค
-
-แนะนำให้นำรถเข้าตรวจสอบที่ THE ONE ครับ'''
-    
-    elif any(word in message_lower for word in ['เบรค', 'ห้าม']):
-        return '''การดูแลระบบเบรค:
-🛑 อาการที่ต้องระวัง:
-- มีเสียงดังเวลาเบรค
-- เบรคไม่แน่น ต้องบีบแรง
-- มีเสียงเครือเวลาหยุด
-- รถดันหรือเบรคด้านเดียว
-
-💡 คำแนะนำ:
-- ตรวจสอบผ้าเบรคทุก 5,000 กม.
-- เปลี่ยนน้ำมันเบรคทุก 10,000 กม.
-- อย่าปล่อยให้ผ้าเบรคบางจนหมด
-
-หากพบอาการดังกล่าว แนะนำให้จองคิวซ่อมที่ THE ONE ครับ'''
-    
-    elif any(word in message_lower for word in ['น้ำมัน', 'เปลี่ยน', 'ถ่าย']):
-        return '''การเปลี่ยนน้ำมันเครื่อง:
-🛢️ ระยะเวลาเปลี่ยน:
-- รถเครื่องเล็ก 100-150cc: ทุก 1,000-1,500 กม.
-- รถเครื่องกลาง 250-500cc: ทุก 3,000-4,000 กม.
-- รถเครื่องใหญ่ 600cc+: ทุก 5,000-6,000 กม.
-
-💰 ราคาโดยประมาณ:
-- น้ำมันสังเคราะห์: 250-500 บาท
-- น้ำมันกึ่งสังเคราะห์: 150-300 บาท
-- น้ำมันแร่: 80-150 บาท
-
-จองคิวเปลี่ยนน้ำมันที่ THE ONE ได้เลยครับ!'''
-    
-    elif any(word in message_lower for word in ['ราคา', 'ค่า', 'เท่าไหร่']):
-        return '''💰 ค่าบริการโดยประมาณ:
-
-🔧 ซ่อมบำรุงทั่วไป: 300-800 บาท
-⚙️ ซ่อมเครื่องยนต์: 1,000-5,000 บาท
-🛑 ซ่อมเบรค: 500-1,500 บาท
-⚡ ระบบไฟฟ้า: 500-2,000 บาท
-🛞 เปลี่ยนยาง: 800-3,000 บาท
-
-*ราคาอาจแตกต่างตามรุ่นรถและอะไหล่*
-
-สามารถจองคิวเพื่อประเมินราคาที่แม่นยำได้ครับ!'''
-    
-    elif any(word in message_lower for word in ['จอง', 'นัด', 'คิว']):
-        return 'คุณสามารถจองคิวซ่อมได้ที่หน้า "จองคิวซ่อม" หรือคลิกที่เมนูด้านบนครับ เพียงเลือกรถ วันที่ และประเภทการซ่อมที่ต้องการ เราจะดูแลรถของคุณอย่างดีที่สุดครับ!'
-    
-    else:
-        return f'''ขอบคุณสำหรับคำถามครับ! 
+def too_many_requests(error):
+    """429 for a request refused by admission control"""
+    return Response(
+        error.as_dict(),
+        status=status.HTTP_429_TOO_MANY_REQUESTS,
+        headers={'Retry-After': str(error.retry_after)}
+    )
 
-สำหรับ "{message}" แนะนำให้คุณ:
-1. 📝 จองคิวเพื่อตรวจสอบรถให้แน่ใจ
-2. 🔍 ถ่ายรูปอาการส่งให้ช่างดู
-3. 📞 โทรติดต่อ THE ONE โดยตรง
 
-เรามีช่างมืออาชีพพร้อมให้บริการครับ!'''
+def generate_simple_response(message):
+    """Generate a simple response based on keywords"""
+    return fallback_answer(message)
 
 
 class ChatSessionListCreateView(generics.ListCreateAPIView):
@@ -150,8 +87,8 @@ class ChatSessionListCreateView(generics.ListCreateAPIView):
 
 
 class ChatSessionDetailView(generics.RetrieveUpdateAPIView):
-    """Retrieve or update a chat session"""
-    serializer_class = ChatSessionSerializer
+    """Retrieve or update a chat session (with its latest messages)"""
+    serializer_class = ChatSessionDetailSerializer
     permission_classes = [permissions.IsAuthenticated]
     lookup_field = 'session_id'
     
@@ -159,45 +96,86 @@ class ChatSessionDetailView(generics.RetrieveUpdateAPIView):
         return ChatSession.objects.filter(user=self.request.user)
 
 
+class ChatMessagePagination(CursorPagination):
+    """Newest first; ?cursor= pages back through older messages"""
+    ordering = '-id'
+    page_size = settings.CHATBOT_MESSAGES_PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class ChatSessionMessageListView(generics.ListAPIView):
+    """Page through the messages of one chat session"""
+    serializer_class = ChatMessageSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = ChatMessagePagination
+    
+    def get_queryset(self):
+        session = get_object_or_404(
+            ChatSession, user=self.request.user, session_id=self.kwargs['session_id']
+        )
+        return ChatMessage.objects.filter(session=session)
+
+
 class ChatMessageCreateView(generics.CreateAPIView):
     """Create a new chat message"""
     serializer_class = ChatMessageSerializer
     permission_classes = [permissions.IsAuthenticated]
     
     def create(self, request, *args, **kwargs):
-        # Create user message
-        user_message = ChatMessage.objects.create(
-            session_id=request.data.get('session'),
-            sender='user',
-            message=request.data.get('message')
-        )
-        
-        # Send to n8n for processing
+        # Only the owner's session - its history goes into the prompt / n8n payload
+        session = get_object_or_404(ChatSession, pk=request.data.get('session'), user=request.user)
+
+        # Refuse before anything is saved so a retry does not duplicate the message
         try:
-            n8n_url = settings.N8N_WEBHOOK_URL
-            response = requests.post(n8n_url, json={
-                'session_id': user_message.session.session_id,
-                'user_message': user_message.message,
-                'user_id': request.user.id
-            }, timeout=10)
-            
-            if response.status_code == 200:
-                bot_response = response.json().get('response', 'ขออภัย ไม่สามารถประมวลผลได้')
-                n8n_data = response.json()
-            else:
+            admission = admit(request.user)
+        except AdmissionRejected as e:
+            return too_many_requests(e)
+        
+        with admission:
+            # Create user message
+            user_message = ChatMessage.objects.create(
+                session=session,
+                sender='user',
+                message=request.data.get('message')
+            )
+        
+            history = get_history(session, before_id=user_message.id)
+        
+            # Answer via the configured backend (local RAG or n8n)
+            try:
+                result = answer_message(
+                    user_message.message,
+                    user=request.user,
+                    session_id=session.session_id,
+                    history=history
+                )
+                bot_response = result['response']
+                n8n_data = {
+                    'backend': result['backend'],
+                    'cached': result['cached'],
+                    'sources': result['sources'],
+                    'elapsed_ms': result['elapsed_ms'],
+                }
+                if 'raw' in result:
+                    n8n_data['raw'] = result['raw']
+                if 'intent' in result:
+                    n8n_data['intent'] = result['intent']
+                if result.get('coalesced'):
+                    n8n_data['coalesced'] = True
+            except Exception as e:
                 bot_response = 'ขออภัย เกิดข้อผิดพลาดในการเชื่อมต่อ'
-                n8n_data = None
-        except Exception as e:
-            bot_response = 'ขออภัย เกิดข้อผิดพลาดในการเชื่อมต่อ'
-            n8n_data = {'error': str(e)}
+                n8n_data = {'error': str(e)}
         
-        # Create bot response message
-        bot_message = ChatMessage.objects.create(
-            session=user_message.session,
-            sender='bot',
-            message=bot_response,
-            n8n_response=n8n_data
-        )
+            # Create bot response message
+            bot_message = ChatMessage.objects.create(
+                session=session,
+                sender='bot',
+                message=bot_response,
+                n8n_response=n8n_data
+            )
+        # The summary LLM call never delays the answer
+        schedule_summary(session)
         
         return Response({
             'user_message': ChatMessageSerializer(user_message).data,
@@ -236,11 +214,23 @@ class N8NWebhookView(APIView):
         return Response({'status': 'success'}, status=status.HTTP_200_OK)
 
 
+class KnowlageDatabasePagination(CursorPagination):
+    """Keyset pages over the primary key, newest first - constant cost at any depth"""
+    ordering = '-id'
+    page_size = settings.CHATBOT_KNOWLEDGE_PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+
 class KnowlageDatabaseListView(generics.ListAPIView):
-    """List all knowledge database entries"""
-    serializer_class = KnowlageDatabaseSerializer
+    """
+    List knowledge database entries (without content / raw_data), cursor paginated.
+    Responses carry ETag / Last-Modified of the filtered rows; unchanged pages get 304.
+    """
+    serializer_class = KnowlageDatabaseListSerializer
     permission_classes = [permissions.IsAuthenticated]
-    queryset = KnowlageDatabase.objects.filter(is_active=True)
+    pagination_class = KnowlageDatabasePagination
+    queryset = KnowlageDatabase.objects.filter(is_active=True).only(*KnowlageDatabaseListSerializer.Meta.fields)
     
     def get_queryset(self):
         queryset = super().get_queryset()
@@ -256,7 +246,32 @@ class KnowlageDatabaseListView(generics.ListAPIView):
         if model:
             queryset = queryset.filter(model__icontains=model)
         if category:
-            queryset = queryset.filter(problem_category__icontains=category)
+            queryset = queryset.filter(category__icontains=category)
         
         return queryset
+    
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        
+        # Any insert, edit or delete among the filtered rows changes count or latest updated_at
+        state = queryset.order_by().aggregate(count=Count('id'), last_modified=Max('updated_at'))
+        # Whole seconds like HTTP dates (and Django's condition()), or an echoed
+        # If-Modified-Since never matches; the ETag keeps the full precision
+        last_modified = int(state['last_modified'].timestamp()) if state['last_modified'] else None
+        etag = quote_etag(hashlib.md5(
+            f"{request.get_full_path()}|{state['count']}|{state['last_modified']}".encode('utf-8')
+        ).hexdigest())
+        
+        not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if not_modified is None:
+            page = self.paginate_queryset(queryset)
+            response = self.get_paginated_response(self.get_serializer(page, many=True).data)
+        else:
+            response = not_modified
+        
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
 
@@ -0,0 +1,221 @@
+"""
+Streaming chatbot endpoint (Server-Sent Events)
+
+Async view - run the project under ASGI (the_one/asgi.py) so the generation
+does not hold a sync worker. Events, in order:
+    session  {"session_id": ...}
+    status   {"stage": "retrieving" | "generating"}
+    sources  [{"id", "title", "source_url", "similarity"}, ...]
+    token    {"text": ...}            (repeated)
+    done     {"message_id", "cached", "elapsed_ms"}
+    error    {"error": ...}           (instead of done, fallback text already sent as tokens)
+"""
+import json
+import logging
+import time
+import uuid
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_POST
+
+from .admission import AdmissionRejected, admit
+from .embeddings import EmbeddingError, embed_query
+from .intents import route_intent
+from .llm import LLMError, build_prompt, stream_answer
+from .memory import get_history, schedule_summary
+from .models import ChatMessage, ChatSession
+from .rag import ChatBackendError, LocalRAGBackend, get_chat_backend
+from .retrieval import get_user_brands
+from . import semantic_cache
+from .views import generate_simple_response
+
+logger = logging.getLogger(__name__)
+
+
+def sse(event, data):
+    """Format one Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def get_or_create_session(user, session_id):
+    if session_id:
+        session = ChatSession.objects.filter(user=user, session_id=session_id).first()
+        if session:
+            return session
+    return ChatSession.objects.create(user=user, session_id=str(uuid.uuid4()))
+
+
+def save_messages(session, message, answer, meta):
+    ChatMessage.objects.create(session=session, sender='user', message=message)
+    return ChatMessage.objects.create(
+        session=session,
+        sender='bot',
+        message=answer,
+        n8n_response=meta,
+    )
+
+
+async def stream_chat_events(user, message, session_id):
+    started = time.monotonic()
+    session = await sync_to_async(get_or_create_session)(user, session_id)
+    history = await sync_to_async(get_history)(session)
+    yield sse('session', {'session_id': session.session_id})
+    yield sse('status', {'stage': 'retrieving'})
+
+    answer_parts = []
+    sources = []
+    backend_name = 'cache'
+    cached = False
+    error = None
+
+    # The semantic cache only serves first questions - follow-ups depend on the history
+    query_embedding = None
+    if not history:
+        try:
+            query_embedding = await sync_to_async(embed_query)(message, task_type='retrieval_query')
+        except EmbeddingError as e:
+            logger.warning(f"Stream: embedding failed: {e}")
+
+    # Greetings, booking how-to, price list... are answered from templates
+    match = await sync_to_async(route_intent)(message, query_embedding=query_embedding, history=history)
+
+    scope = ''
+    try:
+        backend = get_chat_backend()
+        brands = await sync_to_async(get_user_brands)(user)
+        scope = await sync_to_async(backend.cache_scope)(user)
+
+        entry = None
+        if match is None and query_embedding is not None:
+            entry = await sync_to_async(semantic_cache.lookup)(query_embedding, scope=scope)
+
+        if match is not None:
+            backend_name = 'intent'
+            yield sse('sources', sources)
+            answer_parts.append(match.intent.answer)
+            yield sse('token', {'text': match.intent.answer})
+        elif entry is not None:
+            cached = True
+            sources = [{'id': kb_id} for kb_id in entry.knowbase_ids]
+            yield sse('sources', sources)
+            answer_parts.append(entry.answer)
+            yield sse('token', {'text': entry.answer})
+        else:
+            backend_name = backend.name
+            if isinstance(backend, LocalRAGBackend) and (query_embedding is not None or history):
+                documents, context = await sync_to_async(backend.retrieve)(
+                    history.search_query(message), brands=brands,
+                    query_embedding=None if history else query_embedding,
+                )
+                sources = [
+                    {
+                        'id': doc.id,
+                        'title': doc.title,
+                        'source_url': doc.source_url,
+                        'similarity': round(1 - doc.distance, 4),
+                    }
+                    for doc in documents
+                ]
+                yield sse('sources', sources)
+                yield sse('status', {'stage': 'generating'})
+                async for text in stream_answer(build_prompt(message, context, history)):
+                    answer_parts.append(text)
+                    yield sse('token', {'text': text})
+            else:
+                # n8n does not stream - send its whole answer as one token
+                yield sse('status', {'stage': 'generating'})
+                if hasattr(backend, 'aanswer'):
+                    result = await backend.aanswer(
+                        message, user=user, session_id=session.session_id, history=history
+                    )
+                else:
+                    result = await sync_to_async(backend.answer)(
+                        message, user=user, session_id=session.session_id, history=history
+                    )
+                sources = result['sources']
+                answer_parts.append(result['response'])
+                yield sse('token', {'text': result['response']})
+    except (ChatBackendError, EmbeddingError, LLMError) as e:
+        error = str(e)
+        logger.warning(f"Stream: backend error, using fallback: {e}")
+        if not answer_parts:
+            fallback = generate_simple_response(message)
+            answer_parts.append(fallback)
+            yield sse('token', {'text': fallback})
+
+    answer = ''.join(answer_parts)
+    meta = {
+        'backend': backend_name,
+        'cached': cached,
+        'sources': sources,
+        'elapsed_ms': int((time.monotonic() - started) * 1000),
+        'streamed': True,
+    }
+    if match is not None:
+        meta['intent'] = match.intent.name
+    if error:
+        meta['error'] = error
+    bot_message = await sync_to_async(save_messages)(session, message, answer, meta)
+
+    if error is None and not cached and match is None and query_embedding is not None:
+        await sync_to_async(semantic_cache.store)(
+            message,
+            query_embedding,
+            answer,
+            knowbase_ids=[source['id'] for source in sources],
+            backend=backend_name,
+            scope=scope,
+        )
+
+    if error:
+        yield sse('error', {'error': 'ไม่สามารถเชื่อมต่อ AI ได้ แสดงคำตอบสำรอง'})
+    yield sse('done', {
+        'message_id': bot_message.id,
+        'cached': cached,
+        'elapsed_ms': meta['elapsed_ms'],
+    })
+
+    # Background thread - the summary LLM call must not hold the stream or the admission slot
+    await sync_to_async(schedule_summary)(session)
+
+
+async def release_after(admission, events):
+    """Hold the admission slot until the stream finishes or the client disconnects"""
+    try:
+        async for event in events:
+            yield event
+    finally:
+        await sync_to_async(admission.release)()
+
+
+@require_POST
+async def chat_stream_view(request):
+    """Stream a chatbot answer as Server-Sent Events"""
+    user = await request.auser()
+    if not user.is_authenticated:
+        return JsonResponse({'error': 'Authentication required'}, status=401)
+
+    try:
+        data = json.loads(request.body or b'{}')
+    except ValueError:
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+
+    message = (data.get('message') or '').strip()
+    if not message:
+        return JsonResponse({'error': 'Message is required'}, status=400)
+
+    try:
+        admission = await sync_to_async(admit)(user)
+    except AdmissionRejected as e:
+        response = JsonResponse(e.as_dict(), status=429)
+        response['Retry-After'] = str(e.retry_after)
+        return response
+
+    response = StreamingHttpResponse(
+        release_after(admission, stream_chat_events(user, message, data.get('session_id'))),
+        content_type='text/event-stream',
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Disable proxy buffering (nginx / ngrok)
+    return response
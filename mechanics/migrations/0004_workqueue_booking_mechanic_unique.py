@@ -0,0 +1,29 @@
+# Generated by Django 5.2.8 on 2026-10-17 15:45
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Min
+
+
+def remove_duplicate_entries(apps, schema_editor):
+    """Keep the oldest queue entry of each (booking, mechanic) pair"""
+    WorkQueue = apps.get_model('mechanics', 'WorkQueue')
+    keep = WorkQueue.objects.order_by().values('booking', 'mechanic').annotate(keep_id=Min('id')).values('keep_id')
+    WorkQueue.objects.exclude(id__in=keep).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0002_initial'),
+        ('mechanics', '0003_workqueue_completed_at_workqueue_priority_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_entries, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='workqueue',
+            constraint=models.UniqueConstraint(fields=('booking', 'mechanic'), name='workqueue_booking_mechanic_unique'),
+        ),
+    ]
@@ -117,6 +117,10 @@ class WorkQueue(models.Model):
         verbose_name = 'คิวงาน'
         verbose_name_plural = 'คิวงานทั้งหมด'
         ordering = ['-assigned_at']
+        constraints = [
+            # One queue entry per mechanic and booking - the booking fan-out relies on it to stay idempotent
+            models.UniqueConstraint(fields=['booking', 'mechanic'], name='workqueue_booking_mechanic_unique'),
+        ]
     
     def __str__(self):
         return f"{self.mechanic.username} - Booking #{self.booking.id}"
@@ -8,3 +8,17 @@
 
 # WorkQueue-based notifications have been moved to:
 # - accept_work_view in views_web.py (notifies other mechanics when job is taken)
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from mechanics.models import WorkQueue
+from users.events import on_commit_publish
+
+
+@receiver(post_save, sender=WorkQueue)
+@receiver(post_delete, sender=WorkQueue)
+def publish_work_queue_event(sender, instance, **kwargs):
+    """Live update for the mechanic's dashboard"""
+    on_commit_publish(
+        [instance.mechanic_id], 'work_queue', id=instance.id, booking_id=instance.booking_id, status=instance.status
+    )
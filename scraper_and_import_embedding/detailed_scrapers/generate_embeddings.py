@@ -3,10 +3,12 @@ Management command to generate embeddings for KnowlageDatabase using Google Gemi
 """
 import os
 import time
+from django.conf import settings
 from django.core.management.base import BaseCommand
 from chatbot.models import KnowlageDatabase
 from google import genai
 from google.genai import types
+from chatbot.embedding_pipeline import EmbeddingPipeline, embed_and_save
 
 
 class Command(BaseCommand):
@@ -17,7 +19,17 @@ class Command(BaseCommand):
             '--batch-size',
             type=int,
             default=100,
-            help='Number of records to process in each batch'
+            help='Number of texts sent in each embedding request'
+        )
+        parser.add_argument(
+            '--rate',
+            type=float,
+            help='Starting embedding rate in texts/second (default CHATBOT_EMBEDDING_RATE, lowered on 429)'
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            help='Embedding requests in flight at once (default CHATBOT_EMBEDDING_MAX_IN_FLIGHT)'
         )
         parser.add_argument(
             '--force',
@@ -58,66 +70,51 @@ class Command(BaseCommand):
             self.stdout.write(self.style.SUCCESS('✅ All records already have embeddings!'))
             return
         
-        processed = 0
-        errors = 0
+        pipeline = EmbeddingPipeline(
+            lambda texts: [
+                embedding.values
+                for embedding in client.models.embed_content(
+                    model=settings.CHATBOT_EMBEDDING_MODEL,
+                    contents=texts
+                ).embeddings
+            ],
+            batch_size=batch_size,
+            rate=options['rate'],
+            max_in_flight=options['concurrency'],
+        )
         start_time = time.time()
         
         self.stdout.write(self.style.WARNING('\n🚀 Starting embedding generation...'))
-        self.stdout.write(self.style.WARNING(f'⏱️  Estimated time: {total_count * 0.5 / 60:.1f} minutes\n'))
+        self.stdout.write(self.style.WARNING(
+            f'📦 Batch size: {pipeline.batch_size}, In flight: {pipeline.max_in_flight}, '
+            f'Rate: {pipeline.limiter.rate:.0f} texts/s\n'
+        ))
         
-        for record in queryset.iterator(chunk_size=batch_size):
-            try:
-                # Combine title and content for embedding
-                # Limit content length to avoid token limits
-                text = f"{record.title}\n{record.content[:1500]}"
-                
-                # Add brand/model info if available
-                if record.brand and record.model:
-                    text = f"{record.brand} {record.model}\n{text}"
-                
-                # Generate embedding with Google Gemini (new API)
-                response = client.models.embed_content(
-                    model='text-embedding-004',
-                    contents=text
-                )
-                
-                # Update record with embedding
-                record.embedding = response.embeddings[0].values
-                record.save(update_fields=['embedding'])
-                
-                processed += 1
-                
-                # Progress indicator
-                if processed % 10 == 0:
-                    elapsed = time.time() - start_time
-                    rate = processed / elapsed if elapsed > 0 else 0
-                    eta = (total_count - processed) / rate if rate > 0 else 0
-                    
-                    self.stdout.write(
-                        f'\r📝 Progress: {processed}/{total_count} '
-                        f'({processed*100//total_count}%) | '
-                        f'Rate: {rate:.1f} rec/s | '
-                        f'ETA: {eta/60:.1f} min',
-                        ending=''
-                    )
-                    self.stdout.flush()
-                
-                # Rate limiting: ~2 requests per second
-                time.sleep(0.5)
-                
-            except Exception as e:
-                errors += 1
-                self.stdout.write(
-                    self.style.ERROR(f'\n❌ Error processing record {record.id}: {str(e)}')
-                )
-                
-                # If too many errors, stop
-                if errors > 10:
-                    self.stdout.write(self.style.ERROR('\n❌ Too many errors, stopping...'))
-                    break
-                
-                # Wait longer on error
-                time.sleep(2)
+        def show_progress(processed, total):
+            elapsed = time.time() - start_time
+            rate = processed / elapsed if elapsed > 0 else 0
+            eta = (total - processed) / rate if rate > 0 else 0
+            self.stdout.write(
+                f'\r📝 Progress: {processed}/{total} '
+                f'({processed*100//total}%) | '
+                f'Rate: {rate:.1f} rec/s | '
+                f'ETA: {eta/60:.1f} min',
+                ending=''
+            )
+            self.stdout.flush()
+        
+        processed, failed = embed_and_save(
+            pipeline,
+            ((record, record.get_embedding_text()) for record in queryset.iterator(chunk_size=batch_size)),
+            progress=show_progress,
+            progress_every=10,
+            model=settings.CHATBOT_EMBEDDING_MODEL,
+        )
+        errors = len(failed)
+        for record, error in failed[:10]:
+            self.stdout.write(
+                self.style.ERROR(f'\n❌ Error processing record {record.id}: {str(error)}')
+            )
         
         elapsed_time = time.time() - start_time
         
@@ -1,13 +1,19 @@
 """
 Management command to import Honda BigBike data with OpenAI embeddings
+
+Vectors go to the 'openai-1536' embedding space (knowbase_embeddings_openai_1536),
+searched when CHATBOT_EMBEDDING_SPACE=openai-1536.
 """
 import json
 import os
 from django.core.management.base import BaseCommand
+from chatbot.chunking import chunk_imported
+from chatbot.dedup import NearDuplicateIndex, dedupe
 from chatbot.models import KnowBase
-from openai import OpenAI
+from chatbot.embedding_backends import EmbeddingError
+from chatbot.embedding_pipeline import EmbeddingPipeline
+from chatbot.embedding_spaces import embed_into_space, get_embedding_space, stale_space_rows
 import time
-from typing import List
 import warnings
 warnings.filterwarnings("ignore")
 
@@ -35,43 +41,25 @@ class Command(BaseCommand):
         parser.add_argument(
             '--batch-size',
             type=int,
-            default=10,
-            help='Number of records to process before pause'
+            default=100,
+            help='Number of texts sent in each embedding request'
         )
         parser.add_argument(
-            '--delay',
+            '--rate',
             type=float,
-            default=0.5,
-            help='Delay in seconds between API calls'
+            help='Starting embedding rate in texts/second (default CHATBOT_EMBEDDING_RATE, lowered on 429)'
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            help='Embedding requests in flight at once (default CHATBOT_EMBEDDING_MAX_IN_FLIGHT)'
         )
-
-    def generate_embedding(self, client: OpenAI, text: str, max_retries: int = 3) -> List[float]:
-        """Generate embedding with OpenAI text-embedding-3-large"""
-        for attempt in range(max_retries):
-            try:
-                response = client.embeddings.create(
-                    model="text-embedding-3-large",
-                    input=text,
-                    dimensions=1536
-                )
-                return response.data[0].embedding
-            except Exception as e:
-                wait_time = (2 ** attempt) * 2
-                if attempt < max_retries - 1:
-                    self.stdout.write(self.style.WARNING(
-                        f'⚠️  API error (attempt {attempt + 1}/{max_retries}): {str(e)[:100]}'
-                    ))
-                    self.stdout.write(self.style.WARNING(f'   Waiting {wait_time}s before retry...'))
-                    time.sleep(wait_time)
-                else:
-                    raise
 
     def handle(self, *args, **options):
         file_path = options['file']
         no_embed = options['no_embed']
         api_key = options['openai_key'] or os.getenv('OPENAI_API_KEY')
         batch_size = options['batch_size']
-        delay = options['delay']
         
         from django.conf import settings
         base_path = settings.BASE_DIR
@@ -93,20 +81,39 @@ class Command(BaseCommand):
         self.stdout.write(self.style.SUCCESS(f'✅ Loaded {len(honda_data)} records'))
         
         # Initialize OpenAI client
-        client = None
+        space = get_embedding_space('openai-1536')
+        pipeline = None
         if not no_embed:
             if not api_key:
                 self.stdout.write(self.style.ERROR('❌ OpenAI API key not provided'))
                 return
-            client = OpenAI(api_key=api_key)
+            try:
+                space.backend.configure(api_key)
+            except EmbeddingError as e:
+                self.stdout.write(self.style.ERROR(f'❌ {e}'))
+                return
             self.stdout.write(self.style.SUCCESS('✅ OpenAI client initialized'))
+            pipeline = EmbeddingPipeline.for_backend(
+                space.backend,
+                batch_size=min(batch_size, space.backend.max_batch_size),
+                rate=options['rate'],
+                max_in_flight=options['concurrency'],
+            )
+            self.stdout.write(self.style.WARNING(
+                f'📦 Batch size: {pipeline.batch_size}, In flight: {pipeline.max_in_flight}, '
+                f'Rate: {pipeline.limiter.rate:.0f} texts/s'
+            ))
         
-        self.stdout.write(self.style.WARNING(f'📦 Batch size: {batch_size}, Delay: {delay}s'))
-        
+        # Imported KnowBase ids, embedded after all rows are saved
+        imported_ids = []
+        # Near-identical pages are kept inactive and never embedded
+        dedup_index = NearDuplicateIndex.load() if settings.CHATBOT_DEDUP_ENABLED else None
         created_count = 0
         updated_count = 0
+        duplicate_count = 0
+        error_count = 0
         
-        for i, item in enumerate(honda_data):
+        for item in honda_data:
             # Build content for embedding
             name = item.get('name', '')
             price = item.get('price', '')
@@ -124,16 +131,6 @@ Honda {name}
 {trans_info}
 """.strip()
             
-            # Generate embedding
-            embedding = None
-            if not no_embed and client:
-                try:
-                    embedding = self.generate_embedding(client, content)
-                    time.sleep(delay)
-                except Exception as e:
-                    self.stdout.write(self.style.ERROR(f'❌ Embedding error for {name}: {e}'))
-                    continue
-            
             # Create or update record
             obj, created = KnowBase.objects.update_or_create(
                 title=f"Honda {name}",
@@ -144,21 +141,49 @@ Honda {name}
                     'model': name,
                     'category': 'BigBike',
                     'source_url': item.get('url', ''),
-                    'embedding': embedding,
                     'raw_data': item,
                     'is_active': True
                 }
             )
             
+            if dedup_index is not None and dedupe(obj, dedup_index):
+                duplicate_count += 1
+            else:
+                imported_ids.append(obj.id)
+            
             if created:
                 created_count += 1
             else:
                 updated_count += 1
-            
-            # Progress update
-            if (i + 1) % batch_size == 0:
-                self.stdout.write(f'⏸️  Processed {i + 1} records, pausing {delay * 2}s...')
-                time.sleep(delay * 2)
+        
+        # Unchanged rows keep their vectors
+        pending = []
+        if pipeline is not None:
+            pending = list(stale_space_rows(space, KnowBase.objects.filter(id__in=imported_ids)))
+        if pending:
+            self.stdout.write(self.style.WARNING(f'🚀 Embedding {len(pending)} records...'))
+            start_time = time.time()
+            saved, failed = embed_into_space(
+                space,
+                pipeline,
+                pending,
+                progress=lambda done, total: self.stdout.write(f'  ✓ {done}/{total} embedded'),
+            )
+            for obj, error in failed:
+                self.stdout.write(self.style.ERROR(f'❌ Embedding error for {obj.model}: {error}'))
+            error_count += len(failed)
+            self.stdout.write(self.style.SUCCESS(
+                f'🎯 Embedded {saved} records in {time.time() - start_time:.1f}s '
+                f'({pipeline.stats["requests"]} requests, {pipeline.stats["rate_limited"]} rate limited)'
+            ))
+        
+        # Chunks (primary embedding backend) make long documents searchable with CHATBOT_USE_CHUNKS
+        if pipeline is not None:
+            documents, chunks, failed = chunk_imported(imported_ids, [obj.id for obj, _ in pending])
+            for obj, error in failed:
+                self.stdout.write(self.style.ERROR(f'❌ Chunk embedding failed for {obj.model}: {error}'))
+            error_count += len(failed)
+            self.stdout.write(self.style.SUCCESS(f'🧩 {chunks} chunks for {documents} documents'))
         
         self.stdout.write('')
         self.stdout.write('=' * 50)
@@ -166,9 +191,12 @@ Honda {name}
         self.stdout.write(self.style.SUCCESS('✅ Import completed!'))
         self.stdout.write(self.style.SUCCESS(f'📊 New records: {created_count}'))
         self.stdout.write(self.style.SUCCESS(f'🔄 Updated records: {updated_count}'))
+        self.stdout.write(self.style.SUCCESS(f'🧬 Near-duplicates (inactive): {duplicate_count}'))
+        if error_count:
+            self.stdout.write(self.style.WARNING(f'❌ Errors: {error_count}'))
         
         total = KnowBase.objects.filter(is_active=True).count()
-        with_embeddings = KnowBase.objects.filter(is_active=True, embedding__isnull=False).count()
+        with_embeddings = space.table.objects.filter(knowbase__is_active=True).count()
         self.stdout.write('')
         self.stdout.write(self.style.SUCCESS(f'📈 Total active records: {total}'))
         self.stdout.write(self.style.SUCCESS(f'🎯 Records with embeddings: {with_embeddings}'))
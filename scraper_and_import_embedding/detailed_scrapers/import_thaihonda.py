@@ -10,10 +10,14 @@ import json
 import os
 import re
 import time
-from typing import List, Dict
+from typing import Dict
 from django.core.management.base import BaseCommand
+from chatbot.chunking import chunk_imported
+from chatbot.dedup import NearDuplicateIndex, dedupe
 from chatbot.models import KnowBase
-import google.generativeai as genai
+from chatbot.embedding_backends import configure_genai, get_embedding_backend
+from chatbot.embedding_pipeline import EmbeddingPipeline, embed_and_save
+from chatbot.embedding_sync import is_stale
 
 
 class Command(BaseCommand):
@@ -39,14 +43,18 @@ class Command(BaseCommand):
         parser.add_argument(
             '--batch-size',
             type=int,
-            default=5,
-            help='Number of records to process before rate limit pause'
+            default=100,
+            help='Number of texts sent in each embedding request'
         )
         parser.add_argument(
-            '--delay',
+            '--rate',
             type=float,
-            default=1.0,
-            help='Delay in seconds between API calls'
+            help='Starting embedding rate in texts/second (default CHATBOT_EMBEDDING_RATE, lowered on 429)'
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            help='Embedding requests in flight at once (default CHATBOT_EMBEDDING_MAX_IN_FLIGHT)'
         )
 
     def clean_specs(self, specs: Dict) -> Dict[str, str]:
@@ -119,32 +127,11 @@ class Command(BaseCommand):
         
         return '\n'.join(parts)
 
-    def generate_embedding_with_retry(self, text: str, max_retries: int = 3) -> List[float]:
-        """Generate embedding with retry logic and exponential backoff"""
-        for attempt in range(max_retries):
-            try:
-                result = genai.embed_content(
-                    model="models/text-embedding-004",
-                    content=text
-                )
-                return result['embedding']
-            except Exception as e:
-                wait_time = (2 ** attempt) * 2
-                if attempt < max_retries - 1:
-                    self.stdout.write(self.style.WARNING(
-                        f'⚠️  API error (attempt {attempt + 1}/{max_retries}): {str(e)[:100]}'
-                    ))
-                    self.stdout.write(self.style.WARNING(f'   Waiting {wait_time}s before retry...'))
-                    time.sleep(wait_time)
-                else:
-                    raise
-
     def handle(self, *args, **options):
         file_path = options['file']
         no_embed = options['no_embed']
         api_key = options['gemini_key'] or os.getenv('GEMINI_API_KEY')
         batch_size = options['batch_size']
-        delay = options['delay']
         
         from django.conf import settings
         base_path = settings.BASE_DIR
@@ -174,20 +161,39 @@ class Command(BaseCommand):
         
         self.stdout.write(self.style.SUCCESS(f'✅ Loaded {len(honda_data)} records'))
         
-        # Configure Gemini if not skipping embeddings
+        # Embedding pipeline (batched, concurrent, rate limited) if not skipping embeddings
+        pipeline = None
         if not no_embed:
-            if not api_key:
-                self.stdout.write(self.style.ERROR(
-                    '❌ API key required for embeddings. Use --gemini-key or set GEMINI_API_KEY'
-                ))
-                return
-            genai.configure(api_key=api_key)
-            self.stdout.write(self.style.SUCCESS('✅ Gemini configured'))
-            self.stdout.write(self.style.SUCCESS(f'📦 Batch size: {batch_size}, Delay: {delay}s'))
+            backend = get_embedding_backend()
+            if backend.name == 'gemini':
+                if not api_key:
+                    self.stdout.write(self.style.ERROR(
+                        '❌ API key required for embeddings. Use --gemini-key or set GEMINI_API_KEY'
+                    ))
+                    return
+                configure_genai(api_key)
+            pipeline = EmbeddingPipeline.for_backend(
+                backend,
+                batch_size=min(batch_size, backend.max_batch_size),
+                rate=options['rate'],
+                max_in_flight=options['concurrency'],
+            )
+            self.stdout.write(self.style.SUCCESS(f'✅ Embedding backend: {backend.name} ({backend.model})'))
+            self.stdout.write(self.style.SUCCESS(
+                f'📦 Batch size: {pipeline.batch_size}, In flight: {pipeline.max_in_flight}, '
+                f'Rate: {pipeline.limiter.rate:.0f} texts/s'
+            ))
         
+        # (KnowBase, text) pairs embedded after all rows are saved
+        pending = []
+        # Non-duplicate rows, chunked after the embeddings are saved
+        imported_ids = []
         imported = 0
         updated = 0
+        duplicates = 0
         errors = 0
+        # Near-identical pages are kept inactive and never embedded
+        dedup_index = NearDuplicateIndex.load() if settings.CHATBOT_DEDUP_ENABLED else None
         
         for i, item in enumerate(honda_data):
             try:
@@ -221,37 +227,13 @@ class Command(BaseCommand):
                     }
                 )
                 
-                # Generate embedding if not skipping
-                if not no_embed:
-                    try:
-                        # Build text for embedding
-                        embed_text = f"{title}\n{content[:3000]}"
-                        
-                        # Generate embedding with retry
-                        embedding = self.generate_embedding_with_retry(embed_text)
-                        
-                        # Update embedding
-                        obj.embedding = embedding
-                        obj.save(update_fields=['embedding'])
-                        
-                        # Progress log
-                        self.stdout.write(f'  ✓ [{i+1}/{len(honda_data)}] {name}')
-                        
-                        # Batch rate limiting
-                        if (imported + updated + 1) % batch_size == 0:
-                            self.stdout.write(self.style.WARNING(
-                                f'⏸️  Processed {imported + updated + 1} records, pausing {delay * 2}s...'
-                            ))
-                            time.sleep(delay * 2)
-                        else:
-                            time.sleep(delay)
-                        
-                    except Exception as e:
-                        self.stdout.write(self.style.ERROR(
-                            f'❌ Failed to generate embedding for {name}: {str(e)[:100]}'
-                        ))
-                        errors += 1
-                        continue
+                # Unchanged rows keep their embedding
+                if dedup_index is not None and dedupe(obj, dedup_index):
+                    duplicates += 1
+                else:
+                    imported_ids.append(obj.id)
+                    if pipeline is not None and is_stale(obj, backend.model):
+                        pending.append((obj, obj.get_embedding_text()))
                 
                 if created:
                     imported += 1
@@ -264,11 +246,45 @@ class Command(BaseCommand):
                     f'❌ Error processing {item.get("name", "unknown")}: {e}'
                 ))
         
+        if pipeline is not None and pending:
+            self.stdout.write(self.style.WARNING(f'\n🚀 Embedding {len(pending)} records...'))
+            start_time = time.time()
+            saved, failed = embed_and_save(
+                pipeline,
+                pending,
+                update_fields=['embedding', 'embedding_half', 'embedding_bits'],
+                model=backend.model,
+                progress=lambda done, total: self.stdout.write(f'  ✓ {done}/{total} embedded'),
+            )
+            for obj, error in failed:
+                self.stdout.write(self.style.ERROR(
+                    f'❌ Failed to generate embedding for {obj.model}: {str(error)[:100]}'
+                ))
+            errors += len(failed)
+            elapsed = time.time() - start_time
+            self.stdout.write(self.style.SUCCESS(
+                f'🎯 Embedded {saved} records in {elapsed:.1f}s '
+                f'({pipeline.stats["requests"]} requests, {pipeline.stats["rate_limited"]} rate limited)'
+            ))
+        
+        # Chunks make long documents searchable with CHATBOT_USE_CHUNKS
+        if pipeline is not None:
+            documents, chunks, failed = chunk_imported(
+                imported_ids, [obj.id for obj, _ in pending], pipeline=pipeline
+            )
+            for obj, error in failed:
+                self.stdout.write(self.style.ERROR(
+                    f'❌ Chunk embedding failed for {obj.title[:50]}: {str(error)[:100]}'
+                ))
+            errors += len(failed)
+            self.stdout.write(self.style.SUCCESS(f'🧩 {chunks} chunks for {documents} documents'))
+        
         # Summary
         self.stdout.write('\n' + '='*50)
         self.stdout.write(self.style.SUCCESS(f'\n✅ Import completed!'))
         self.stdout.write(self.style.SUCCESS(f'📊 New records: {imported}'))
         self.stdout.write(self.style.SUCCESS(f'🔄 Updated records: {updated}'))
+        self.stdout.write(self.style.SUCCESS(f'🧬 Near-duplicates (inactive): {duplicates}'))
         if errors:
             self.stdout.write(self.style.WARNING(f'⚠️  Errors: {errors}'))
         
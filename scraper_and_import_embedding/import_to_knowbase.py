@@ -13,7 +13,6 @@ import os
 import json
 import time
 import sys
-import google.generativeai as genai
 from pathlib import Path
 from dotenv import load_dotenv
 import django
@@ -25,24 +24,41 @@ load_dotenv(BASE_DIR / '.env')
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'the_one.settings')
 django.setup()
 
+from django.conf import settings
+
+from chatbot.chunking import chunk_documents
+from chatbot.dedup import NearDuplicateIndex, dedupe
+from chatbot.embedding_backends import configure_genai, get_embedding_backend
+from chatbot.embedding_pipeline import EmbeddingPipeline, embed_and_save
+from chatbot.embedding_sync import is_stale
 from chatbot.models import KnowBase
 
 # --- Configuration ---
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
-if not GEMINI_API_KEY:
-    print("Error: GEMINI_API_KEY not found in .env")
-    sys.exit(1)
-
-genai.configure(api_key=GEMINI_API_KEY)
 
 class KnowBaseImporter:
-    def __init__(self, batch_size=5, delay=1.0):
-        self.batch_size = batch_size
-        self.delay = delay
+    def __init__(self, batch_size=100):
+        # Embedding backend / model follow CHATBOT_EMBEDDING_BACKEND
+        self.backend = get_embedding_backend()
+        if self.backend.name == 'gemini':
+            if not GEMINI_API_KEY:
+                print("Error: GEMINI_API_KEY not found in .env")
+                sys.exit(1)
+            configure_genai(GEMINI_API_KEY)
+        self.pipeline = EmbeddingPipeline.for_backend(
+            self.backend, batch_size=min(batch_size, self.backend.max_batch_size)
+        )
+        # (KnowBase, text) pairs embedded in batches once every file is saved
+        self.pending = []
+        # Rows whose chunks are rebuilt after their document embedding is saved
+        self.chunk_pending = []
         self.total_imported = 0
         self.total_updated = 0
         self.total_errors = 0
+        self.total_duplicates = 0
+        # Near-duplicates of an already imported document are kept inactive, unembedded
+        self.dedup_index = NearDuplicateIndex.load() if settings.CHATBOT_DEDUP_ENABLED else None
 
     def print_progress(self, current, total, prefix=""):
         if total == 0:
@@ -50,74 +66,46 @@ class KnowBaseImporter:
         percent = int((current / total) * 100)
         print(f"{prefix} Progress: {percent}% ({current}/{total})", end='\r')
 
-    def generate_embedding_with_retry(self, text: str, max_retries: int = 3):
-        """Generate embedding with retry logic and exponential backoff"""
-        from google.api_core.exceptions import PermissionDenied, InvalidArgument
-        
-        for attempt in range(max_retries):
-            try:
-                result = genai.embed_content(
-                    model="models/text-embedding-004",
-                    content=text
-                )
-                return result['embedding']
-            except PermissionDenied:
-                print("\n\n❌ CRITICAL ERROR: API Key refused.")
-                print("Your GEMINI_API_KEY has been reported as leaked or is invalid.")
-                print("Please generate a new key at https://aistudio.google.com/app/apikey")
-                print("Then update your .env file with the new key.")
-                sys.exit(1) # Fatal error, stop immediately
-            except InvalidArgument as e:
-                print(f"\n❌ Error: Invalid Argument: {e}")
-                return None # Skip this item
-            except Exception as e:
-                wait_time = (2 ** attempt) * 2
-                if attempt < max_retries - 1:
-                    print(f'\n⚠️  API error (attempt {attempt + 1}/{max_retries}): {str(e)[:100]}')
-                    print(f'   Waiting {wait_time}s before retry...')
-                    time.sleep(wait_time)
-                else:
-                    print(f'\n❌ Failed to generate embedding after {max_retries} attempts.')
-                    # Don't raise, just return None so we can continue with other items if possible?
-                    # Or raise if we want to be strict. Let's return None to not break the loop.
-                    return None
-
     def save_to_knowbase(self, title, content, source, brand, category, raw_data, model=None, url=None):
         try:
-            # Check for existing duplicates with the same title and strictly clean them up if found
+            # Exact title duplicates: keep the oldest row (and its embedding), delete the rest
             # This prevents MultipleObjectsReturned error from update_or_create
-            existing = KnowBase.objects.filter(title=title)
-            if existing.count() > 1:
-                print(f"  ⚠️ Found {existing.count()} duplicates for '{title}'. Cleaning up...")
-                existing.delete() # Delete all to ensure clean state
+            existing = KnowBase.objects.filter(title=title).order_by('id')
+            extra_ids = list(existing.values_list('id', flat=True)[1:])
+            if extra_ids:
+                print(f"  ⚠️ Found {len(extra_ids) + 1} rows titled '{title}'. Keeping the oldest...")
+                KnowBase.objects.filter(id__in=extra_ids).delete()
             
-            # Embed header/summary or first 2000 chars (safe limit)
-            embedding_text = f"{title}\n{content[:2000]}"
-            embedding = self.generate_embedding_with_retry(embedding_text)
-            
-            if not embedding:
-                self.total_errors += 1
-                return
+            defaults = {
+                'content': content,
+                'source': source,
+                'brand': brand,
+                'model': model,
+                'category': category,
+                'source_url': url,
+                'raw_data': raw_data,
+                'is_active': True
+            }
 
-            obj, created = KnowBase.objects.update_or_create(
-                title=title,
-                defaults={
-                    'content': content,
-                    'source': source,
-                    'brand': brand,
-                    'model': model,
-                    'category': category,
-                    'source_url': url,
-                    'embedding': embedding,
-                    'raw_data': raw_data,
-                    'is_active': True
-                }
-            )
+            previous = existing.first()
+            obj, created = KnowBase.objects.update_or_create(title=title, defaults=defaults)
 
             if created:
                 self.total_imported += 1
             else:
                 self.total_updated += 1
+
+            if self.dedup_index is not None and dedupe(obj, self.dedup_index):
+                self.total_duplicates += 1
+                return
+
+            # Re-imports only re-embed rows whose embedded text changed
+            if is_stale(obj, self.backend.model):
+                self.pending.append((obj, obj.get_embedding_text()))
+
+            if previous is not None and previous.content == content and previous.chunks.exists():
+                return
+            self.chunk_pending.append(obj)
                 
         except Exception as e:
             self.total_errors += 1
@@ -174,9 +162,6 @@ class KnowBaseImporter:
                 )
                 
                 current_count += 1
-                # Rate Limiting
-                if current_count % self.batch_size == 0:
-                    time.sleep(self.delay)
 
     def import_pdf_files(self, pdf_dir):
         if not pdf_dir.exists():
@@ -212,10 +197,6 @@ class KnowBaseImporter:
                     raw_data={'file': str(pdf_file.name)},
                     model=None
                 )
-                
-                # Rate Limiting
-                if (i + 1) % self.batch_size == 0:
-                    time.sleep(self.delay)
                     
             except Exception as e:
                 self.total_errors += 1
@@ -223,39 +204,42 @@ class KnowBaseImporter:
 
     def fill_missing_embeddings(self):
         print(f"\n--- Checking for Missing Embeddings ---")
-        missing_count = KnowBase.objects.filter(embedding__isnull=True).count()
-        if missing_count == 0:
+        queued = {obj.id for obj, _ in self.pending}
+        qs = KnowBase.objects.filter(embedding__isnull=True, is_active=True).exclude(id__in=queued)
+        missing = [(obj, obj.get_embedding_text()) for obj in qs.iterator()]
+        if not missing:
             print("✅ All records have embeddings.")
             return
 
-        print(f"found {missing_count} records without embeddings. Processing...")
-        
-        # Process in chunks to avoid memory issues
-        # Django's iterator() is good for this
-        qs = KnowBase.objects.filter(embedding__isnull=True)
-        
-        for i, obj in enumerate(qs.iterator()):
-            try:
-                print(f"Generating embedding for: {obj.title[:50]}...")
-                embedding_text = f"{obj.title}\n{obj.content[:2000]}"
-                embedding = self.generate_embedding_with_retry(embedding_text)
-                
-                if embedding:
-                    obj.embedding = embedding
-                    obj.save()
-                    self.total_updated += 1
-                    print(f"  ✅ Saved embedding for {obj.id}")
-                else:
-                    self.total_errors += 1
-                    print(f"  ❌ Failed to generate embedding for {obj.id}")
-                
-                # Rate Limiting
-                if (i + 1) % self.batch_size == 0:
-                    time.sleep(self.delay)
-                    
-            except Exception as e:
-                self.total_errors += 1
-                print(f"  ❌ Error processing {obj.id}: {e}")
+        print(f"found {len(missing)} records without embeddings. Queued for embedding.")
+        self.pending.extend(missing)
+
+    def embed_pending(self):
+        if self.pending:
+            print(f"\n--- Embedding {len(self.pending)} records with {self.backend.name} ({self.backend.model}) ---")
+            start_time = time.time()
+            saved, failed = embed_and_save(
+                self.pipeline,
+                self.pending,
+                update_fields=['embedding', 'embedding_half', 'embedding_bits'],
+                model=self.backend.model,
+                progress=lambda done, total: self.print_progress(done, total, prefix="🧬"),
+            )
+            for obj, error in failed:
+                print(f"\n❌ Failed to generate embedding for {obj.title[:50]}: {str(error)[:100]}")
+            self.total_errors += len(failed)
+            print(f"\n🎯 Embedded {saved} records in {time.time() - start_time:.1f}s "
+                  f"({self.pipeline.stats['requests']} requests, {self.pipeline.stats['rate_limited']} rate limited)")
+            self.pending = []
+
+        # The document embedding only covers the first 2000 chars -
+        # chunks make the rest of long documents (PDF manuals) searchable
+        if self.chunk_pending:
+            print(f"\n--- Chunking {len(self.chunk_pending)} documents ---")
+            _, failed = chunk_documents(self.chunk_pending, pipeline=self.pipeline)
+            for obj, error in failed:
+                print(f"\n⚠️ Chunk embedding failed for {obj.title}: {str(error)[:100]}")
+            self.chunk_pending = []
 
     def run(self):
         db_dir = Path(__file__).parent / 'database'
@@ -266,10 +250,12 @@ class KnowBaseImporter:
         
         # Sub-task: Fill missing embeddings
         self.fill_missing_embeddings()
+        self.embed_pending()
         
         print("\n" + "="*50)
         print(f"✅ Import & Fix Cycle Completed")
         print(f"📊 New: {self.total_imported}, Updated: {self.total_updated}, Errors: {self.total_errors}")
+        print(f"🧬 Near-duplicates kept inactive: {self.total_duplicates}")
 
 if __name__ == "__main__":
     importer = KnowBaseImporter()
@@ -3,6 +3,11 @@ ASGI config for the_one project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Run under ASGI so streaming endpoints (chatbot SSE) do not hold a sync worker
+and the WebSockets (chat/routing.py, users/routing.py, fan-out over Redis) are served:
+    gunicorn the_one.asgi:application -k uvicorn.workers.UvicornWorker
+    or: uvicorn the_one.asgi:application --port 8000
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -13,4 +18,20 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'the_one.settings')
 
-application = get_asgi_application()
+# Initialise Django before importing anything that touches models
+django_asgi_app = get_asgi_application()
+
+from channels.auth import AuthMiddlewareStack  # noqa: E402
+from channels.routing import ProtocolTypeRouter, URLRouter  # noqa: E402
+from channels.security.websocket import AllowedHostsOriginValidator  # noqa: E402
+
+from chat.routing import websocket_urlpatterns as chat_websocket_urlpatterns  # noqa: E402
+from users.routing import websocket_urlpatterns as users_websocket_urlpatterns  # noqa: E402
+
+application = ProtocolTypeRouter({
+    'http': django_asgi_app,
+    # Session cookie auth, same origins as the site
+    'websocket': AllowedHostsOriginValidator(
+        AuthMiddlewareStack(URLRouter(chat_websocket_urlpatterns + users_websocket_urlpatterns))
+    ),
+})
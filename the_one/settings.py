@@ -37,11 +37,14 @@ INSTALLED_APPS = [
     'django.contrib.contenttypes',
     'django.contrib.sessions',
     'django.contrib.messages',
+    'daphne',  # ASGI runserver (WebSockets); must come before staticfiles
     'django.contrib.staticfiles',
+    'django.contrib.postgres',  # Required for HnswIndex / GIN indexes on KnowBase
     # Third-party apps
     'rest_framework',
     'rest_framework_simplejwt',
     'corsheaders',
+    'channels',
     # Our apps
     'users',
     'chatbot',
@@ -80,6 +83,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'the_one.wsgi.application'
+ASGI_APPLICATION = 'the_one.asgi.application'
 
 
 # Database
@@ -214,3 +218,119 @@ N8N_WEBHOOK_URL = config('N8N_WEBHOOK_URL', default='http://localhost:5678/webho
 # NGROK ENABLED
 NGROK_URL = config('NGROK_URL', default='')
 GEMINI_API_KEY = config('GEMINI_API_KEY', default='')
+OPENAI_API_KEY = config('OPENAI_API_KEY', default='')
+
+# Chatbot RAG Configuration
+# 'local' = embed + KnowBase HNSW search + Gemini inside Django, 'n8n' = forward to N8N_WEBHOOK_URL
+CHATBOT_BACKEND = config('CHATBOT_BACKEND', default='local')
+N8N_TIMEOUT = config('N8N_TIMEOUT', default=30, cast=int)
+CHATBOT_EMBEDDING_MODEL = config('CHATBOT_EMBEDDING_MODEL', default='models/text-embedding-004')
+# 'gemini' (API) or 'local' (sentence-transformers on CPU, offline) - re-embed with
+# manage.py reembed_knowbase after switching, vectors of different models do not mix
+CHATBOT_EMBEDDING_BACKEND = config('CHATBOT_EMBEDDING_BACKEND', default='gemini')
+# 768 dimensions, same as KnowBase.embedding, Thai supported
+CHATBOT_LOCAL_EMBEDDING_MODEL = config(
+    'CHATBOT_LOCAL_EMBEDDING_MODEL',
+    default='sentence-transformers/paraphrase-multilingual-mpnet-base-v2'
+)
+CHATBOT_LOCAL_EMBEDDING_BATCH_SIZE = config('CHATBOT_LOCAL_EMBEDDING_BATCH_SIZE', default=64, cast=int)
+CHATBOT_LOCAL_EMBEDDING_WORKERS = config('CHATBOT_LOCAL_EMBEDDING_WORKERS', default=0, cast=int)
+CHATBOT_LOCAL_EMBEDDING_ONNX = config('CHATBOT_LOCAL_EMBEDDING_ONNX', default=False, cast=bool)
+CHATBOT_LOCAL_EMBEDDING_INT8 = config('CHATBOT_LOCAL_EMBEDDING_INT8', default=False, cast=bool)
+# onnxruntime quantization target: 'avx2', 'avx512', 'avx512_vnni' or 'arm64'
+CHATBOT_LOCAL_EMBEDDING_INT8_CONFIG = config('CHATBOT_LOCAL_EMBEDDING_INT8_CONFIG', default='avx2')
+CHATBOT_LOCAL_EMBEDDING_DIR = config('CHATBOT_LOCAL_EMBEDDING_DIR', default=str(BASE_DIR / 'models'))
+# 'openai' backend (1536-dimension space, see CHATBOT_EMBEDDING_SPACE)
+CHATBOT_OPENAI_EMBEDDING_MODEL = config('CHATBOT_OPENAI_EMBEDDING_MODEL', default='text-embedding-3-large')
+CHATBOT_OPENAI_EMBEDDING_DIMENSIONS = config('CHATBOT_OPENAI_EMBEDDING_DIMENSIONS', default=1536, cast=int)
+# Embedding space searched by retrieval (chatbot/embedding_spaces.py): 'primary' = KnowBase.embedding,
+# 'openai-1536' / 'local-768' = side tables filled by manage.py sync_embeddings --space <name>
+CHATBOT_EMBEDDING_SPACE = config('CHATBOT_EMBEDDING_SPACE', default='primary')
+# Bulk import pipeline (chatbot/embedding_pipeline.py): texts per request, concurrent
+# requests, starting rate in texts/second (lowered automatically on 429)
+CHATBOT_EMBEDDING_BATCH_SIZE = config('CHATBOT_EMBEDDING_BATCH_SIZE', default=100, cast=int)
+CHATBOT_EMBEDDING_MAX_IN_FLIGHT = config('CHATBOT_EMBEDDING_MAX_IN_FLIGHT', default=4, cast=int)
+CHATBOT_EMBEDDING_RATE = config('CHATBOT_EMBEDDING_RATE', default=25, cast=float)
+CHATBOT_LLM_MODEL = config('CHATBOT_LLM_MODEL', default='gemini-2.0-flash')
+CHATBOT_LLM_TEMPERATURE = config('CHATBOT_LLM_TEMPERATURE', default=0.3, cast=float)
+CHATBOT_LLM_MAX_TOKENS = config('CHATBOT_LLM_MAX_TOKENS', default=1024, cast=int)
+CHATBOT_LLM_TIMEOUT = config('CHATBOT_LLM_TIMEOUT', default=20, cast=int)
+CHATBOT_TOP_K = config('CHATBOT_TOP_K', default=5, cast=int)
+CHATBOT_HNSW_EF_SEARCH = config('CHATBOT_HNSW_EF_SEARCH', default=40, cast=int)
+CHATBOT_CONTEXT_MAX_CHARS = config('CHATBOT_CONTEXT_MAX_CHARS', default=6000, cast=int)
+# 'hybrid' = vector + trigram lexical merged with reciprocal rank fusion, 'vector' = HNSW only
+CHATBOT_RETRIEVAL_MODE = config('CHATBOT_RETRIEVAL_MODE', default='hybrid')
+CHATBOT_HYBRID_CANDIDATES = config('CHATBOT_HYBRID_CANDIDATES', default=40, cast=int)
+CHATBOT_RRF_K = config('CHATBOT_RRF_K', default=60, cast=int)
+CHATBOT_TRGM_THRESHOLD = config('CHATBOT_TRGM_THRESHOLD', default=0.4, cast=float)
+# Restrict retrieval to the brands of the customer's motorcycles (booking.Motorcycle)
+CHATBOT_FILTER_BY_MOTORCYCLE = config('CHATBOT_FILTER_BY_MOTORCYCLE', default=True, cast=bool)
+CHATBOT_HNSW_MAX_SCAN_TUPLES = config('CHATBOT_HNSW_MAX_SCAN_TUPLES', default=20000, cast=int)
+# 'float' (embedding), 'halfvec' (embedding_half) or 'binary' (embedding_bits + exact re-rank)
+CHATBOT_VECTOR_STORAGE = config('CHATBOT_VECTOR_STORAGE', default='float')
+CHATBOT_BINARY_CANDIDATES = config('CHATBOT_BINARY_CANDIDATES', default=100, cast=int)
+# Search KnowBaseChunk (document_chunks) instead of whole documents - run manage.py chunk_knowbase first
+CHATBOT_USE_CHUNKS = config('CHATBOT_USE_CHUNKS', default=False, cast=bool)
+CHATBOT_CHUNK_TOKENS = config('CHATBOT_CHUNK_TOKENS', default=300, cast=int)
+CHATBOT_CHUNK_OVERLAP_TOKENS = config('CHATBOT_CHUNK_OVERLAP_TOKENS', default=50, cast=int)
+CHATBOT_CHUNKS_PER_DOC = config('CHATBOT_CHUNKS_PER_DOC', default=3, cast=int)
+# Query embedding cache (in-process LRU + query_embedding_cache table)
+CHATBOT_EMBEDDING_CACHE_TTL = config('CHATBOT_EMBEDDING_CACHE_TTL', default=30 * 24 * 3600, cast=int)
+CHATBOT_EMBEDDING_CACHE_LRU_SIZE = config('CHATBOT_EMBEDDING_CACHE_LRU_SIZE', default=2048, cast=int)
+CHATBOT_EMBEDDING_CACHE_MAX_ROWS = config('CHATBOT_EMBEDDING_CACHE_MAX_ROWS', default=50000, cast=int)
+# Conversation memory (chatbot/memory.py): last N user/bot turns verbatim,
+# older messages folded into ChatSession.summary every SUMMARY_BATCH messages
+CHATBOT_MEMORY_TURNS = config('CHATBOT_MEMORY_TURNS', default=4, cast=int)
+CHATBOT_MEMORY_SUMMARY_BATCH = config('CHATBOT_MEMORY_SUMMARY_BATCH', default=4, cast=int)
+CHATBOT_MEMORY_SUMMARY_MAX_CHARS = config('CHATBOT_MEMORY_SUMMARY_MAX_CHARS', default=1200, cast=int)
+CHATBOT_MESSAGES_PAGE_SIZE = config('CHATBOT_MESSAGES_PAGE_SIZE', default=30, cast=int)
+# Page size of the knowledge list API (chatbot/knowledge/)
+CHATBOT_KNOWLEDGE_PAGE_SIZE = config('CHATBOT_KNOWLEDGE_PAGE_SIZE', default=50, cast=int)
+# Near-duplicate KnowBase documents (chatbot/dedup.py): MinHash Jaccard estimate at or
+# above DEDUP_THRESHOLD (same brand) keeps one canonical row, the others are deactivated
+CHATBOT_DEDUP_ENABLED = config('CHATBOT_DEDUP_ENABLED', default=True, cast=bool)
+CHATBOT_DEDUP_THRESHOLD = config('CHATBOT_DEDUP_THRESHOLD', default=0.85, cast=float)
+CHATBOT_DEDUP_MAX_CHARS = config('CHATBOT_DEDUP_MAX_CHARS', default=5000, cast=int)
+# Intent router (chatbot/intents.py): template answers for high-confidence intents
+# before the semantic cache / backend; keyword-only routing for messages up to KEYWORD_MAX_CHARS
+CHATBOT_INTENT_ROUTER = config('CHATBOT_INTENT_ROUTER', default=True, cast=bool)
+CHATBOT_INTENT_THRESHOLD = config('CHATBOT_INTENT_THRESHOLD', default=0.80, cast=float)
+CHATBOT_INTENT_MARGIN = config('CHATBOT_INTENT_MARGIN', default=0.05, cast=float)
+CHATBOT_INTENT_KEYWORD_BONUS = config('CHATBOT_INTENT_KEYWORD_BONUS', default=0.05, cast=float)
+CHATBOT_INTENT_KEYWORD_MAX_CHARS = config('CHATBOT_INTENT_KEYWORD_MAX_CHARS', default=20, cast=int)
+# Semantic answer cache (semantic_answer_cache table)
+CHATBOT_SEMANTIC_CACHE_ENABLED = config('CHATBOT_SEMANTIC_CACHE_ENABLED', default=True, cast=bool)
+CHATBOT_SEMANTIC_CACHE_THRESHOLD = config('CHATBOT_SEMANTIC_CACHE_THRESHOLD', default=0.95, cast=float)
+CHATBOT_SEMANTIC_CACHE_NEAR_MISS = config('CHATBOT_SEMANTIC_CACHE_NEAR_MISS', default=0.05, cast=float)
+CHATBOT_SEMANTIC_CACHE_TTL = config('CHATBOT_SEMANTIC_CACHE_TTL', default=7 * 24 * 3600, cast=int)
+# n8n answers carry no sources, so they cannot be invalidated per KnowBase row; 0 = never cache them
+CHATBOT_SEMANTIC_CACHE_N8N_TTL = config('CHATBOT_SEMANTIC_CACHE_N8N_TTL', default=600, cast=int)
+# Redis (redis service in docker-compose.yml, published on host port 6380)
+REDIS_URL = config('REDIS_URL', default='redis://localhost:6380/0')
+REDIS_CONNECT_TIMEOUT = config('REDIS_CONNECT_TIMEOUT', default=0.5, cast=float)
+REDIS_TIMEOUT = config('REDIS_TIMEOUT', default=1.0, cast=float)
+# Django Channels: chat WebSocket fan-out across workers over Redis pub/sub
+CHANNEL_LAYERS = {
+    'default': {
+        'BACKEND': 'channels_redis.pubsub.RedisPubSubChannelLayer',
+        'CONFIG': {'hosts': [REDIS_URL]},
+    },
+}
+# New booking fan-out to mechanics (booking/fanout.py): runs in the request after
+# commit; True queues it in Redis for manage.py run_booking_fanout (start the worker first)
+BOOKING_FANOUT_ASYNC = config('BOOKING_FANOUT_ASYNC', default=False, cast=bool)
+# Chatbot admission control (chatbot/admission.py): per-user answers in flight,
+# token bucket of BURST messages refilled at RATE per second, 429 + Retry-After beyond that
+CHATBOT_ADMISSION_ENABLED = config('CHATBOT_ADMISSION_ENABLED', default=True, cast=bool)
+CHATBOT_USER_MAX_IN_FLIGHT = config('CHATBOT_USER_MAX_IN_FLIGHT', default=2, cast=int)
+CHATBOT_USER_RATE = config('CHATBOT_USER_RATE', default=0.2, cast=float)
+CHATBOT_USER_BURST = config('CHATBOT_USER_BURST', default=6, cast=int)
+CHATBOT_ADMISSION_LEASE_SECONDS = config('CHATBOT_ADMISSION_LEASE_SECONDS', default=N8N_TIMEOUT * 3, cast=int)
+# Identical questions in flight at once share one backend call; waiters give up after COALESCE_WAIT
+CHATBOT_COALESCE_ENABLED = config('CHATBOT_COALESCE_ENABLED', default=True, cast=bool)
+CHATBOT_COALESCE_WAIT = config('CHATBOT_COALESCE_WAIT', default=N8N_TIMEOUT + 5, cast=int)
+# Upstream clients (n8n / Gemini): connection pool, connect deadline, circuit breaker
+CHATBOT_HTTP_MAX_CONNECTIONS = config('CHATBOT_HTTP_MAX_CONNECTIONS', default=20, cast=int)
+CHATBOT_HTTP_CONNECT_TIMEOUT = config('CHATBOT_HTTP_CONNECT_TIMEOUT', default=3, cast=float)
+CHATBOT_BREAKER_FAILURES = config('CHATBOT_BREAKER_FAILURES', default=5, cast=int)
+CHATBOT_BREAKER_RESET_SECONDS = config('CHATBOT_BREAKER_RESET_SECONDS', default=30, cast=int)
@@ -0,0 +1,31 @@
+"""
+WebSocket consumer of the per-user event stream (see users/events.py)
+"""
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+
+from .events import events_group
+
+# Close code when the socket has no logged-in user (4000-4999 are application defined)
+CLOSE_UNAUTHENTICATED = 4401
+
+
+class UserEventsConsumer(AsyncJsonWebsocketConsumer):
+    """Live notification, chat, booking and work queue events of the logged-in user"""
+
+    group = None
+
+    async def connect(self):
+        user = self.scope['user']
+        if not user.is_authenticated:
+            await self.close(code=CLOSE_UNAUTHENTICATED)
+            return
+        self.group = events_group(user.id)
+        await self.channel_layer.group_add(self.group, self.channel_name)
+        await self.accept()
+
+    async def disconnect(self, code):
+        if self.group:
+            await self.channel_layer.group_discard(self.group, self.channel_name)
+
+    async def user_event(self, event):
+        await self.send_json(event['event'])
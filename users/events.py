@@ -0,0 +1,50 @@
+"""
+Per-user real-time event stream (Django Channels, ws/events/)
+
+Every page of a logged-in user keeps one WebSocket (templates/base.html) that
+carries all the live updates the user needs, instead of each widget polling:
+
+    {"type": "notification", "id": ...}                      notifications changed
+    {"type": "chat", "room_id": ...}                         chat unread count may have changed
+    {"type": "booking", "booking_id": ..., "status": ...}    a booking of the user changed
+    {"type": "work_queue", "booking_id": ..., "status": ...} the mechanic's work queue changed
+
+Events only say what changed; the page reloads that part through the usual
+API. They are published after the transaction commits, so that reload sees
+the change. Publishing is best effort: if Redis is down, the pages fall
+back to polling.
+"""
+import logging
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+
+def events_group(user_id):
+    return f'user_events_{user_id}'
+
+
+def send_to_groups(groups, event):
+    """group_send event to every group, never raising"""
+    layer = get_channel_layer()
+    if layer is None:
+        return
+    for group in groups:
+        try:
+            async_to_sync(layer.group_send)(group, event)
+        except Exception as e:
+            logger.warning(f"Event {event['type']} to {group} not delivered: {e}")
+
+
+def publish(user_ids, kind, **data):
+    """Send a {"type": kind, ...data} event to the event streams of user_ids"""
+    event = {'type': 'user.event', 'event': {'type': kind, **data}}
+    send_to_groups([events_group(user_id) for user_id in set(user_ids) if user_id], event)
+
+
+def on_commit_publish(user_ids, kind, **data):
+    user_ids = list(user_ids)
+    transaction.on_commit(lambda: publish(user_ids, kind, **data))
@@ -110,6 +110,14 @@ class Notification(models.Model):
         default=False,
         verbose_name='อ่านแล้ว'
     )
+    # Set by bulk fan-outs (booking/fanout.py) so a retried job cannot notify twice
+    dedupe_key = models.CharField(
+        max_length=100,
+        unique=True,
+        null=True,
+        blank=True,
+        verbose_name='คีย์กันซ้ำ'
+    )
     created_at = models.DateTimeField(
         auto_now_add=True,
         verbose_name='วันที่สร้าง'
@@ -0,0 +1,11 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from users.models import Notification
+from users.events import on_commit_publish
+
+
+@receiver(post_save, sender=Notification)
+@receiver(post_delete, sender=Notification)
+def publish_notification_event(sender, instance, **kwargs):
+    """Tell the user's open pages to reload their notifications"""
+    on_commit_publish([instance.user_id], 'notification', id=instance.id)
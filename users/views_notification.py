@@ -1,6 +1,7 @@
 from django.http import JsonResponse
 from django.views.decorators.http import require_http_methods
 from django.contrib.auth.decorators import login_required
+from users.events import on_commit_publish
 from users.models import Notification
 from users.serializers_notification import NotificationSerializer
 import json
@@ -37,7 +38,9 @@ def mark_notification_read(request, notification_id):
 @require_http_methods(["POST"])
 def mark_all_notifications_read(request):
     """Mark all notifications as read"""
-    Notification.objects.filter(user=request.user, is_read=False).update(is_read=True)
+    if Notification.objects.filter(user=request.user, is_read=False).update(is_read=True):
+        # Bulk update sends no post_save - tell the user's other tabs directly
+        on_commit_publish([request.user.id], 'notification', id=None)
     return JsonResponse({'success': True, 'message': 'อ่านทั้งหมดแล้ว'})
 
 